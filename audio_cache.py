@@ -0,0 +1,140 @@
+import struct
+import threading
+import wave
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pygame
+
+from instrumentation import STATS
+
+
+def wav_header(size, rate, channels, bits, float_samples=False):
+    # 44 byte RIFF/WAVE header for size bytes of interleaved PCM
+    block = channels * bits // 8
+    return (b"RIFF" + struct.pack("<I", 36 + size) + b"WAVE"
+            + b"fmt " + struct.pack("<IHHIIHH", 16, 3 if float_samples else 1, channels, rate, rate * block, block, bits)
+            + b"data" + struct.pack("<I", size))
+
+
+def decode_to_wav(path):
+    # The whole song as an in-memory WAV file the mixer opens without decoding.
+    # 16-bit WAV files are used as they are; everything else is decoded by
+    # SDL_mixer into the mixer's sample format.
+    if path.lower().endswith(".wav"):
+        try:
+            with wave.open(path, "rb") as w:
+                plain = w.getsampwidth() == 2 and w.getcomptype() == "NONE"
+        except (wave.Error, EOFError):
+            plain = False
+        if plain:
+            with open(path, "rb") as f:
+                return f.read()
+    rate, size, channels = pygame.mixer.get_init()
+    if size not in (-16, 32):
+        raise ValueError(f"Cannot store mixer format {size} as WAV")
+    raw = pygame.mixer.Sound(path).get_raw()
+    return wav_header(len(raw), rate, channels, abs(size), float_samples=size == 32) + raw
+
+
+class DecodedStream(BytesIO):
+    # A song from the cache, for the mixer to open as WAV
+    pass
+
+
+class DecodedAudioCache:
+    # Recently played and upcoming songs decoded to PCM and kept in memory as
+    # WAV images, so going back to a song or on to a prepared one opens it from
+    # RAM with no decoder and no disk access. Entries are keyed by path, size and
+    # mtime; the least recently used are dropped to stay under max_bytes.
+    # request() decodes on a worker thread. hits and misses count get() calls.
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_workers=1):
+        self.max_bytes = max_bytes
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="decode")
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, track):
+        with self.lock:
+            return self._key(track) in self.entries
+
+    def _key(self, track):
+        return track.path, track.size, track.mtime
+
+    def get(self, track):
+        # WAV bytes of a library Track, or None
+        key = self._key(track)
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+        STATS.count("decoded_cache.misses" if data is None else "decoded_cache.hits")
+        return data
+
+    def fits(self, size):
+        # Songs taking more than a quarter of the budget are not kept
+        return size <= self.max_bytes // 4
+
+    def load(self, track):
+        # Decode a track and keep it; returns the WAV bytes
+        key = self._key(track)
+        with self.lock:
+            data = self.entries.get(key)
+        if data is not None:
+            return data
+        with STATS.timer("decoded_cache.decode", path=track.path):
+            data = decode_to_wav(track.path)
+        if self.fits(len(data)):
+            self._add(key, data)
+        return data
+
+    def request(self, track, expected_size=None):
+        # Decode in the background unless cached, pending or too big. Returns
+        # a future, or None if nothing is to be done.
+        key = self._key(track)
+        if expected_size is not None and not self.fits(expected_size):
+            return None
+        with self.lock:
+            if key in self.entries:
+                return None
+            future = self.pending.get(key)
+            if future is not None:
+                return future
+            future = self.pending[key] = self.pool.submit(self.load, track)
+        future.add_done_callback(lambda _: self._done(key))
+        return future
+
+    def stats(self):
+        with self.lock:
+            return {"items": len(self.entries), "bytes": self.total, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total = 0
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _done(self, key):
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def _add(self, key, data):
+        with self.lock:
+            self.total += len(data) - len(self.entries.pop(key, b""))
+            self.entries[key] = data
+            while self.total > self.max_bytes and len(self.entries) > 1:
+                _, old = self.entries.popitem(last=False)
+                self.total -= len(old)
+        STATS.gauge("decoded_cache.bytes", self.total)
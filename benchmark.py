@@ -0,0 +1,446 @@
+# Benchmarks for the player and MyFlix hot paths on synthetic libraries.
+#
+#   python benchmark.py                    compare against benchmark_baseline.json
+#   python benchmark.py --update-baseline  store the current numbers as the baseline
+#   python benchmark.py --scale large --only play_song load_favorites --output results.json
+#
+# Exits with status 1 when a case got slower than the baseline allows or has
+# no baseline entry to compare with. The Tk cases need a display; without one
+# they run on Xvfb if xvfbwrapper (see requirements-dev.txt) is installed and
+# are skipped otherwise.
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+# Headless by default: no sound card and no pygame window needed
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(HERE, "benchmark_baseline.json")
+
+# Synthetic library sizes: songs, favorites file entries, MyFlix posters
+SCALES = {
+    "small": {"songs": 2000, "favorites": 20000, "posters": 300},
+    "large": {"songs": 20000, "favorites": 200000, "posters": 3000},
+}
+
+# A case is a regression when its median takes more than (1 + TOLERANCE)
+# times the baseline median and is also at least MIN_SLOWDOWN seconds slower.
+# The scaling problems this is meant to catch are many times slower, not a few
+# percent; medians and the absolute floor keep timer noise on tiny cases and
+# busy machines out.
+TOLERANCE = 1.5
+MIN_SLOWDOWN = 0.005
+
+# Silent 128 kbit/s MPEG-1 Layer III frame, 1152 samples at 44.1 kHz
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x64]) + bytes(413)
+
+
+def write_wav(path, seconds=0.1):
+    with wave.open(path, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(b"\0" * int(44100 * seconds) * 4)
+
+
+def write_mp3(path, frames=10):
+    with open(path, "wb") as f:
+        f.write(MP3_FRAME * frames)
+
+
+def make_library(folder, count):
+    # count tiny silent songs, alternating WAV and MP3, spread over subfolders
+    paths = []
+    for i in range(count):
+        sub = os.path.join(folder, f"album{i // 500:03}")
+        if i % 500 == 0:
+            os.makedirs(sub, exist_ok=True)
+        if i % 2:
+            path = os.path.join(sub, f"track{i:06}.mp3")
+            write_mp3(path)
+        else:
+            path = os.path.join(sub, f"track{i:06}.wav")
+            write_wav(path)
+        paths.append(path)
+    return paths
+
+
+def make_favorites_file(path, songs, count):
+    # .fav file of count entries: the songs, then paths that no longer exist
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write((songs[i] if i < len(songs) else os.path.join(os.path.dirname(path), f"gone{i}.mp3")) + "\n")
+
+
+def make_posters(folder, count):
+    # count small JPEG posters and a catalog of (title, poster) pairs
+    from PIL import Image
+
+    os.makedirs(folder, exist_ok=True)
+    items = []
+    for i in range(count):
+        path = os.path.join(folder, f"movie{i:05}.jpg")
+        Image.new("RGB", (300, 450), (i % 256, 64, 128)).save(path, "JPEG")
+        items.append((f"Movie {i:05}", path))
+    return items
+
+
+def timed(func, runs, setup=None):
+    # Best of runs calls of func() in seconds and the median, which is what
+    # gets compared; setup() runs untimed before each call
+    times = []
+    for _ in range(runs):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return {"seconds": min(times), "median": statistics.median(times), "runs": runs}
+
+
+class Bench:
+    # Runs the cases over one synthetic library in a temporary folder
+
+    def __init__(self, scale, runs=7):
+        self.sizes = SCALES[scale]
+        self.scale = scale
+        self.runs = runs
+        self.results = {}
+        self.skipped = {}
+        self.tmp = tempfile.mkdtemp(prefix="player-bench-")
+        os.environ["MUSIC_PLAYER_DATA_DIR"] = os.path.join(self.tmp, "data")
+        os.environ["XDG_CACHE_HOME"] = os.path.join(self.tmp, "cache")
+        self.songs = make_library(os.path.join(self.tmp, "music"), self.sizes["songs"])
+        self.fav_file = os.path.join(self.tmp, "big.fav")
+        make_favorites_file(self.fav_file, self.songs, self.sizes["favorites"])
+
+    def close(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def record(self, name, result):
+        self.results[name] = result
+        print(f"{name:28} {result['seconds'] * 1000:10.2f} ms  (median {result['median'] * 1000:.2f}, {result['runs']} runs)")
+
+    def skip(self, name, reason):
+        self.skipped[name] = reason
+        print(f"{name:28} skipped: {reason}")
+
+    def new_core(self, name):
+        from library import LibraryIndex
+        from player_core import PlayerCore
+        from seek_table import SeekTableCache
+
+        data = os.path.join(self.tmp, name)
+        os.makedirs(data, exist_ok=True)
+        library = LibraryIndex(os.path.join(data, "library.db"))
+        return PlayerCore(library, seek_tables=SeekTableCache(os.path.join(data, "tables")))
+
+    def run(self, only=None):
+        cases = [
+            ("set_songs", self.bench_set_songs),
+            ("shuffle_start", self.bench_shuffle_start),
+            ("play_song", self.bench_play_song),
+            ("save_favorites", self.bench_save_favorites),
+            ("load_favorites", self.bench_load_favorites),
+            ("search", self.bench_search),
+            ("dsp_render", self.bench_dsp_render),
+            ("control_command", self.bench_control_command),
+            ("update_song_list", self.bench_update_song_list),
+            ("myflix_setup_ui", self.bench_myflix),
+            ("fast_start", self.bench_fast_start),
+        ]
+        for name, case in cases:
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            case()
+        return self.results
+
+    # Player, no display needed
+
+    def wait_for_index(self, core):
+        # Let the background search index build finish, so it does not eat
+        # into the next timed call
+        deadline = time.time() + 60
+        while len(core.search_index) < len(core.songs) and time.time() < deadline:
+            time.sleep(0.01)
+
+    def bench_set_songs(self):
+        core = self.new_core("set_songs")
+        self.record("set_songs", timed(lambda: core.set_songs(self.songs), self.runs,
+                                       setup=lambda: self.wait_for_index(core)))
+        core.close()
+
+    def bench_shuffle_start(self):
+        core = self.new_core("shuffle")
+        core.set_songs(self.songs)
+        self.record("shuffle_start", timed(core.play_random, self.runs, setup=core.stop))
+        core.close()
+
+    def bench_play_song(self):
+        # First play of a song: header probe, mixer load and start
+        core = self.new_core("play")
+        core.set_songs(self.songs)
+        picks = iter(range(0, len(self.songs), max(1, len(self.songs) // (self.runs * 4))))
+        self.record("play_song", timed(lambda: core.play_index(next(picks)), self.runs * 4))
+        core.close()
+
+    def bench_save_favorites(self):
+        core = self.new_core("save_fav")
+        core.set_songs(self.songs)
+        with open(self.fav_file, encoding="utf-8") as f:
+            core.add_favorites(self.songs + [line.rstrip("\n") for line in f])
+        target = os.path.join(self.tmp, "saved.fav")
+        self.record("save_favorites", timed(lambda: core.save_favorites(target), self.runs))
+        core.close()
+
+    def bench_load_favorites(self):
+        core = self.new_core("load_fav")
+        core.set_songs(self.songs)
+        self.record("load_favorites", timed(lambda: core.load_favorites(self.fav_file), self.runs,
+                                            setup=core.clear_favorites))
+        core.close()
+
+    def bench_search(self):
+        # Search-as-you-type queries against the built index, 100 per run
+        core = self.new_core("search")
+        core.set_songs(self.songs)
+        self.wait_for_index(core)
+        queries = ["t", "tr", "tra", "track", "track00", "album001", "wav", "mp3 track0001", "0001", "xyz"] * 10
+
+        def search():
+            for query in queries:
+                core.search(query, limit=1000)
+        self.record("search_x100", timed(search, self.runs))
+        core.close()
+
+    def bench_dsp_render(self):
+        # Two 30 s songs crossfaded through the equalizer and the volume stage
+        # as the DSP engine renders them; also reported as real-time factor,
+        # CPU seconds per second of audio
+        import numpy as np
+        from dsp import CROSSFADE_SECONDS, ArraySource, Pipeline, to_pcm
+
+        rate, seconds = 44100, 30
+        noise = (np.random.default_rng(0).standard_normal((rate * seconds, 2)) * 3000).astype(np.int16)
+
+        def render():
+            pipeline = Pipeline(rate, 2)
+            pipeline.eq.set_gains([6, 3, 0, -2, 0, 2, 4, 0, -3, -6])
+            pipeline.start(ArraySource("a", noise, rate))
+            pipeline.queue(ArraySource("b", noise, rate))
+            item = pipeline.next_block()
+            while item is not None:
+                to_pcm(item[1], 0.8, 0.8, -16)
+                item = pipeline.next_block()
+        result = timed(render, self.runs)
+        result["realtime_factor"] = result["seconds"] / (2 * seconds - CROSSFADE_SECONDS)
+        self.record("dsp_render", result)
+        print(f"{'':28} real-time factor {result['realtime_factor']:.4f}")
+
+    def bench_control_command(self):
+        # Round trips of status and volume commands over the control socket
+        # to a headless core, 100 per run
+        import threading
+        from control import ControlClient, ControlServer
+
+        core = self.new_core("control")
+        core.set_songs(self.songs)
+        server = ControlServer(core, os.path.join(self.tmp, "control.sock"))
+        server.start()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        client = ControlClient(server.path)
+
+        def commands():
+            for i in range(50):
+                client.call("status")
+                client.call("volume", value=i / 50)
+        self.record("control_command_x100", timed(commands, self.runs))
+        client.close()
+        server.running = False
+        server.wake()
+        thread.join()
+        server.close()
+        core.close()
+
+    # Tk views
+
+    def tk_root(self):
+        import tkinter as tk
+
+        try:
+            return tk.Tk()
+        except tk.TclError:
+            return None
+
+    def bench_update_song_list(self):
+        from spotify import MusicPlayer
+
+        root = self.tk_root()
+        if root is None:
+            self.skip("update_song_list", "no display")
+            return
+        core = self.new_core("view")
+        player = MusicPlayer(root, core=core, waveform=False)
+
+        def refresh():
+            core.set_songs(self.songs)
+            root.update_idletasks()
+        self.record("update_song_list", timed(refresh, self.runs))
+        player.close()
+
+    def bench_myflix(self):
+        from myFlix.catalog import Catalog
+        from myFlix.myflix import MyFlixApp
+
+        if self.tk_root_available() is False:
+            self.skip("myflix_setup_ui", "no display")
+            self.skip("myflix_refresh_ui", "no display")
+            return
+        catalog = Catalog.from_items(make_posters(os.path.join(self.tmp, "posters"), self.sizes["posters"]))
+        cwd = os.getcwd()
+        os.chdir(self.tmp)
+        apps = []
+        try:
+            def setup():
+                root = self.tk_root()
+                apps.append(MyFlixApp(root, catalog))
+                root.update_idletasks()
+            self.record("myflix_setup_ui", timed(setup, self.runs, setup=lambda: apps and apps.pop().close()))
+
+            def refresh():
+                apps[-1].refresh_ui()
+                apps[-1].root.update_idletasks()
+            self.record("myflix_refresh_ui", timed(refresh, self.runs))
+            apps.pop().close()
+        finally:
+            os.chdir(cwd)
+
+    def bench_fast_start(self):
+        # Time to first frame of the fast-start launcher in a fresh process,
+        # with the library and its snapshot from a previous run
+        if self.tk_root_available() is False:
+            self.skip("fast_start_first_frame", "no display")
+            return
+        core = self.new_core("startup")
+        core.set_songs(self.songs)
+        core.close()
+        env = dict(os.environ, MUSIC_PLAYER_DATA_DIR=os.path.join(self.tmp, "startup"))
+        times = []
+        for _ in range(self.runs):
+            output = subprocess.run([sys.executable, os.path.join(HERE, "fast_start.py"), "--measure-startup"],
+                                    env=env, capture_output=True, text=True, check=True).stdout
+            times.append(json.loads(output.strip().splitlines()[-1]))
+        for name in ("first_frame", "ui_ready", "audio_ready"):
+            seconds = [run[name] / 1000 for run in times]
+            self.record(f"fast_start_{name}", {"seconds": min(seconds), "median": statistics.median(seconds),
+                                               "runs": self.runs})
+
+    def tk_root_available(self):
+        root = self.tk_root()
+        if root is None:
+            return False
+        root.destroy()
+        return True
+
+
+def compare(results, baseline, tolerance=TOLERANCE, min_slowdown=MIN_SLOWDOWN):
+    # Cases slower than the baseline as (name, baseline seconds, seconds). A
+    # case measured now but missing from the baseline (e.g. a Tk case when the
+    # baseline was recorded without a display) fails too, with None for the
+    # baseline seconds, so it cannot go unchecked.
+    regressions = []
+    cases = baseline.get("cases", {})
+    for name, current in results.items():
+        after = current.get("median", current["seconds"])
+        base = cases.get(name)
+        if base is None:
+            regressions.append((name, None, after))
+            continue
+        before = base.get("median", base["seconds"])
+        if after > max(before * (1 + tolerance), before + min_slowdown):
+            regressions.append((name, before, after))
+    return regressions
+
+
+def start_virtual_display():
+    # Run the Tk cases on Xvfb when there is no display and xvfbwrapper is installed
+    if os.environ.get("DISPLAY") or sys.platform in ("win32", "darwin"):
+        return None
+    try:
+        from xvfbwrapper import Xvfb
+    except ImportError:
+        return None
+    try:
+        display = Xvfb()
+        display.start()
+    except (OSError, RuntimeError):
+        return None
+    return display
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the player and MyFlix hot paths on synthetic libraries.")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--only", nargs="*", help="run only cases starting with these names")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    display = start_virtual_display()
+    bench = Bench(args.scale, args.runs)
+    try:
+        results = bench.run(args.only)
+    finally:
+        bench.close()
+        if display is not None:
+            display.stop()
+    report = {
+        "scale": args.scale,
+        "sizes": SCALES[args.scale],
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cases": results,
+        "skipped": bench.skipped,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="\r\n") as f:
+            json.dump(report, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8", newline="\r\n") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one")
+        return 0
+    if baseline.get("scale") != args.scale:
+        print(f"Baseline is for scale {baseline.get('scale')!r}, not compared")
+        return 0
+    regressions = compare(results, baseline, args.tolerance)
+    for name, before, after in regressions:
+        if before is None:
+            print(f"NO BASELINE {name}: {after * 1000:.2f} ms; record it with --update-baseline")
+        else:
+            print(f"REGRESSION {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms ({after / before:.1f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,378 @@
+import json
+import os
+import selectors
+import signal
+import socket
+import threading
+from collections import deque
+
+from instrumentation import STATS
+from library import user_data_dir
+
+# Longest request line accepted, and most output a slow subscriber may have
+# pending before it is dropped
+MAX_LINE = 64 * 1024
+MAX_PENDING = 1024 * 1024
+
+
+def default_socket_path():
+    return os.environ.get("MUSIC_PLAYER_SOCKET") or os.path.join(user_data_dir(), "control.sock")
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+
+class Client:
+    # One connection: bytes read but not yet a full line, bytes not yet sent
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbox = bytearray()
+        self.outbox = bytearray()
+        self.subscribed = False
+
+
+class ControlServer:
+    # Controls a PlayerCore over a Unix domain socket with one JSON object per
+    # line. A request names the command in "cmd" and passes arguments as
+    # other keys; "id" is echoed in the reply:
+    #
+    #   -> {"id":1,"cmd":"play","index":3}
+    #   <- {"id":1,"ok":true,"result":true}
+    #   -> {"cmd":"volume","value":0.5}
+    #   <- {"ok":false,"error":"..."}
+    #
+    # Commands: play (index, path, or resume/shuffle), pause, resume, next,
+    # previous, stop, queue (path or paths), volume (value, or none to read
+    # it), seek (position), status, search (query, limit), subscribe and
+    # unsubscribe, plus the PlayerCore commands in DISPATCHED. Commands that
+    # read or write files named by the client are not offered.
+    # Subscribers get the core's events pushed as {"event":"track",...}.
+    #
+    # Everything runs on one thread with non-blocking sockets, and commands
+    # run right there under the core's lock, not through the Tk event loop.
+    # serve_forever() also polls the core, for a headless daemon;
+    # start_thread() runs next to a window whose Tk thread polls the core.
+
+    # PlayerCore commands run through dispatch()
+    DISPATCHED = frozenset(("play_random", "play_index", "play_song", "play_next", "play_previous", "pause_resume",
+                            "set_volume", "set_equalizer", "set_shuffle_mode", "add_favorites", "play_favorites",
+                            "play_playlist", "enqueue"))
+
+    def __init__(self, core, path=None):
+        self.core = core
+        self.path = path or default_socket_path()
+        self.selector = selectors.DefaultSelector()
+        self.listener = None
+        self.clients = set()
+        self.subscribers = 0
+        # Core events wait here until the server thread sends them out
+        self.events = deque()
+        self.waker, self.wake_end = socket.socketpair()
+        self.waker.setblocking(False)
+        self.thread = None
+        self.server_thread = None
+        self.running = False
+        self.commands = {
+            "play": self.play,
+            "pause": lambda: self.core.is_playing() and self.core.pause_resume(),
+            "resume": lambda: self.core.is_paused and self.core.pause_resume(),
+            "next": self.core.play_next,
+            "previous": self.core.play_previous,
+            "stop": self.core.stop,
+            "queue": self.queue,
+            "volume": self.volume,
+            "seek": self.core.seek,
+            "status": self.core.status,
+            "search": self.search,
+        }
+
+    def start(self):
+        # Listen on the socket; a stale socket file from a crashed run is
+        # replaced, one with a live server behind it is an error
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.remove(self.path)
+            else:
+                raise OSError(f"A player is already listening on {self.path}")
+            finally:
+                probe.close()
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # Created owner-only, so no other user can connect before a chmod
+        umask = os.umask(0o177)
+        try:
+            self.listener.bind(self.path)
+        finally:
+            os.umask(umask)
+        self.listener.listen(16)
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.wake_end.setblocking(False)
+        self.selector.register(self.wake_end, selectors.EVENT_READ)
+        self.core.subscribe(self.on_core_event)
+        self.running = True
+
+    def start_thread(self):
+        # Serve on a background thread, e.g. next to the Tk window
+        self.start()
+        self.thread = threading.Thread(target=self.serve, name="control", daemon=True)
+        self.thread.start()
+
+    def serve(self, timeout=0.5):
+        self.server_thread = threading.get_ident()
+        while self.running:
+            self.step(timeout)
+
+    def serve_forever(self):
+        # Headless: the server loop also polls the core, waking when the song
+        # ends or the I/O executor has results
+        self.server_thread = threading.get_ident()
+        while self.running:
+            delay = self.core.poll()
+            if self.core.io is not None and self.core.io.outstanding:
+                timeout = 0.01
+            else:
+                timeout = 0.5 if delay is None else delay / 1000
+            self.step(timeout)
+
+    def step(self, timeout):
+        for key, mask in self.selector.select(timeout):
+            if key.fileobj is self.listener:
+                self.accept()
+            elif key.fileobj is self.wake_end:
+                try:
+                    self.wake_end.recv(4096)
+                except BlockingIOError:
+                    pass
+            elif mask & selectors.EVENT_READ:
+                self.receive(key.data)
+            elif mask & selectors.EVENT_WRITE:
+                self.flush(key.data)
+        self.send_events()
+
+    def close(self):
+        self.running = False
+        self.wake()
+        if self.thread is not None:
+            self.thread.join()
+        self.core.unsubscribe(self.on_core_event)
+        for client in list(self.clients):
+            self.drop(client)
+        if self.listener is not None:
+            self.selector.unregister(self.listener)
+            self.listener.close()
+            self.listener = None
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        self.selector.close()
+        self.waker.close()
+        self.wake_end.close()
+
+    def wake(self):
+        try:
+            self.waker.send(b"\0")
+        except (BlockingIOError, OSError):
+            pass
+
+    # Connections
+
+    def accept(self):
+        try:
+            sock, _ = self.listener.accept()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        client = Client(sock)
+        self.clients.add(client)
+        self.selector.register(sock, selectors.EVENT_READ, client)
+
+    def drop(self, client):
+        if client not in self.clients:
+            return
+        self.subscribe(client, False)
+        self.clients.discard(client)
+        self.selector.unregister(client.sock)
+        client.sock.close()
+
+    def receive(self, client):
+        try:
+            data = client.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.drop(client)
+            return
+        client.inbox += data
+        while True:
+            end = client.inbox.find(b"\n")
+            if end < 0:
+                break
+            line = bytes(client.inbox[:end])
+            del client.inbox[:end + 1]
+            if line.strip():
+                self.reply(client, self.handle(client, line))
+            if client not in self.clients:
+                return
+        if len(client.inbox) > MAX_LINE:
+            self.reply(client, {"ok": False, "error": "Request line too long"})
+            self.drop(client)
+
+    def reply(self, client, message):
+        client.outbox += encode(message)
+        self.flush(client)
+
+    def flush(self, client):
+        if client not in self.clients:
+            return
+        try:
+            sent = client.sock.send(client.outbox)
+        except (BlockingIOError, InterruptedError):
+            sent = 0
+        except OSError:
+            self.drop(client)
+            return
+        del client.outbox[:sent]
+        if len(client.outbox) > MAX_PENDING:
+            # A subscriber that stopped reading
+            self.drop(client)
+            return
+        events = selectors.EVENT_READ | (selectors.EVENT_WRITE if client.outbox else 0)
+        if self.selector.get_key(client.sock).events != events:
+            self.selector.modify(client.sock, events, client)
+
+    # Commands
+
+    def handle(self, client, line):
+        request_id = None
+        with STATS.timer("control.command"):
+            try:
+                args = json.loads(line)
+                if not isinstance(args, dict):
+                    raise ValueError("Request must be a JSON object")
+                request_id = args.pop("id", None)
+                command = args.pop("cmd", None)
+                if command in ("subscribe", "unsubscribe"):
+                    self.subscribe(client, command == "subscribe")
+                    result = client.subscribed
+                elif command in self.commands:
+                    result = self.commands[command](**args)
+                elif command in self.DISPATCHED:
+                    result = self.core.dispatch(command, **args)
+                else:
+                    raise ValueError(f"Unknown command: {command}")
+                message = {"ok": True, "result": result}
+            except Exception as error:
+                message = {"ok": False, "error": str(error) or type(error).__name__}
+        if request_id is not None:
+            message["id"] = request_id
+        return message
+
+    def play(self, index=None, path=None):
+        # A song by list index or path; without either resume, or start
+        # shuffling when nothing plays
+        if path is not None:
+            return self.core.play_song(path)
+        if index is not None:
+            return self.core.play_index(index)
+        if self.core.is_paused:
+            return self.core.pause_resume()
+        return self.core.is_playing() or self.core.play_random()
+
+    def queue(self, path=None, paths=()):
+        return self.core.enqueue(([path] if path is not None else []) + list(paths))
+
+    def volume(self, value=None):
+        if value is not None:
+            self.core.set_volume(max(0.0, min(1.0, float(value))))
+        return self.core.volume
+
+    def search(self, query, limit=100):
+        songs = self.core.songs
+        return [{"index": index, "path": songs[index]} for index in self.core.search(query, limit=limit)]
+
+    # Events
+
+    def subscribe(self, client, subscribed):
+        if subscribed != client.subscribed:
+            client.subscribed = subscribed
+            self.subscribers += 1 if subscribed else -1
+
+    def on_core_event(self, event, data):
+        # Called on whichever thread ran the command; only the server thread
+        # touches the sockets
+        if not self.subscribers:
+            return
+        self.events.append(dict(data, event=event))
+        if threading.get_ident() != self.server_thread:
+            self.wake()
+
+    def send_events(self):
+        if not self.events:
+            return
+        lines = bytearray()
+        while self.events:
+            lines += encode(self.events.popleft())
+        for client in list(self.clients):
+            if client.subscribed:
+                client.outbox += lines
+                self.flush(client)
+
+
+class ControlClient:
+    # Blocking client for scripts and tests. call() returns a command's
+    # result or raises RuntimeError; pushed events are kept in events.
+
+    def __init__(self, path=None, timeout=5.0):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path or default_socket_path())
+        self.reader = self.sock.makefile("rb")
+        self.events = deque()
+
+    def call(self, cmd, **args):
+        self.sock.sendall(encode(dict(args, cmd=cmd)))
+        while True:
+            message = self.read()
+            if "event" in message:
+                self.events.append(message)
+                continue
+            if not message["ok"]:
+                raise RuntimeError(message["error"])
+            return message["result"]
+
+    def read(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Player closed the connection")
+        return json.loads(line)
+
+    def next_event(self):
+        return self.events.popleft() if self.events else self.read()
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+
+def run_daemon(core, path=None):
+    # Serve a headless core until interrupted, then save its state
+    server = ControlServer(core, path)
+    server.start()
+
+    def stop(signum, frame):
+        server.running = False
+    signal.signal(signal.SIGTERM, stop)
+    print(f"Listening on {server.path}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        core.close()
+    return 0
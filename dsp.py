@@ -0,0 +1,474 @@
+import threading
+import time
+import wave
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from instrumentation import STATS
+
+# Frames per processing block: 4096 is 93 ms at 44.1 kHz
+BLOCK_FRAMES = 4096
+# Rendered blocks kept ahead of the mixer channel
+LOOKAHEAD_BLOCKS = 4
+CROSSFADE_SECONDS = 4.0
+# Equalizer band centres in Hz; gains in dB are interpolated between them on
+# a log frequency scale
+EQ_BANDS = (60, 170, 310, 600, 1000, 3000, 6000, 12000, 14000, 16000)
+EQ_TAPS = 1024
+
+
+class ArraySource:
+    # A song decoded into memory: (frames, channels) samples, read a block at
+    # a time as float32 in -1..1. gain is the song's loudness gain.
+
+    def __init__(self, path, samples, rate, gain=1.0, keep=None):
+        self.path = path
+        self.samples = samples
+        self.rate = rate
+        self.gain = gain
+        self.frames = len(samples)
+        self.position = 0
+        self.scale = np.float32(gain if samples.dtype.kind == "f" else gain / 2 ** (8 * samples.itemsize - 1))
+        # Whatever owns the samples' memory, e.g. a pygame Sound
+        self.keep = keep
+
+    def read(self, frames):
+        block = self.samples[self.position:self.position + frames]
+        self.position += len(block)
+        return block.astype(np.float32) * self.scale
+
+    def remaining(self):
+        return self.frames - self.position
+
+    def seek(self, seconds):
+        self.position = max(0, min(self.frames, int(seconds * self.rate)))
+
+    def seconds(self):
+        return self.position / self.rate
+
+    def close(self):
+        self.keep = None
+
+
+class WavSource(ArraySource):
+    # A 16-bit WAV file already in the mixer's format, streamed from disk
+
+    def __init__(self, path, reader, gain=1.0):
+        self.path = path
+        self.reader = reader
+        self.rate = reader.getframerate()
+        self.channels = reader.getnchannels()
+        self.gain = gain
+        self.frames = reader.getnframes()
+        self.position = 0
+        self.scale = np.float32(gain / 32768)
+
+    def read(self, frames):
+        data = self.reader.readframes(frames)
+        block = np.frombuffer(data, dtype="<i2").reshape(-1, self.channels)
+        self.position += len(block)
+        return block.astype(np.float32) * self.scale
+
+    def seek(self, seconds):
+        super().seek(seconds)
+        self.reader.setpos(self.position)
+
+    def close(self):
+        self.reader.close()
+
+
+def open_source(path, rate, channels, gain=1.0):
+    # A source for path in the mixer's rate and channels. WAV files in that
+    # format are streamed; everything else is decoded by SDL_mixer.
+    if path.lower().endswith(".wav"):
+        try:
+            reader = wave.open(path, "rb")
+        except (wave.Error, EOFError):
+            reader = None
+        if reader is not None:
+            if (reader.getsampwidth(), reader.getcomptype(), reader.getframerate(),
+                    reader.getnchannels()) == (2, "NONE", rate, channels):
+                return WavSource(path, reader, gain)
+            reader.close()
+    import pygame
+    with STATS.timer("dsp.decode", path=path):
+        sound = pygame.mixer.Sound(path)
+        samples = pygame.sndarray.samples(sound)
+    return ArraySource(path, samples.reshape(len(samples), -1), rate, gain, keep=sound)
+
+
+class Equalizer:
+    # Multi-band EQ as one linear-phase FIR filter, applied a block at a time
+    # by FFT convolution (overlap-save). All bands at 0 dB bypass it.
+
+    def __init__(self, rate, channels, bands=EQ_BANDS, taps=EQ_TAPS):
+        self.rate = rate
+        self.channels = channels
+        self.bands = np.asarray(bands, dtype=np.float64)
+        self.taps = taps
+        self.gains = np.zeros(len(bands))
+        self.spectrum = None
+        self.size = 0
+        self.history = np.zeros((taps - 1, channels), dtype=np.float32)
+
+    def set_gains(self, gains_db):
+        if len(gains_db) != len(self.bands):
+            raise ValueError(f"Expected {len(self.bands)} band gains, got {len(gains_db)}")
+        self.gains = np.asarray(gains_db, dtype=np.float64)
+        self.spectrum = None
+        self.size = 0
+
+    def active(self):
+        return bool(np.any(self.gains))
+
+    def reset(self):
+        self.history[:] = 0
+
+    def response(self):
+        # FIR taps from the band gains by frequency sampling, Hann windowed
+        freqs = np.fft.rfftfreq(self.taps, 1 / self.rate)
+        log_freqs = np.log(np.maximum(freqs, 1.0))
+        gains = np.interp(log_freqs, np.log(self.bands), self.gains)
+        kernel = np.fft.irfft(10 ** (gains / 20), n=self.taps)
+        return (np.roll(kernel, self.taps // 2) * np.hanning(self.taps)).astype(np.float32)
+
+    def process(self, block):
+        if not self.active():
+            return block
+        frames = len(block)
+        size = 1 << (frames + self.taps - 2).bit_length()
+        if self.spectrum is None or size != self.size:
+            self.size = size
+            self.spectrum = np.fft.rfft(self.response(), n=size)[:, None]
+        signal = np.concatenate((self.history, block))
+        self.history = signal[-(self.taps - 1):]
+        filtered = np.fft.irfft(np.fft.rfft(signal, n=size, axis=0) * self.spectrum, n=size, axis=0)
+        return filtered[self.taps - 1:self.taps - 1 + frames].astype(np.float32)
+
+
+class Pipeline:
+    # The NumPy part of the engine, no audio device involved: the current song
+    # and the next one, read in blocks of block_frames, crossfaded with equal
+    # power over the last crossfade seconds, then equalized. next_block()
+    # returns (tag, block) where tag is (path, seconds into that song) for the
+    # song the block belongs to, the incoming one during a crossfade; None
+    # once the songs ran out.
+
+    def __init__(self, rate, channels, block_frames=BLOCK_FRAMES, crossfade=CROSSFADE_SECONDS, bands=EQ_BANDS):
+        self.rate = rate
+        self.channels = channels
+        self.block_frames = block_frames
+        self.crossfade_frames = int(crossfade * rate)
+        self.eq = Equalizer(rate, channels, bands)
+        self.current = None
+        self.next = None
+        # Frames done and total of a running crossfade
+        self.fade = None
+
+    def start(self, source):
+        self.stop()
+        self.current = source
+        self.eq.reset()
+
+    def queue(self, source):
+        if self.next is not None:
+            self.next.close()
+        self.fade = None
+        self.next = source
+
+    def stop(self):
+        for source in (self.current, self.next):
+            if source is not None:
+                source.close()
+        self.current = self.next = self.fade = None
+
+    def seek(self, path, seconds):
+        # Seek the song playing as path, ending a crossfade if one runs
+        if self.fade is not None and self.next.path == path:
+            self.current.close()
+            self.current, self.next = self.next, None
+        elif self.current is None or self.current.path != path:
+            return False
+        self.fade = None
+        self.current.seek(seconds)
+        self.eq.reset()
+        return True
+
+    def next_block(self):
+        if self.current is None:
+            return None
+        frames = self.block_frames
+        if self.fade is None and self.next is not None and self.current.remaining() <= self.crossfade_frames:
+            self.fade = [0, max(1, min(self.current.remaining(), self.crossfade_frames, self.next.frames // 2))]
+        if self.fade is not None:
+            tag = (self.next.path, self.next.seconds())
+            block = self._mix(self._read(self.current, frames), self._read(self.next, frames))
+            if self.fade[0] >= self.fade[1] or not self.current.remaining():
+                self.current.close()
+                self.current, self.next, self.fade = self.next, None, None
+        else:
+            tag = (self.current.path, self.current.seconds())
+            block = self.current.read(frames)
+            if len(block) < frames:
+                # Song over: the next one follows without a gap, or silence
+                rest = self._read(self.next, frames - len(block)) if self.next is not None else \
+                    np.zeros((frames - len(block), self.channels), dtype=np.float32)
+                block = np.concatenate((block, rest))
+                self.current.close()
+                self.current, self.next = self.next, None
+        return tag, self.eq.process(block)
+
+    def _read(self, source, frames):
+        block = source.read(frames)
+        if len(block) < frames:
+            block = np.concatenate((block, np.zeros((frames - len(block), self.channels), dtype=np.float32)))
+        return block
+
+    def _mix(self, outgoing, incoming):
+        done, total = self.fade
+        angle = np.minimum(np.arange(done, done + len(outgoing), dtype=np.float32) / total, 1.0) * np.float32(np.pi / 2)
+        self.fade[0] += len(outgoing)
+        return outgoing * np.cos(angle)[:, None] + incoming * np.sin(angle)[:, None]
+
+
+def to_pcm(block, volume, previous, size):
+    # Mixer sample bytes of a float block, the volume ramped from previous to
+    # volume across the block so changes do not click
+    ramp = np.linspace(previous, volume, len(block), dtype=np.float32)[:, None]
+    block = block * ramp
+    if size == 32:
+        return np.clip(block, -1.0, 1.0).astype("<f4").tobytes()
+    return (np.clip(block, -1.0, 32767 / 32768) * 32768).astype("<i2").tobytes()
+
+
+class DSPEngine:
+    # Optional playback engine for PlayerCore in place of pygame.mixer.music:
+    # songs are decoded into blocks, run through the Pipeline (crossfade and
+    # EQ) and the volume stage, and played on a reserved mixer channel. One
+    # thread renders up to lookahead blocks ahead and keeps the channel's
+    # queue slot filled; the volume is applied as blocks go to the channel, so
+    # volume changes are heard within a block or two. Decoding a song runs on
+    # a second thread.
+    #
+    # Commands return right away. What the listener hears is reported through
+    # take_events(): ("advanced", path) when a queued song starts (at the
+    # start of its crossfade) and ("ended", path) when playback ran out or a
+    # song could not be opened.
+
+    def __init__(self, block_frames=BLOCK_FRAMES, lookahead=LOOKAHEAD_BLOCKS, crossfade=CROSSFADE_SECONDS,
+                 bands=EQ_BANDS):
+        self.block_frames = block_frames
+        self.lookahead = lookahead
+        self.crossfade = crossfade
+        self.bands = bands
+        self.eq_gains = None
+        self.pipeline = None
+        self.channel = None
+        self.size = -16
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.opener = ThreadPoolExecutor(max_workers=1, thread_name_prefix="dsp-open")
+        self.thread = None
+        self.running = False
+        self.buffer = deque()
+        self.events = deque()
+        # Songs being opened for play() and queue(); a newer command drops them
+        self.opening = None
+        self.queueing = None
+        self.volume = 1.0
+        self.applied_volume = 1.0
+        self.paused = False
+        self.paused_at = 0.0
+        # Tags of the block heard now (and since when) and of the one queued
+        # on the channel after it
+        self.playing = None
+        self.playing_since = 0.0
+        self.queued = None
+        self.heard_path = None
+
+    def start(self):
+        # Take a mixer channel and start the engine thread; needs the mixer
+        if self.thread is not None:
+            return
+        import pygame
+        rate, self.size, channels = pygame.mixer.get_init()
+        pygame.mixer.set_reserved(1)
+        self.channel = pygame.mixer.Channel(0)
+        self.pipeline = Pipeline(rate, channels, self.block_frames, self.crossfade, self.bands)
+        if self.eq_gains is not None:
+            self.pipeline.eq.set_gains(self.eq_gains)
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name="dsp", daemon=True)
+        self.thread.start()
+
+    def play(self, path, gain=1.0):
+        self.start()
+        with self.lock:
+            self._flush()
+            self.pipeline.stop()
+            self.events.clear()
+            self.queueing = None
+            self.opening = self._open(path, gain)
+            self.paused = False
+            self.heard_path = path
+            self.playing = (path, 0.0)
+            self.playing_since = time.perf_counter()
+        self.wake.set()
+
+    def queue(self, path, gain=1.0):
+        # The song to crossfade into when the current one ends
+        self.start()
+        with self.lock:
+            self.queueing = self._open(path, gain)
+        self.wake.set()
+
+    def stop(self):
+        if self.thread is None:
+            return
+        with self.lock:
+            self._flush()
+            self.pipeline.stop()
+            self.events.clear()
+            self.opening = self.queueing = None
+            self.playing = None
+            self.paused = False
+
+    def pause(self):
+        with self.lock:
+            if self.channel is not None and not self.paused:
+                self.channel.pause()
+                self.paused = True
+                self.paused_at = time.perf_counter()
+
+    def resume(self):
+        with self.lock:
+            if self.paused:
+                self.channel.unpause()
+                self.paused = False
+                self.playing_since += time.perf_counter() - self.paused_at
+        self.wake.set()
+
+    def seek(self, path, seconds):
+        with self.lock:
+            if self.pipeline is None or not self.pipeline.seek(path, seconds):
+                return False
+            self._flush()
+            self.playing = (path, seconds)
+            self.playing_since = self.paused_at = time.perf_counter()
+        self.wake.set()
+        return True
+
+    def set_volume(self, volume):
+        self.volume = volume
+
+    def set_eq(self, gains_db):
+        # Band gains in dB, one per band in bands
+        with self.lock:
+            if self.pipeline is not None:
+                self.pipeline.eq.set_gains(gains_db)
+            elif len(gains_db) != len(self.bands):
+                raise ValueError(f"Expected {len(self.bands)} band gains, got {len(gains_db)}")
+            self.eq_gains = list(gains_db)
+
+    def position(self):
+        # Seconds into the song being heard
+        with self.lock:
+            if self.playing is None:
+                return 0.0
+            now = self.paused_at if self.paused else time.perf_counter()
+            return self.playing[1] + min(max(0.0, now - self.playing_since),
+                                         self.block_frames / self.pipeline.rate)
+
+    def is_busy(self):
+        # Playing and not paused, like pygame.mixer.music.get_busy()
+        return self.playing is not None and not self.paused
+
+    def take_events(self):
+        events = []
+        while self.events:
+            events.append(self.events.popleft())
+        return events
+
+    def close(self):
+        self.stop()
+        self.running = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.opener.shutdown(wait=False, cancel_futures=True)
+
+    def _open(self, path, gain):
+        return self.opener.submit(open_source, path, self.pipeline.rate, self.pipeline.channels, gain)
+
+    def _flush(self):
+        self.buffer.clear()
+        self.channel.stop()
+        self.queued = None
+        self.applied_volume = self.volume
+
+    def _run(self):
+        block_seconds = self.block_frames / self.pipeline.rate
+        while self.running:
+            with self.lock:
+                busy = self._step()
+            if not busy:
+                self.wake.wait(min(0.01, block_seconds / 4))
+                self.wake.clear()
+
+    def _step(self):
+        # One unit of work under the lock; False when there was nothing to do
+        self._take_opened()
+        if self.queued is not None and self.channel.get_queue() is None:
+            # The queued block started playing
+            self._heard(self.queued)
+            self.queued = None
+        if not self.paused and self.buffer and (self.queued is None or not self.channel.get_busy()):
+            self._push()
+            return True
+        if len(self.buffer) < self.lookahead and self.pipeline.current is not None:
+            with STATS.timer("dsp.block"):
+                self.buffer.append(self.pipeline.next_block())
+            return True
+        if (self.playing is not None and self.opening is None and self.pipeline.current is None
+                and not self.buffer and not self.paused and not self.channel.get_busy()):
+            self.events.append(("ended", self.playing[0]))
+            self.playing = None
+        return False
+
+    def _take_opened(self):
+        for name in ("opening", "queueing"):
+            future = getattr(self, name)
+            if future is None or not future.done():
+                continue
+            setattr(self, name, None)
+            source = future.result() if future.exception() is None else None
+            if name == "opening":
+                if source is None:
+                    self.events.append(("ended", self.heard_path))
+                    self.playing = None
+                else:
+                    self.pipeline.start(source)
+            elif source is not None:
+                self.pipeline.queue(source)
+
+    def _push(self):
+        import pygame
+        tag, block = self.buffer.popleft()
+        pcm = to_pcm(block, self.volume, self.applied_volume, self.size)
+        self.applied_volume = self.volume
+        sound = pygame.mixer.Sound(buffer=pcm)
+        if self.channel.get_busy():
+            self.channel.queue(sound)
+            self.queued = tag
+        else:
+            self.channel.play(sound)
+            self._heard(tag)
+
+    def _heard(self, tag):
+        self.playing = tag
+        self.playing_since = time.perf_counter()
+        if tag[0] != self.heard_path:
+            self.heard_path = tag[0]
+            self.events.append(("advanced", tag[0]))
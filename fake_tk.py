@@ -0,0 +1,20 @@
+import functools
+
+
+class FakeRoot:
+    # Just enough of a Tk root for code that schedules work with root.after:
+    # callbacks are collected in jobs (None once cancelled) and run by hand
+    def __init__(self):
+        self.jobs = []
+
+    def after(self, ms, func, *args):
+        self.jobs.append(functools.partial(func, *args) if args else func)
+        return len(self.jobs)
+
+    def after_cancel(self, job):
+        self.jobs[job - 1] = None
+
+    def run_pending(self):
+        jobs, self.jobs = [job for job in self.jobs if job is not None], []
+        for job in jobs:
+            job()
@@ -0,0 +1,123 @@
+# Fast-start launcher for the music player, used by the spotify_fast.spec build.
+#
+#   python fast_start.py                    start the player
+#   python fast_start.py --measure-startup  print the startup times as JSON and exit; they
+#                                           are also appended to startup_times.jsonl in the
+#                                           data folder, for windowed builds without a console
+#   python fast_start.py --stats            with the Stats window, like spotify.py
+#   python fast_start.py --watch            follow changes in the song folders, like spotify.py
+#
+# The window is drawn before the player modules (pygame, numpy, mutagen) are
+# imported. They load on a background thread while the window shows
+# "Starting...", the song list comes from the library snapshot written at the
+# last exit and the audio device is opened in the background.
+import time
+
+# Startup times are measured from here; interpreter start and unpacking of a
+# frozen build come before it
+START = time.perf_counter()
+
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import tkinter as tk
+
+
+class Launcher:
+    # Shows the window, imports the player in the background, then builds it.
+    # times holds seconds from START to "first_frame", "imports", "ui_ready"
+    # and "audio_ready".
+
+    def __init__(self, root, measure=False, stats=False, watch=False, cache_mb=0, dsp=False, control=False,
+                 analyze=True, poll_ms=20):
+        self.root = root
+        self.measure = measure
+        self.stats = stats
+        self.watch = watch
+        self.cache_mb = cache_mb
+        self.dsp = dsp
+        self.control = control
+        self.analyze = analyze
+        self.poll_ms = poll_ms
+        self.times = {}
+        self.module = None
+        self.error = None
+        self.player = None
+
+        self.root.title("Simple Music Player")
+        self.root.geometry("500x800")
+        self.root.configure(bg="#808080")
+        self.splash = tk.Label(self.root, text="Starting...", bg="#808080", fg="#fff", font=("Arial", 14))
+        self.splash.pack(expand=True)
+        self.root.update()
+        self.mark("first_frame")
+
+        self.loader = threading.Thread(target=self.import_player, name="player-import", daemon=True)
+        self.loader.start()
+        self.root.after(self.poll_ms, self.wait_for_import)
+
+    def mark(self, name):
+        self.times[name] = time.perf_counter() - START
+
+    def import_player(self):
+        try:
+            import spotify
+        except Exception as error:
+            self.error = error
+            return
+        self.module = spotify
+        self.mark("imports")
+
+    def wait_for_import(self):
+        if self.loader.is_alive():
+            self.root.after(self.poll_ms, self.wait_for_import)
+            return
+        if self.error is not None:
+            raise self.error
+        if self.stats:
+            self.module.STATS.enable()
+        self.splash.destroy()
+        self.player = self.module.MusicPlayer(self.root, fast_start=True, watch=self.watch,
+                                             cache_mb=self.cache_mb, dsp=self.dsp, control=self.control,
+                                             analyze=self.analyze)
+        self.root.update_idletasks()
+        self.mark("ui_ready")
+        self.wait_for_audio()
+
+    def wait_for_audio(self):
+        if not self.player.core.mixer_ready:
+            self.root.after(self.poll_ms, self.wait_for_audio)
+            return
+        self.mark("audio_ready")
+        for name, seconds in self.times.items():
+            self.module.STATS.gauge(f"startup.{name}_ms", round(seconds * 1000, 1))
+        if self.measure:
+            from library import user_data_dir
+
+            line = json.dumps({name: round(seconds * 1000, 1) for name, seconds in self.times.items()})
+            if sys.stdout is not None:
+                print(line)
+            with open(os.path.join(user_data_dir(), "startup_times.jsonl"), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+            self.player.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # The loudness analyzer starts worker processes, also from a frozen build
+    multiprocessing.freeze_support()
+    root = tk.Tk()
+    Launcher(root, measure="--measure-startup" in argv,
+             stats="--stats" in argv or bool(os.environ.get("MUSIC_PLAYER_STATS")),
+             watch="--watch" in argv or bool(os.environ.get("MUSIC_PLAYER_WATCH")),
+             cache_mb=int(os.environ.get("MUSIC_PLAYER_CACHE_MB", "0")),
+             dsp="--dsp" in argv or bool(os.environ.get("MUSIC_PLAYER_DSP")),
+             control="--control" in argv,
+             analyze="--no-analyze" not in argv and os.environ.get("MUSIC_PLAYER_ANALYZE", "1") != "0")
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import STATS
+
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix="favorites")
+
+
+class FavoritesStore:
+    # Ordered set of favorites kept on disk as a snapshot plus an append-only log.
+    # add/remove only change memory and mark the change pending; a debounce timer
+    # appends pending changes to <path>.log. Once the log grows past the snapshot
+    # it is folded into a new snapshot written to a temp file and swapped in with
+    # os.replace, so a crash never leaves a half-written favorites file.
+    #
+    # fmt is "lines" (one entry per line, the .fav format) or "json" (a JSON list).
+
+    def __init__(self, path, fmt="lines", debounce=1.0, min_compact=1000):
+        self.path = path
+        self.log_path = path + ".log"
+        self.fmt = fmt
+        self.debounce = debounce
+        self.min_compact = min_compact
+        self.items = {}
+        self.pending = []
+        self.log_entries = 0
+        self.lock = threading.Lock()
+        self.timer = None
+        self.load()
+
+    def __contains__(self, item):
+        return item in self.items
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+    def load(self):
+        # Read the snapshot, then replay the log on top of it
+        with STATS.timer("favorites.load", path=self.path):
+            self.items = dict.fromkeys(self._read_snapshot())
+            self.log_entries = 0
+            try:
+                with open(self.log_path, "r+b") as log:
+                    end = 0
+                    for line in log:
+                        if not line.endswith(b"\n"):
+                            # A torn write at the end of the log: cut it off, or
+                            # the next flush would append onto the partial line
+                            log.truncate(end)
+                            break
+                        end += len(line)
+                        op, _, item = line.decode("utf-8").rstrip("\n").partition("\t")
+                        if op == "+":
+                            self.items[item] = None
+                        elif op == "-":
+                            self.items.pop(item, None)
+                        self.log_entries += 1
+            except FileNotFoundError:
+                pass
+
+    # Changes hold the lock, since compact() writes the items out on the
+    # debounce timer's thread
+
+    def add(self, item):
+        with self.lock:
+            if item not in self.items:
+                self.items[item] = None
+                self._record("+", item)
+
+    def remove(self, item):
+        with self.lock:
+            if item in self.items:
+                del self.items[item]
+                self._record("-", item)
+
+    def toggle(self, item):
+        # Returns True if the item is a favorite afterwards
+        with self.lock:
+            if item in self.items:
+                del self.items[item]
+                self._record("-", item)
+                return False
+            self.items[item] = None
+            self._record("+", item)
+            return True
+
+    def replace_all(self, items):
+        # Make items the whole content and write a fresh snapshot right away
+        with self.lock:
+            self.items = dict.fromkeys(items)
+            self.pending = []
+        self.compact()
+
+    def flush(self):
+        # Append pending changes to the log; compacts when the log got too long
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            pending, self.pending = self.pending, []
+            if pending:
+                with STATS.timer("favorites.flush", entries=len(pending)):
+                    with open(self.log_path, "a", encoding="utf-8") as log:
+                        log.write("".join(f"{op}\t{item}\n" for op, item in pending))
+                        log.flush()
+                        os.fsync(log.fileno())
+                self.log_entries += len(pending)
+            needs_compact = self.log_entries > max(self.min_compact, len(self.items))
+        if needs_compact:
+            self.compact()
+
+    def compact(self):
+        # Write the current items as the new snapshot and drop the log
+        with self.lock, STATS.timer("favorites.compact", entries=len(self.items)):
+            folder = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".favorites-", suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as tmp:
+                    if self.fmt == "json":
+                        json.dump(list(self.items), tmp)
+                    else:
+                        tmp.write("".join(item + "\n" for item in self.items))
+                    tmp.flush()
+                    os.fsync(tmp.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            if os.path.exists(self.log_path):
+                os.remove(self.log_path)
+            self.log_entries = 0
+
+    def close(self):
+        # Write everything out as a compact snapshot
+        self.flush()
+        if self.log_entries:
+            self.compact()
+
+    def _record(self, op, item):
+        # Called with the lock held
+        self.pending.append((op, item))
+        if self.timer is None:
+            self.timer = threading.Timer(self.debounce, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _read_snapshot(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                if self.fmt == "json":
+                    return [str(item) for item in json.load(file)]
+                return [line.strip() for line in file if line.strip()]
+        except FileNotFoundError:
+            return []
+
+
+def validate_paths(paths, max_workers=16, chunk_size=256):
+    # Return the paths that exist, checking chunks of them in parallel
+    paths = list(paths)
+    STATS.count("favorites.validated", len(paths))
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    if len(chunks) <= 1:
+        return [path for path in paths if os.path.exists(path)]
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = pool.map(lambda chunk: [path for path in chunk if os.path.exists(path)], chunks)
+        return [path for chunk in results for path in chunk]
+
+
+def load_in_background(path, fmt="lines", validate=True):
+    # Open a store and check its entries off the calling thread.
+    # The future resolves to (store, existing_entries).
+    def load():
+        store = FavoritesStore(path, fmt=fmt)
+        items = list(store)
+        return store, validate_paths(items) if validate else items
+    return _background.submit(load)
@@ -0,0 +1,111 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg")
+
+
+def iter_audio_files(folder, cancel_event=None):
+    # Walk a directory tree with os.scandir and yield audio files in name order
+    stack = [folder]
+    while stack:
+        if cancel_event is not None and cancel_event.is_set():
+            return
+        current = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda entry: entry.name.lower())
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.lower().endswith(AUDIO_EXTENSIONS):
+                    yield entry.path
+            except OSError:
+                continue
+        stack.extend(reversed(subdirs))
+
+
+class FolderImporter:
+    # Imports a folder tree in the background. The walk runs on its own thread,
+    # files are probed in chunks on a bounded pool and finished chunks are handed
+    # to on_batch on the Tk thread through root.after.
+
+    def __init__(self, root, library, on_batch, on_progress=None, on_done=None,
+                 max_workers=8, chunk_size=32, poll_ms=100):
+        self.root = root
+        self.library = library
+        self.on_batch = on_batch
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.poll_ms = poll_ms
+        self.cancel_event = threading.Event()
+        self.results = queue.Queue()
+        self.found = 0
+        self.imported = 0
+        self.running = False
+
+    def start(self, folder):
+        self.running = True
+        threading.Thread(target=self._run, args=(folder,), daemon=True).start()
+        self.root.after(self.poll_ms, self._drain)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _run(self, folder):
+        # Keep at most a few chunks in flight so a huge tree never queues up in memory
+        slots = threading.BoundedSemaphore(self.max_workers * 2)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            chunk = []
+            for path in iter_audio_files(folder, self.cancel_event):
+                self.found += 1
+                chunk.append(path)
+                if len(chunk) >= self.chunk_size:
+                    self._submit(pool, slots, chunk)
+                    chunk = []
+            if chunk and not self.cancel_event.is_set():
+                self._submit(pool, slots, chunk)
+        self.results.put(None)
+
+    def _submit(self, pool, slots, chunk):
+        slots.acquire()
+        future = pool.submit(self._probe_chunk, chunk)
+        future.add_done_callback(lambda f: slots.release())
+
+    def _probe_chunk(self, chunk):
+        if self.cancel_event.is_set():
+            return
+        tracks = self.library.get_many(chunk)
+        self.results.put([path for path in chunk if path in tracks])
+
+    def _drain(self):
+        # Runs on the Tk thread: hand everything that is ready to the view in one batch
+        batch = []
+        finished = False
+        while True:
+            try:
+                item = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+                break
+            batch.extend(item)
+        if batch and not self.cancel_event.is_set():
+            self.imported += len(batch)
+            self.on_batch(batch)
+        if self.on_progress:
+            self.on_progress(self.imported, self.found)
+        if finished:
+            self.running = False
+            if self.on_done:
+                self.on_done(self.cancel_event.is_set())
+        else:
+            self.root.after(self.poll_ms, self._drain)
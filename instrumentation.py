@@ -0,0 +1,208 @@
+import json
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import nullcontext
+
+# Returned by Stats.timer() while disabled, so an instrumented block costs one
+# attribute check and nothing is recorded
+NO_TIMER = nullcontext()
+
+
+class Timing:
+    # Totals for one timer plus its most recent durations
+
+    def __init__(self, window):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=window)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def summary(self):
+        recent = sorted(self.recent)
+        p50 = recent[len(recent) // 2] if recent else 0.0
+        p95 = recent[min(len(recent) - 1, int(len(recent) * 0.95))] if recent else 0.0
+        return {"count": self.count, "total": self.total, "max": self.max,
+                "mean": self.total / self.count if self.count else 0.0,
+                "recent_p50": p50, "recent_p95": p95, "recent_max": recent[-1] if recent else 0.0}
+
+
+class _Timer:
+    __slots__ = ("stats", "name", "args", "start")
+
+    def __init__(self, stats, name, args):
+        self.stats = stats
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add_timing(self.name, self.start, time.perf_counter() - self.start, self.args)
+        return False
+
+
+def _thread_group(name):
+    # Pool threads "waveform_0", "waveform_1" count as "waveform"; plain threads
+    # "Thread-7 (add_many)" as "Thread (add_many)"
+    base, _, target = name.partition(" ")
+    for separator in ("_", "-"):
+        head, _, tail = base.rpartition(separator)
+        if head and tail.isdigit():
+            base = head
+            break
+    return f"{base} {target}" if target else base
+
+
+class Stats:
+    # Opt-in timers, counters and gauges for the hot paths. Everything is a
+    # no-op until enable() is called. Timers keep totals plus a rolling window
+    # of recent durations, and every timed block is also kept (up to
+    # trace_events) for a Chrome trace dump that chrome://tracing or Perfetto
+    # can open.
+
+    def __init__(self, window=256, trace_events=100000):
+        self.enabled = False
+        self.window = window
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+        self.gauges = {}
+        self.threads = {}
+        self.trace = deque(maxlen=trace_events)
+        self.epoch = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.timings = {}
+            self.counters = {}
+            self.gauges = {}
+            self.threads = {}
+            self.trace.clear()
+
+    # Recording
+
+    def timer(self, name, **args):
+        # with STATS.timer("mixer.load", path=path): ...
+        if not self.enabled:
+            return NO_TIMER
+        return _Timer(self, name, args)
+
+    def add_timing(self, name, start, seconds, args=None, trace=True):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Timing(self.window)
+            timing.add(seconds)
+            if trace:
+                self.trace.append((name, start, seconds, threading.get_ident(), args))
+
+    def count(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        if self.enabled:
+            self.gauges[name] = value
+
+    def sample_threads(self):
+        # Live threads, in total and grouped by pool or thread name
+        if not self.enabled:
+            return
+        threads = Counter(_thread_group(thread.name) for thread in threading.enumerate())
+        self.threads = dict(threads)
+        self.gauges["threads"] = sum(threads.values())
+
+    # Export
+
+    def snapshot(self):
+        with self.lock:
+            timings = {name: timing.summary() for name, timing in self.timings.items()}
+            counters = dict(self.counters)
+        return {"uptime": time.perf_counter() - self.epoch, "timings": timings, "counters": counters,
+                "gauges": dict(self.gauges), "threads": dict(self.threads)}
+
+    def chrome_trace(self):
+        # Trace Event Format: one complete ("X") event per timed block
+        pid = os.getpid()
+        with self.lock:
+            events = list(self.trace)
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                 for tid, name in names.items()]
+        for name, start, seconds, tid, args in events:
+            event = {"name": name, "cat": name.split(".")[0], "ph": "X", "pid": pid, "tid": tid,
+                     "ts": round((start - self.epoch) * 1e6, 1), "dur": round(seconds * 1e6, 1)}
+            if args:
+                event["args"] = {key: str(value) for key, value in args.items()}
+            trace.append(event)
+        return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+    def dump_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def dump_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+
+class StallMonitor:
+    # Measures how late a root.after heartbeat fires. The Tk thread cannot run
+    # the heartbeat while it is busy, so the delay is how long the UI was frozen.
+    # Thread counts are sampled along the way.
+
+    def __init__(self, root, stats, interval_ms=100, stall_ms=100, thread_every=10):
+        self.root = root
+        self.stats = stats
+        self.interval = interval_ms / 1000
+        self.stall = stall_ms / 1000
+        self.thread_every = thread_every
+        self.ticks = 0
+        self.job = None
+        self.expected = None
+
+    def start(self):
+        if self.job is None:
+            self.expected = time.perf_counter() + self.interval
+            self.job = self.root.after(int(self.interval * 1000), self._tick)
+
+    def stop(self):
+        if self.job is not None:
+            self.root.after_cancel(self.job)
+            self.job = None
+
+    def _tick(self):
+        now = time.perf_counter()
+        late = max(0.0, now - self.expected)
+        if self.stats.enabled:
+            stalled = late >= self.stall
+            self.stats.add_timing("ui.heartbeat_delay", self.expected, late, trace=stalled)
+            if stalled:
+                self.stats.count("ui.stalls")
+            self.ticks += 1
+            if self.ticks % self.thread_every == 0:
+                self.stats.sample_threads()
+        self.expected = now + self.interval
+        self.job = self.root.after(int(self.interval * 1000), self._tick)
+
+
+# The process-wide instance the player modules record into
+STATS = Stats()
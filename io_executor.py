@@ -0,0 +1,112 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import STATS
+
+
+class IOExecutor:
+    # One pool for the blocking disk and decoder work of the player, so the Tk
+    # thread never waits on a slow drive. Callbacks do not run on the worker
+    # threads: finished futures queue up and their callbacks run in a batch on
+    # the owning thread when it calls run_callbacks(). attach(root) does that
+    # from a single root.after loop that only runs while results are expected.
+    #
+    # Work submitted under a key replaces earlier work under the same key: the
+    # earlier future is cancelled if it has not started yet, and its callback
+    # is dropped if it has. Skipping through songs faster than they open only
+    # ever plays the last one.
+    #
+    # Work may be submitted from other threads too; only the owning thread
+    # schedules the after loop, so such results wait for its next pump or
+    # run_callbacks() call.
+
+    def __init__(self, max_workers=2, name="io"):
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.lock = threading.Lock()
+        self.keyed = {}
+        self.finished = deque()
+        self.outstanding = 0
+        self.root = None
+        self.owner = None
+        self.poll_ms = 15
+        self.job = None
+
+    def attach(self, root, poll_ms=15):
+        # Run callbacks on the Tk thread of root
+        self.root = root
+        self.owner = threading.get_ident()
+        self.poll_ms = poll_ms
+        self._schedule()
+
+    def submit(self, func, *args, key=None, callback=None):
+        # Run func(*args) on the pool; callback(future) runs on the owning thread
+        future = self.pool.submit(func, *args)
+        if key is not None:
+            with self.lock:
+                previous = self.keyed.get(key)
+                self.keyed[key] = future
+            if previous is not None:
+                previous.cancel()
+                STATS.count("io.superseded")
+        if callback is not None:
+            self._when_done(future, callback, key)
+        return future
+
+    def when_done(self, future, callback):
+        # Queue callback(future) for the owning thread, also for futures from
+        # other executors. Call this on the owning thread.
+        self._when_done(future, callback, None)
+
+    def _when_done(self, future, callback, key):
+        with self.lock:
+            self.outstanding += 1
+        future.add_done_callback(lambda done: self.finished.append((done, key, callback)))
+        self._schedule()
+
+    def cancel(self, key):
+        # Drop the work under key; its callback will not run
+        with self.lock:
+            future = self.keyed.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    def run_callbacks(self):
+        # Run the callbacks of everything finished so far; returns how many ran
+        ran = 0
+        while self.finished:
+            future, key, callback = self.finished.popleft()
+            with self.lock:
+                self.outstanding -= 1
+            if key is not None:
+                with self.lock:
+                    if self.keyed.get(key) is not future:
+                        continue
+                    del self.keyed[key]
+            if future.cancelled():
+                continue
+            callback(future)
+            ran += 1
+        if ran:
+            STATS.count("io.callbacks", ran)
+        return ran
+
+    def shutdown(self):
+        if self.job is not None:
+            self.root.after_cancel(self.job)
+            self.job = None
+        self.root = None
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule(self):
+        if (self.root is not None and self.job is None and self.outstanding
+                and threading.get_ident() == self.owner):
+            self.job = self.root.after(self.poll_ms, self._pump)
+
+    def _pump(self):
+        self.job = None
+        try:
+            with STATS.timer("io.dispatch"):
+                self.run_callbacks()
+        finally:
+            self._schedule()
@@ -0,0 +1,374 @@
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import namedtuple
+
+from mutagen import File as MutagenFile
+from mutagen.easyid3 import EasyID3
+
+from instrumentation import STATS
+from probe import probe_with_tags, read_id3_text
+
+APP_NAME = "SimpleMusicPlayer"
+
+# loudness (LUFS), peak (dBFS) and gain (linear) are filled in by the loudness
+# analyzer; gain is None until the file has been analyzed. rate and channels
+# come from the header probe.
+Track = namedtuple("Track", "path size mtime duration title artist album favorite loudness peak gain rate channels",
+                   defaults=(None, None, None, None, None))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime REAL,
+    duration REAL,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    favorite INTEGER NOT NULL DEFAULT 0,
+    position INTEGER,
+    loudness REAL,
+    peak REAL,
+    gain REAL,
+    rate INTEGER,
+    channels INTEGER
+)
+"""
+
+# Bumped when the layout of the startup snapshot changes
+SNAPSHOT_VERSION = 2
+
+# Columns added after the first release, created on older databases
+ADDED_COLUMNS = (("loudness", "REAL"), ("peak", "REAL"), ("gain", "REAL"), ("rate", "INTEGER"), ("channels", "INTEGER"))
+
+
+def user_data_dir():
+    # Per-user directory for the library index and other caches
+    override = os.environ.get("MUSIC_PLAYER_DATA_DIR")
+    if override:
+        path = override
+    elif sys.platform == "win32":
+        path = os.path.join(os.environ.get("APPDATA", os.path.expanduser("~")), APP_NAME)
+    elif sys.platform == "darwin":
+        path = os.path.join(os.path.expanduser("~/Library/Application Support"), APP_NAME)
+    else:
+        base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        path = os.path.join(base, APP_NAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_tags(f):
+    # Title, artist and album from a path or binary file. MP3 files only have
+    # the title, artist and album frames of their ID3 tag read; cover art and
+    # other frames are skipped, and the stream info comes from the header probe.
+    if isinstance(f, str):
+        try:
+            with open(f, "rb") as file:
+                return read_tags(file)
+        except OSError:
+            return None, None, None
+    try:
+        if getattr(f, "name", "").lower().endswith(".mp3"):
+            tags = read_id3_text(f)
+            if tags is None:
+                # No ID3v2 tag (maybe ID3v1), or one only mutagen can parse
+                f.seek(0)
+                tags = EasyID3(f)
+        else:
+            audio = MutagenFile(f, easy=True)
+            tags = audio.tags if audio is not None else None
+    except Exception:
+        tags = None
+    result = []
+    for key in ("title", "artist", "album"):
+        try:
+            values = tags.get(key) if tags else None
+        except Exception:
+            values = None
+        result.append(values[0] if values else None)
+    return tuple(result)
+
+
+def probe_metadata(path):
+    # Read stream info and basic tags; returns
+    # (duration, title, artist, album, rate, channels)
+    try:
+        info, tags = probe_with_tags(path, read_tags)
+    except OSError:
+        return 0, None, None, None, None, None
+    STATS.count("library.probe_bytes", info.bytes_read)
+    return (info.duration, *tags, info.rate, info.channels)
+
+
+class LibraryIndex:
+    # Persistent index of known tracks. Metadata is only re-read from a file
+    # when its size or mtime differs from what was stored.
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or os.path.join(user_data_dir(), "library.db")
+        self.snapshot_path = self.db_path + ".snapshot"
+        # Taken before connecting; a snapshot is only trusted if the database
+        # is still exactly as it was left when the snapshot was written
+        self.db_state = self._db_state()
+        self.lock = threading.Lock()
+        self.loader = None
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(SCHEMA)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(tracks)")}
+        for name, kind in ADDED_COLUMNS:
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE tracks ADD COLUMN {name} {kind}")
+        self.conn.commit()
+        self.tracks = {}
+
+    def load(self):
+        # Read the whole index into memory and return the saved song list
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT path, size, mtime, duration, title, artist, album, favorite, position, loudness, peak, gain, "
+                "rate, channels FROM tracks"
+            ).fetchall()
+        self.tracks = {row[0]: Track(*row[:7], bool(row[7]), *row[9:]) for row in rows}
+        listed = sorted((row for row in rows if row[8] is not None), key=lambda row: row[8])
+        return [row[0] for row in listed]
+
+    def load_fast(self):
+        # (songs, favorites) from the snapshot written at the last clean exit,
+        # with the track metadata read on a background thread. Without a usable
+        # snapshot this is a plain load().
+        snapshot = self.read_snapshot()
+        if snapshot is None:
+            songs = self.load()
+            return songs, self.favorites()
+        self.loader = threading.Thread(target=self.load, name="library-load", daemon=True)
+        self.loader.start()
+        return snapshot
+
+    def wait_loaded(self):
+        # Block until a background load() has filled in the track metadata
+        loader = self.loader
+        if loader is not None:
+            loader.join()
+            self.loader = None
+
+    def set_songs(self, paths):
+        # Remember the current song list; files are probed lazily on first use
+        self.wait_loaded()
+        paths = list(paths)
+        with self.lock:
+            self.conn.execute("UPDATE tracks SET position = NULL WHERE position IS NOT NULL")
+            self.conn.executemany(
+                "INSERT INTO tracks (path, position) VALUES (?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET position = excluded.position",
+                ((path, pos) for pos, path in enumerate(paths)),
+            )
+            self.conn.commit()
+        for path in paths:
+            if path not in self.tracks:
+                self.tracks[path] = Track(path, None, None, None, None, None, None, False)
+        return paths
+
+    def append_songs(self, paths):
+        # Add songs to the end of the saved song list
+        self.wait_loaded()
+        paths = list(paths)
+        with self.lock:
+            start = self.conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM tracks").fetchone()[0]
+            self.conn.executemany(
+                "INSERT INTO tracks (path, position) VALUES (?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET position = excluded.position",
+                ((path, start + pos) for pos, path in enumerate(paths)),
+            )
+            self.conn.commit()
+        for path in paths:
+            if path not in self.tracks:
+                self.tracks[path] = Track(path, None, None, None, None, None, None, False)
+        return paths
+
+    def drop_songs(self, paths):
+        # Take songs off the saved song list; their metadata and favorite flag
+        # are kept in case the files come back
+        self.wait_loaded()
+        with self.lock:
+            self.conn.executemany("UPDATE tracks SET position = NULL WHERE path = ?", ((path,) for path in paths))
+            self.conn.commit()
+
+    def rename(self, renames):
+        # Move tracks to new paths for files renamed on disk, as (old, new)
+        # pairs. The size and mtime survive a rename, so nothing is re-probed.
+        self.wait_loaded()
+        renames = [(old, new) for old, new in renames if old in self.tracks]
+        with self.lock:
+            for old, new in renames:
+                self.conn.execute("DELETE FROM tracks WHERE path = ?", (new,))
+                self.conn.execute("UPDATE tracks SET path = ? WHERE path = ?", (new, old))
+            self.conn.commit()
+        for old, new in renames:
+            self.tracks.pop(new, None)
+            self.tracks[new] = self.tracks.pop(old)._replace(path=new)
+
+    def get(self, path):
+        # Return up to date metadata for a file, or None if it is missing
+        self.wait_loaded()
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        track = self.tracks.get(path)
+        if track is not None and track.size == st.st_size and track.mtime == st.st_mtime:
+            return track
+        return self._store(self._probe(path, st, track))
+
+    def get_many(self, paths):
+        # Like get() for a batch of files, written in a single transaction
+        self.wait_loaded()
+        result = {}
+        changed = []
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            track = self.tracks.get(path)
+            if track is None or track.size != st.st_size or track.mtime != st.st_mtime:
+                track = self._probe(path, st, track)
+                changed.append(track)
+            result[path] = track
+        if changed:
+            self._store_many(changed)
+        return result
+
+    def duration(self, path):
+        track = self.get(path)
+        return track.duration if track else 0
+
+    def favorites(self):
+        self.wait_loaded()
+        return {path for path, track in self.tracks.items() if track.favorite}
+
+    def set_favorite(self, paths, favorite=True):
+        self.wait_loaded()
+        paths = list(paths)
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO tracks (path, favorite) VALUES (?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET favorite = excluded.favorite",
+                ((path, int(favorite)) for path in paths),
+            )
+            self.conn.commit()
+        for path in paths:
+            track = self.tracks.get(path) or Track(path, None, None, None, None, None, None, False)
+            self.tracks[path] = track._replace(favorite=favorite)
+
+    def set_loudness(self, results):
+        # Store analysis results as (track, loudness, peak, gain). A result is
+        # dropped if the file was re-probed since the track was read.
+        self.wait_loaded()
+        fresh = []
+        for result in results:
+            current = self.tracks.get(result[0].path)
+            if current is not None and (current.size, current.mtime) == (result[0].size, result[0].mtime):
+                fresh.append(result)
+        results = fresh
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE tracks SET loudness = ?, peak = ?, gain = ? WHERE path = ? AND size = ? AND mtime = ?",
+                ((loudness, peak, gain, t.path, t.size, t.mtime) for t, loudness, peak, gain in results),
+            )
+            self.conn.commit()
+        for track, loudness, peak, gain in results:
+            self.tracks[track.path] = self.tracks[track.path]._replace(loudness=loudness, peak=peak, gain=gain)
+
+    def close(self, songs=None, favorites=None):
+        # Close the database; with a song list, also write the startup snapshot
+        self.wait_loaded()
+        with self.lock:
+            self.conn.close()
+        if songs is not None:
+            self.write_snapshot(songs, favorites or ())
+
+    # Startup snapshot
+
+    def _db_state(self):
+        # Size and mtime of the database, and the size of an uncheckpointed WAL
+        try:
+            st = os.stat(self.db_path)
+        except OSError:
+            return None
+        try:
+            wal = os.path.getsize(self.db_path + "-wal")
+        except OSError:
+            wal = 0
+        return SNAPSHOT_VERSION, st.st_size, st.st_mtime_ns, wal
+
+    def read_snapshot(self):
+        # (songs, favorites) if the snapshot matches the database, else None.
+        # The snapshot is JSON, so a damaged or foreign file is just a miss.
+        if self.db_state is None:
+            return None
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("source") != list(self.db_state):
+            return None
+        songs, favorites = data.get("songs"), data.get("favorites")
+        if not isinstance(songs, list) or not isinstance(favorites, list):
+            return None
+        if not all(isinstance(path, str) for path in songs) or not all(isinstance(path, str) for path in favorites):
+            return None
+        return songs, set(favorites)
+
+    def write_snapshot(self, songs, favorites):
+        # Called after the connection is closed, so the database is checkpointed
+        state = self._db_state()
+        if state is None:
+            return
+        data = {"source": list(state), "songs": list(songs), "favorites": list(favorites)}
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.snapshot_path)), suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, self.snapshot_path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _probe(self, path, st, previous):
+        with STATS.timer("library.probe", path=path):
+            duration, title, artist, album, rate, channels = probe_metadata(path)
+        favorite = previous.favorite if previous else False
+        return Track(path, st.st_size, st.st_mtime, duration, title, artist, album, favorite,
+                     rate=rate, channels=channels)
+
+    def _store(self, track):
+        self._store_many([track])
+        return track
+
+    def _store_many(self, tracks):
+        # A re-probed file also loses its loudness, so it gets analyzed again
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO tracks (path, size, mtime, duration, title, artist, album, favorite, rate, channels) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime, "
+                "duration = excluded.duration, title = excluded.title, artist = excluded.artist, "
+                "album = excluded.album, rate = excluded.rate, channels = excluded.channels, "
+                "loudness = NULL, peak = NULL, gain = NULL",
+                ((t.path, t.size, t.mtime, t.duration, t.title, t.artist, t.album, int(t.favorite), t.rate, t.channels)
+                 for t in tracks),
+            )
+            self.conn.commit()
+        for track in tracks:
+            self.tracks[track.path] = track
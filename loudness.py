@@ -0,0 +1,280 @@
+import multiprocessing
+import os
+import queue
+import threading
+import wave
+from collections import deque
+
+import numpy as np
+
+try:
+    # libsndfile streams WAV, FLAC, OGG and MP3 a block at a time
+    import soundfile
+except (ImportError, OSError):
+    soundfile = None
+
+# Songs are brought to this integrated loudness. pygame cannot amplify, so only
+# louder songs are turned down; quieter ones play at the slider volume.
+TARGET_LOUDNESS = -18.0
+# Gating as in ITU-R BS.1770: 400 ms blocks every 100 ms, an absolute gate at
+# -70 LUFS and a relative gate 10 LU below the ungated level
+STEP_SECONDS = 0.1
+STEPS_PER_BLOCK = 4
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+CHUNK_SECONDS = 10
+
+
+def _to_db(energy):
+    with np.errstate(divide="ignore"):
+        return -0.691 + 10 * np.log10(energy)
+
+
+def step_energies(chunks, rate):
+    # Mean square per 100 ms step (summed over channels) and the peak sample,
+    # from float (frames, channels) chunks in -1..1. Chunks of any length work;
+    # frames that do not fill a step are carried into the next chunk.
+    step = max(1, int(rate * STEP_SECONDS))
+    energies = []
+    peak = 0.0
+    carry = None
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float32)
+        if chunk.ndim == 1:
+            chunk = chunk[:, None]
+        if carry is not None and len(carry):
+            chunk = np.concatenate((carry, chunk))
+        if len(chunk):
+            peak = max(peak, float(np.abs(chunk).max()))
+        usable = len(chunk) // step * step
+        if usable:
+            squares = np.square(chunk[:usable]).reshape(-1, step, chunk.shape[1])
+            energies.append(squares.mean(axis=1).sum(axis=1))
+        carry = chunk[usable:]
+    return (np.concatenate(energies) if energies else np.zeros(0)), peak
+
+
+def integrated_loudness(energies):
+    # Gated loudness in LUFS from step energies; ABSOLUTE_GATE for silence.
+    # K-weighting is left out, which reads bass-heavy songs a little louder.
+    if len(energies) < STEPS_PER_BLOCK:
+        blocks = np.array([energies.mean()]) if len(energies) else energies
+    else:
+        total = np.concatenate(([0.0], np.cumsum(energies, dtype=np.float64)))
+        blocks = (total[STEPS_PER_BLOCK:] - total[:-STEPS_PER_BLOCK]) / STEPS_PER_BLOCK
+    blocks = blocks[_to_db(blocks) > ABSOLUTE_GATE]
+    if not len(blocks):
+        return ABSOLUTE_GATE
+    blocks = blocks[_to_db(blocks) > _to_db(blocks.mean()) + RELATIVE_GATE]
+    return float(_to_db(blocks.mean()))
+
+
+def gain_for(loudness, target=TARGET_LOUDNESS):
+    # Linear volume factor for a song, never above 1.0
+    if loudness is None:
+        return 1.0
+    return float(min(1.0, 10 ** ((target - loudness) / 20)))
+
+
+def decode(path, chunk_seconds=CHUNK_SECONDS):
+    # (rate, chunks) with chunks as float32 (frames, channels) arrays in -1..1.
+    # 16-bit WAV files are streamed by the wave module and other formats by
+    # soundfile when it is installed, so only one chunk is in memory at a time.
+    # Anything else is decoded whole by SDL_mixer.
+    if path.lower().endswith(".wav"):
+        try:
+            return _decode_wav(path, chunk_seconds)
+        except (wave.Error, EOFError):
+            pass
+    if soundfile is not None:
+        try:
+            return _decode_soundfile(path, chunk_seconds)
+        except (RuntimeError, TypeError):
+            pass
+    return _decode_pygame(path, chunk_seconds)
+
+
+def _decode_wav(path, chunk_seconds):
+    w = wave.open(path, "rb")
+    if w.getsampwidth() != 2 or w.getcomptype() != "NONE":
+        w.close()
+        raise wave.Error("not 16-bit PCM")
+    rate, channels = w.getframerate(), w.getnchannels()
+    frames = int(rate * chunk_seconds)
+
+    def chunks():
+        with w:
+            while True:
+                data = w.readframes(frames)
+                if not data:
+                    return
+                samples = np.frombuffer(data, dtype="<i2").reshape(-1, channels)
+                yield samples.astype(np.float32) / 32768.0
+
+    return rate, chunks()
+
+
+def _decode_soundfile(path, chunk_seconds):
+    f = soundfile.SoundFile(path)
+    frames = int(f.samplerate * chunk_seconds)
+
+    def chunks():
+        with f:
+            while True:
+                block = f.read(frames, dtype="float32", always_2d=True)
+                if not len(block):
+                    return
+                yield block
+
+    return f.samplerate, chunks()
+
+
+def _decode_pygame(path, chunk_seconds):
+    import pygame
+    if not pygame.mixer.get_init():
+        pygame.mixer.init(frequency=44100, size=-16, channels=2)
+    rate, size, _ = pygame.mixer.get_init()
+    samples = pygame.sndarray.samples(pygame.mixer.Sound(path))
+    scale = 1.0 if samples.dtype.kind == "f" else float(2 ** (abs(size) - 1))
+    frames = int(rate * chunk_seconds)
+
+    def chunks():
+        for start in range(0, len(samples), frames):
+            yield samples[start:start + frames].astype(np.float32) / scale
+
+    return rate, chunks()
+
+
+def analyze_file(path):
+    # (loudness LUFS, peak dBFS) of one file
+    rate, chunks = decode(path)
+    energies, peak = step_energies(chunks, rate)
+    peak_db = float(20 * np.log10(peak)) if peak > 0 else None
+    return integrated_loudness(energies), peak_db
+
+
+def _init_worker():
+    # Workers decode without an audio device and at low priority so playback
+    # and the UI keep the CPU when they need it
+    os.environ["SDL_AUDIODRIVER"] = "dummy"
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    if hasattr(os, "nice"):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+
+class LoudnessAnalyzer:
+    # Measures queued songs on a process pool and stores loudness, peak and gain
+    # in the library. A feeder thread hands the pool a few files at a time, so a
+    # large library is worked through incrementally; songs that already have a
+    # gain for their current size and mtime are skipped. The pool is started on
+    # demand and shut down again when the queue is empty.
+
+    def __init__(self, library, max_workers=1, batch_size=16):
+        self.library = library
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.queue = deque()
+        self.queued = set()
+        self.lock = threading.Lock()
+        self.thread = None
+        self.cancelled = threading.Event()
+        self.analyzed = 0
+
+    def analyze(self, paths):
+        # Queue songs; returns at once
+        with self.lock:
+            for path in paths:
+                if path not in self.queued:
+                    self.queued.add(path)
+                    self.queue.append(path)
+            if self.thread is None and self.queue:
+                self.cancelled.clear()
+                self.thread = threading.Thread(target=self._run, daemon=True, name="loudness")
+                self.thread.start()
+
+    def pending(self):
+        return len(self.queue)
+
+    def wait(self, timeout=None):
+        thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def close(self):
+        # Drop the queue and stop the workers, abandoning the files being
+        # measured; returns once the feeder thread has saved what is done
+        with self.lock:
+            self.queue.clear()
+            self.queued.clear()
+        self.cancelled.set()
+        self.wait()
+
+    def _next_track(self):
+        # Next queued song that needs measuring, or None when the queue is empty
+        while True:
+            with self.lock:
+                if not self.queue:
+                    return None
+                path = self.queue.popleft()
+                self.queued.discard(path)
+            track = self.library.get(path)
+            if track is not None and track.gain is None:
+                return track
+
+    def _run(self):
+        pool = None
+        running = 0
+        # (track, (loudness, peak)) from the pool's result thread; None for a
+        # file that could not be decoded
+        finished = queue.SimpleQueue()
+        results = []
+        try:
+            while not self.cancelled.is_set():
+                while running < 2 * self.max_workers:
+                    track = self._next_track()
+                    if track is None:
+                        break
+                    if pool is None:
+                        pool = multiprocessing.get_context("spawn").Pool(self.max_workers, initializer=_init_worker)
+                    pool.apply_async(analyze_file, (track.path,),
+                                     callback=lambda measured, track=track: finished.put((track, measured)),
+                                     error_callback=lambda error, track=track: finished.put((track, None)))
+                    running += 1
+                if not running:
+                    with self.lock:
+                        if not self.queue:
+                            self.thread = None
+                            break
+                    continue
+                try:
+                    done = [finished.get(timeout=0.2)]
+                except queue.Empty:
+                    continue
+                while not finished.empty():
+                    done.append(finished.get())
+                for track, measured in done:
+                    running -= 1
+                    # Not decodable: remember it with unit gain so it is not retried
+                    loudness, peak = measured or (None, None)
+                    results.append((track, loudness, peak, gain_for(loudness)))
+                if len(results) >= self.batch_size or not running:
+                    self.library.set_loudness(results)
+                    self.analyzed += len(results)
+                    results = []
+        finally:
+            if results:
+                self.library.set_loudness(results)
+                self.analyzed += len(results)
+            if pool is not None:
+                if self.cancelled.is_set():
+                    # Closing: measurements still running are not worth the wait
+                    pool.terminate()
+                else:
+                    pool.close()
+                pool.join()
+            with self.lock:
+                if self.thread is threading.current_thread():
+                    self.thread = None
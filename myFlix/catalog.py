@@ -0,0 +1,219 @@
+import bisect
+import csv
+import json
+import logging
+import os
+import tempfile
+from collections.abc import Mapping
+
+# Bumped whenever the snapshot layout changes; older snapshots are rebuilt
+SNAPSHOT_VERSION = 2
+
+log = logging.getLogger(__name__)
+
+
+def iter_jsonl(path):
+    # One JSON object per line; blank lines are skipped, malformed ones
+    # skipped and logged
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                log.warning("%s:%d: skipped malformed line: %s", path, number, error)
+                continue
+            if not isinstance(row, dict):
+                log.warning("%s:%d: skipped line that is not a JSON object", path, number)
+                continue
+            yield row
+
+
+def iter_csv(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def split_genres(value):
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split("|")
+    return [genre.strip() for genre in value if genre.strip()]
+
+
+class Catalog(Mapping):
+    # Movie catalog stored column-wise (title, poster, genres, year), with
+    # indexes by title prefix, genre and year. It is a read-only mapping of
+    # title -> poster path, so it can stand in for the old movies dict.
+
+    def __init__(self):
+        self.titles = []
+        self.posters = []
+        self.genres = []
+        self.years = []
+        self.ids = {}
+        self.title_keys = []
+        self.title_order = []
+        self.by_genre = {}
+        self.by_year = {}
+
+    @classmethod
+    def from_items(cls, items):
+        # Build a catalog from (title, poster) pairs or dicts with catalog fields
+        catalog = cls()
+        for item in items:
+            if not isinstance(item, dict):
+                item = {"title": item[0], "poster": item[1]}
+            catalog.add(item)
+        catalog.build_indexes()
+        return catalog
+
+    @classmethod
+    def load(cls, path, use_snapshot=True):
+        # Stream a .jsonl or .csv catalog; a snapshot next to it skips re-parsing
+        # as long as the source file has not changed
+        snapshot = path + ".snapshot"
+        st = os.stat(path)
+        source = (SNAPSHOT_VERSION, st.st_size, st.st_mtime_ns)
+        if use_snapshot:
+            catalog = cls.read_snapshot(snapshot, source)
+            if catalog is not None:
+                return catalog
+        rows = iter_csv(path) if path.lower().endswith(".csv") else iter_jsonl(path)
+        base = os.path.dirname(os.path.abspath(path))
+        catalog = cls()
+        for row in rows:
+            catalog.add(row, base)
+        catalog.build_indexes()
+        if use_snapshot:
+            catalog.write_snapshot(snapshot, source)
+        return catalog
+
+    def add(self, row, base=None):
+        # Add one movie; duplicate titles keep the first entry
+        title = str(row.get("title") or "").strip()
+        if not title or title in self.ids:
+            return
+        poster = row.get("poster") or ""
+        if poster and base and not os.path.isabs(poster):
+            poster = os.path.join(base, poster)
+        year = row.get("year")
+        try:
+            year = int(year) if year not in (None, "") else None
+        except ValueError:
+            year = None
+        self.ids[title] = len(self.titles)
+        self.titles.append(title)
+        self.posters.append(poster)
+        self.genres.append(split_genres(row.get("genre") or row.get("genres")))
+        self.years.append(year)
+
+    def build_indexes(self):
+        self.title_order = sorted(range(len(self.titles)), key=lambda i: self.titles[i].lower())
+        self.title_keys = [self.titles[i].lower() for i in self.title_order]
+        self.by_genre = {}
+        self.by_year = {}
+        for i, (genres, year) in enumerate(zip(self.genres, self.years)):
+            for genre in genres:
+                self.by_genre.setdefault(genre.lower(), []).append(i)
+            if year is not None:
+                self.by_year.setdefault(year, []).append(i)
+
+    # Mapping of title -> poster path
+
+    def __getitem__(self, title):
+        return self.posters[self.ids[title]]
+
+    def __iter__(self):
+        return iter(self.titles)
+
+    def __len__(self):
+        return len(self.titles)
+
+    # Queries
+
+    def with_prefix(self, prefix):
+        # Ids of titles starting with prefix (case-insensitive), in title order
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self.title_keys, prefix)
+        end = bisect.bisect_left(self.title_keys, prefix + "\uffff", lo=start)
+        return self.title_order[start:end]
+
+    def query(self, prefix="", genre=None, year=None):
+        # Titles matching all given filters, in title order
+        sets = []
+        if genre:
+            sets.append(self.by_genre.get(genre.lower(), []))
+        if year is not None:
+            sets.append(self.by_year.get(year, []))
+        sets.sort(key=len)
+        if prefix:
+            ids = self.with_prefix(prefix)
+        elif sets:
+            ids = sorted(sets.pop(0), key=lambda i: self.titles[i].lower())
+        else:
+            ids = self.title_order
+        for other in sets:
+            allowed = set(other)
+            ids = [i for i in ids if i in allowed]
+        return [self.titles[i] for i in ids]
+
+    def genre_names(self):
+        names = {}
+        for genres in self.genres:
+            for genre in genres:
+                names.setdefault(genre.lower(), genre)
+        return sorted(names.values(), key=str.lower)
+
+    # Snapshot: plain JSON, so reading one never runs code. A snapshot of
+    # another version or source file, or one that does not hold together, is
+    # ignored and the catalog is parsed again.
+
+    @classmethod
+    def read_snapshot(cls, path, source):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get("source") != list(source):
+            return None
+        catalog = cls()
+        try:
+            catalog.titles = [str(title) for title in data["titles"]]
+            catalog.posters = [str(poster) for poster in data["posters"]]
+            catalog.genres = [[str(genre) for genre in genres] for genres in data["genres"]]
+            catalog.years = [None if year is None else int(year) for year in data["years"]]
+            catalog.title_order = [int(i) for i in data["title_order"]]
+            catalog.by_genre = {str(genre): [int(i) for i in ids] for genre, ids in data["by_genre"].items()}
+            catalog.by_year = {int(year): [int(i) for i in ids] for year, ids in data["by_year"]}
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return None
+        count = len(catalog.titles)
+        if not (len(catalog.posters) == len(catalog.genres) == len(catalog.years) == len(catalog.title_order) == count):
+            return None
+        if any(not 0 <= i < count for i in catalog.title_order):
+            return None
+        catalog.title_keys = [catalog.titles[i].lower() for i in catalog.title_order]
+        catalog.ids = {title: i for i, title in enumerate(catalog.titles)}
+        return catalog
+
+    def write_snapshot(self, path, source):
+        data = {"source": list(source), "titles": self.titles, "posters": self.posters, "genres": self.genres,
+                "years": self.years, "title_order": self.title_order, "by_genre": self.by_genre,
+                "by_year": list(self.by_year.items())}
+        folder = os.path.dirname(os.path.abspath(path))
+        try:
+            fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
@@ -2,66 +2,99 @@ import tkinter as tk
 from tkinter import messagebox
 from PIL import Image, ImageTk
 import os
-import json
+import sys
+
+from favorites_store import FavoritesStore
+
+from .catalog import Catalog
+from .poster_grid import PosterGrid
+from .thumbnails import POSTER_SIZE, ThumbnailCache
+
+# Built-in catalog used when no catalog file is present
+DEFAULT_MOVIES = {
+    "Movie 1": "posters/movie1.jpg",
+    "Movie 2": "posters/movie2.jpg",
+    "Movie 3": "posters/movie3.jpg"
+}
+
+# Catalog files looked up in the working directory, one movie per line/row
+CATALOG_FILES = ("catalog.jsonl", "catalog.csv")
+
 
 class MyFlixApp:
-    def __init__(self, root):
+    def __init__(self, root, catalog=None):
         self.root = root
         self.root.title("MyFlix")
         self.root.geometry("800x600")
         self.root.configure(bg="black")
 
-        # Movie data with poster paths
-        self.movies = {
-            "Movie 1": "posters/movie1.jpg",
-            "Movie 2": "posters/movie2.jpg",
-            "Movie 3": "posters/movie3.jpg"
-        }
+        # Movie data with poster paths, indexed by title prefix, genre and year
+        self.movies = catalog if catalog is not None else Catalog.from_items(DEFAULT_MOVIES.items())
+        self.filter_job = None
 
         # Path for favorites storage
         self.favorites_file = "favorites.json"
         self.favorites = self.load_favorites()
 
+        # Poster thumbnails are decoded in the background and swapped in when ready
+        self.thumbnails = ThumbnailCache()
+        self.placeholder = ImageTk.PhotoImage(Image.new("RGB", POSTER_SIZE, "#222222"))
+        self.poster_error_shown = False
+
         # Set up UI
         self.setup_ui()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
     def setup_ui(self):
         # Title label
         tk.Label(self.root, text="🎬 MyFlix", font=("Helvetica", 24, "bold"), fg="white", bg="black").pack(pady=10)
+        self.create_filter_bar()
 
-        # Frame to hold movie posters and favorite buttons
-        movie_frame = tk.Frame(self.root, bg="black")
-        movie_frame.pack(pady=20)
-
-        # Loop through each movie to display the poster and favorite button
-        for idx, (movie, poster) in enumerate(self.movies.items()):
-            try:
-                # Debugging: Check if the image file exists
-                print(f"Loading poster for: {movie}, {poster}")
-                
-                # Load image and resize
-                img = Image.open(poster).resize((150, 220))
-                photo = ImageTk.PhotoImage(img)
-                
-                # Create button for movie poster
-                btn = tk.Button(movie_frame, image=photo, command=lambda m=movie: self.play_movie(m), bd=0)
-                btn.image = photo
-                btn.grid(row=0, column=idx, padx=15)
-
-                # Favorite button (empty or filled star)
-                fav_btn = tk.Button(movie_frame, text="★" if movie in self.favorites else "☆",
-                                    command=lambda m=movie: self.toggle_favorite(m), fg="yellow", bg="black", bd=0,
-                                    font=("Helvetica", 14))
-                fav_btn.grid(row=1, column=idx)
-
-            except Exception as e:
-                print(f"Error loading {poster}: {e}")
-                messagebox.showerror("Error", f"Error loading image for {movie}. Please check the file path.")
+        # Scrollable grid of posters with favorite buttons; only visible tiles exist
+        self.poster_grid = PosterGrid(self.root, list(self.movies), self.movies.get, self.thumbnails, self.placeholder,
+                                      on_play=self.play_movie, on_favorite=self.toggle_favorite,
+                                      is_favorite=lambda movie: movie in self.favorites,
+                                      on_error=self.poster_failed)
 
         # Button to show favorite movies
         fav_button = tk.Button(self.root, text="❤️ Show Favorites", command=self.show_favorites, font=("Helvetica", 14),
                                bg="red", fg="white")
-        fav_button.pack(pady=10)
+        fav_button.pack(side=tk.BOTTOM, pady=10)
+        self.poster_grid.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+    def create_filter_bar(self):
+        # Title search and genre filter, answered from the catalog indexes
+        bar = tk.Frame(self.root, bg="black")
+        bar.pack(pady=(0, 5))
+        tk.Label(bar, text="Search:", fg="white", bg="black", font=("Helvetica", 12)).pack(side=tk.LEFT)
+        self.search_text = tk.StringVar()
+        self.search_text.trace_add("write", lambda *args: self.schedule_filter())
+        tk.Entry(bar, textvariable=self.search_text, width=30).pack(side=tk.LEFT, padx=5)
+        self.genre = tk.StringVar(value="All genres")
+        genres = ["All genres"] + self.movies.genre_names()
+        genre_menu = tk.OptionMenu(bar, self.genre, *genres, command=lambda value: self.apply_filter())
+        genre_menu.config(bg="black", fg="white", highlightthickness=0)
+        genre_menu.pack(side=tk.LEFT, padx=5)
+
+    def schedule_filter(self):
+        # Wait for a pause in typing before filtering
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(150, self.apply_filter)
+
+    def apply_filter(self):
+        self.filter_job = None
+        genre = self.genre.get()
+        titles = self.movies.query(prefix=self.search_text.get().strip(),
+                                   genre=None if genre == "All genres" else genre)
+        self.poster_grid.set_titles(titles)
+
+    def poster_failed(self, movie, error):
+        # Keep the placeholder for a poster that could not be loaded
+        print(f"Error loading {self.movies.get(movie)}: {error}")
+        if not self.poster_error_shown:
+            self.poster_error_shown = True
+            messagebox.showerror("Error", f"Error loading image for {movie}. Please check the file path.")
 
     def play_movie(self, movie_name):
         # Placeholder for movie playback (currently just a message)
@@ -75,13 +108,9 @@ class MyFlixApp:
         msg.pack(pady=10)
 
     def toggle_favorite(self, movie_name):
-        # Toggle the movie between favorite and non-favorite
-        if movie_name in self.favorites:
-            self.favorites.remove(movie_name)
-        else:
-            self.favorites.append(movie_name)
-        self.save_favorites()
-        self.refresh_ui()
+        # Toggle the movie between favorite and non-favorite; only its star is redrawn
+        self.favorites.toggle(movie_name)
+        self.poster_grid.update_favorite(movie_name)
 
     def show_favorites(self):
         # Show a list of favorite movies in a message box
@@ -89,27 +118,43 @@ class MyFlixApp:
         messagebox.showinfo("Your Favorites", fav_list)
 
     def load_favorites(self):
-        # Load the favorites from the favorites.json file
-        if os.path.exists(self.favorites_file):
-            with open(self.favorites_file, "r") as f:
-                return json.load(f)
-        return []
+        # Load the favorites from favorites.json and its change log
+        return FavoritesStore(self.favorites_file, fmt="json")
 
     def save_favorites(self):
-        # Save the favorites list to a JSON file
-        with open(self.favorites_file, "w") as f:
-            json.dump(self.favorites, f)
+        # Write pending favorite changes to disk
+        self.favorites.flush()
+
+    def close(self):
+        # Compact the favorites file and close the window
+        self.favorites.close()
+        self.thumbnails.shutdown()
+        self.root.destroy()
 
     def refresh_ui(self):
-        # Refresh the UI (reload the entire interface)
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        self.setup_ui()
+        # Refresh the visible posters and favorite stars
+        self.poster_grid.refresh()
+
+
+def find_catalog(argv):
+    # Catalog file from the command line, or the first one found in the working directory
+    if len(argv) > 1:
+        return argv[1]
+    for name in CATALOG_FILES:
+        if os.path.exists(name):
+            return name
+    return None
 
 
+# Run as a module from the repository root: python -m myFlix.myflix [catalog]
 if __name__ == "__main__":
+    catalog_file = find_catalog(sys.argv)
+    if catalog_file:
+        root = tk.Tk()
+        app = MyFlixApp(root, Catalog.load(catalog_file))
+        root.mainloop()
     # Check if 'posters' folder exists, if not create it
-    if not os.path.exists("posters"):
+    elif not os.path.exists("posters"):
         os.makedirs("posters")
         print("Please add movie poster images in the 'posters' folder and restart the app.")
     else:
@@ -119,4 +164,4 @@ if __name__ == "__main__":
         else:
             root = tk.Tk()
             app = MyFlixApp(root)
-            root.mainloop()
+            root.mainloop()
\ No newline at end of file
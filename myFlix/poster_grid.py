@@ -0,0 +1,154 @@
+import tkinter as tk
+
+from PIL import ImageTk
+
+
+class PosterTile:
+    # One reusable grid cell: poster button plus favorite star
+    def __init__(self, grid):
+        self.grid = grid
+        self.title = None
+        self.future = None
+        self.frame = tk.Frame(grid.canvas, bg=grid.bg)
+        self.poster = tk.Button(self.frame, image=grid.placeholder, bd=0,
+                                command=lambda: self.title is not None and grid.on_play(self.title))
+        self.poster.image = grid.placeholder
+        self.poster.pack()
+        self.star = tk.Button(self.frame, text="☆", fg="yellow", bg=grid.bg, bd=0, font=("Helvetica", 14),
+                              command=lambda: self.title is not None and grid.on_favorite(self.title))
+        self.star.pack()
+        self.window = grid.canvas.create_window(0, 0, window=self.frame, anchor="nw", state="hidden")
+        for widget in (self.frame, self.poster, self.star):
+            grid.bind_scroll(widget)
+
+    def bind(self, title):
+        # Show another movie in this tile
+        if title == self.title:
+            return
+        self.title = title
+        self.update_star()
+        self.poster.config(image=self.grid.placeholder)
+        self.poster.image = self.grid.placeholder
+        if self.future is not None:
+            self.future.cancel()
+        self.future = self.grid.thumbnails.request(self.grid.poster_for(title))
+
+    def update_star(self):
+        self.star.config(text="★" if self.grid.is_favorite(self.title) else "☆")
+
+
+class PosterGrid(tk.Frame):
+    # Scrollable poster grid on a Canvas. Only the tiles needed to cover the
+    # visible rows are created; while scrolling they are moved and rebound to
+    # other movies, so the widget count does not depend on the catalog size.
+
+    def __init__(self, parent, titles, poster_for, thumbnails, placeholder, on_play, on_favorite,
+                 is_favorite, tile_size=(180, 270), bg="black", on_error=None):
+        super().__init__(parent, bg=bg)
+        self.titles = titles
+        self.poster_for = poster_for
+        self.thumbnails = thumbnails
+        self.placeholder = placeholder
+        self.on_play = on_play
+        self.on_favorite = on_favorite
+        self.is_favorite = is_favorite
+        self.on_error = on_error
+        self.tile_width, self.tile_height = tile_size
+        self.bg = bg
+        self.columns = 1
+        self.tiles = []
+        self.visible = {}
+        self.poll_scheduled = False
+
+        self.canvas = tk.Canvas(self, bg=bg, highlightthickness=0)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.canvas.config(yscrollcommand=self._on_yscroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind("<Configure>", lambda e: self.layout())
+        self.bind_scroll(self.canvas)
+
+    def bind_scroll(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(int(-e.delta / 120), "units"))
+        widget.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        widget.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+
+    def set_titles(self, titles):
+        self.titles = titles
+        self.canvas.yview_moveto(0)
+        self.layout()
+
+    def update_favorite(self, title):
+        # Refresh the star of one movie if it is on screen
+        tile = self.visible.get(title)
+        if tile is not None:
+            tile.update_star()
+
+    def refresh(self):
+        # Re-read favorites and posters for the visible tiles
+        for tile in self.tiles:
+            tile.title = None
+        self.layout()
+
+    def layout(self):
+        width = max(self.canvas.winfo_width(), self.tile_width)
+        self.columns = max(1, width // self.tile_width)
+        rows = -(-len(self.titles) // self.columns)
+        self.canvas.config(scrollregion=(0, 0, self.columns * self.tile_width, rows * self.tile_height),
+                           yscrollincrement=self.tile_height // 4)
+        self._place_tiles()
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self._place_tiles()
+
+    def _place_tiles(self):
+        # Bind tiles to the movies in the visible rows, creating tiles only if the view grew
+        top = self.canvas.canvasy(0)
+        first_row = max(0, int(top // self.tile_height))
+        visible_rows = self.canvas.winfo_height() // self.tile_height + 2
+        first = first_row * self.columns
+        count = max(0, min(visible_rows * self.columns, len(self.titles) - first))
+        while len(self.tiles) < count:
+            self.tiles.append(PosterTile(self))
+
+        self.visible = {}
+        for i, tile in enumerate(self.tiles):
+            if i >= count:
+                self.canvas.itemconfigure(tile.window, state="hidden")
+                continue
+            index = first + i
+            row, column = divmod(index, self.columns)
+            self.canvas.coords(tile.window, column * self.tile_width + 15, row * self.tile_height)
+            self.canvas.itemconfigure(tile.window, state="normal")
+            tile.bind(self.titles[index])
+            self.visible[tile.title] = tile
+        self._schedule_poll()
+
+    def _schedule_poll(self):
+        if not self.poll_scheduled:
+            self.poll_scheduled = True
+            self.after(30, self._swap_in_posters)
+
+    def _swap_in_posters(self):
+        # Put finished thumbnails into their tiles; results for rebound tiles are dropped
+        self.poll_scheduled = False
+        waiting = False
+        for tile in self.tiles:
+            future = tile.future
+            if future is None:
+                continue
+            if not future.done():
+                waiting = True
+                continue
+            tile.future = None
+            try:
+                photo = ImageTk.PhotoImage(future.result())
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(tile.title, e)
+                continue
+            tile.poster.config(image=photo)
+            tile.poster.image = photo
+        if waiting:
+            self._schedule_poll()
@@ -0,0 +1,85 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from myFlix.catalog import Catalog
+
+
+class TestCatalog(unittest.TestCase):
+    def setUp(self):
+        """Write a small JSON Lines catalog."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "catalog.jsonl")
+        movies = [
+            {"title": "Alien", "poster": "posters/alien.jpg", "genre": "Horror|Sci-Fi", "year": 1979},
+            {"title": "Aliens", "poster": "posters/aliens.jpg", "genre": "Action|Sci-Fi", "year": 1986},
+            {"title": "Amelie", "poster": "posters/amelie.jpg", "genre": "Comedy", "year": 2001},
+            {"title": "Brazil", "poster": "/abs/brazil.jpg", "genre": "Sci-Fi", "year": "1985"},
+        ]
+        with open(self.path, "w") as f:
+            f.write("\n".join(json.dumps(movie) for movie in movies) + "\n")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_mapping_of_posters(self):
+        """Test that the catalog maps titles to resolved poster paths."""
+        catalog = Catalog.load(self.path)
+        self.assertEqual(len(catalog), 4)
+        self.assertEqual(catalog["Alien"], os.path.join(self.tmp.name, "posters/alien.jpg"))
+        self.assertEqual(catalog.get("Brazil"), "/abs/brazil.jpg")
+        self.assertIsNone(catalog.get("Heat"))
+
+    def test_queries(self):
+        """Test lookups by title prefix, genre and year."""
+        catalog = Catalog.load(self.path)
+        self.assertEqual(catalog.query(prefix="ali"), ["Alien", "Aliens"])
+        self.assertEqual(catalog.query(genre="sci-fi"), ["Alien", "Aliens", "Brazil"])
+        self.assertEqual(catalog.query(prefix="a", genre="Sci-Fi", year=1986), ["Aliens"])
+        self.assertEqual(catalog.query(year=1985), ["Brazil"])
+        self.assertEqual(catalog.genre_names(), ["Action", "Comedy", "Horror", "Sci-Fi"])
+
+    def test_snapshot_skips_parsing(self):
+        """Test that a second load comes from the snapshot."""
+        Catalog.load(self.path)
+        with patch("myFlix.catalog.iter_jsonl") as mock_parse:
+            catalog = Catalog.load(self.path)
+            mock_parse.assert_not_called()
+        self.assertEqual(catalog.query(prefix="b"), ["Brazil"])
+
+    def test_old_or_foreign_snapshot_is_rebuilt(self):
+        """Test that a snapshot of another version or format is ignored."""
+        Catalog.load(self.path)
+        with open(self.path + ".snapshot") as f:
+            data = json.load(f)
+        data["source"][0] -= 1
+        with open(self.path + ".snapshot", "w") as f:
+            json.dump(data, f)
+        self.assertEqual(len(Catalog.load(self.path)), 4)
+        with open(self.path + ".snapshot", "wb") as f:
+            f.write(b"\x80\x05not json")
+        self.assertEqual(Catalog.load(self.path).query(year=1985), ["Brazil"])
+
+    def test_malformed_line_is_skipped(self):
+        """Test that a broken catalog line is logged and skipped."""
+        with open(self.path, "a") as f:
+            f.write('{"title": "Heat", \n[1, 2]\n{"title": "Ronin"}\n')
+        with self.assertLogs("myFlix.catalog", "WARNING") as logs:
+            catalog = Catalog.load(self.path, use_snapshot=False)
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(len(catalog), 5)
+        self.assertIn("Ronin", catalog)
+
+    def test_csv(self):
+        """Test loading a CSV catalog."""
+        path = os.path.join(self.tmp.name, "catalog.csv")
+        with open(path, "w") as f:
+            f.write("title,poster,genre,year\nHeat,heat.jpg,Crime,1995\n")
+        catalog = Catalog.load(path, use_snapshot=False)
+        self.assertEqual(catalog.query(genre="crime", year=1995), ["Heat"])
+
+
+if __name__ == "__main__":
+    unittest.main()
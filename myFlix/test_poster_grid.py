@@ -0,0 +1,70 @@
+import tkinter as tk
+import unittest
+from concurrent.futures import Future
+
+from myFlix.poster_grid import PosterGrid
+
+
+class FakeThumbnails:
+    # Thumbnail requests that never finish, so tiles keep their placeholder
+    def __init__(self):
+        self.requested = []
+
+    def request(self, path):
+        self.requested.append(path)
+        return Future()
+
+
+class TestPosterGrid(unittest.TestCase):
+    def setUp(self):
+        """Create a grid over a large catalog in a fixed-size window."""
+        try:
+            self.root = tk.Tk()
+        except tk.TclError:
+            self.skipTest("no display")
+        self.root.geometry("400x600")
+        self.titles = [f"Movie {i}" for i in range(10000)]
+        self.favorites = set()
+        self.thumbnails = FakeThumbnails()
+        self.placeholder = tk.PhotoImage(width=150, height=220)
+        self.grid = PosterGrid(self.root, self.titles, lambda title: f"/posters/{title}.jpg", self.thumbnails,
+                               self.placeholder, on_play=lambda title: None, on_favorite=lambda title: None,
+                               is_favorite=lambda title: title in self.favorites)
+        self.grid.pack(fill=tk.BOTH, expand=True)
+        self.root.update()
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def shown(self):
+        return sorted(self.grid.visible, key=self.titles.index)
+
+    def test_tiles_are_recycled_on_scroll(self):
+        """Test that scrolling rebinds the same tiles instead of creating widgets."""
+        tiles = list(self.grid.tiles)
+        widgets = len(self.grid.canvas.winfo_children())
+        self.assertGreater(len(tiles), 0)
+        self.assertLess(len(tiles), 20)
+        self.assertEqual(self.shown()[0], "Movie 0")
+        for fraction in (0.25, 0.5, 0.999):
+            self.grid.canvas.yview_moveto(fraction)
+            self.root.update()
+            self.assertEqual(self.grid.tiles, tiles)
+            self.assertEqual(len(self.grid.canvas.winfo_children()), widgets)
+        self.assertIn("Movie 9999", self.grid.visible)
+        self.assertNotIn("Movie 0", self.grid.visible)
+        self.assertLess(len(self.thumbnails.requested), 5 * len(tiles))
+
+    def test_update_favorite_redraws_one_star(self):
+        """Test that starring a movie only redraws that movie's tile."""
+        first, second = self.shown()[:2]
+        self.favorites.update((first, second))
+        self.grid.update_favorite(first)
+        self.assertEqual(self.grid.visible[first].star.cget("text"), "★")
+        self.assertEqual(self.grid.visible[second].star.cget("text"), "☆")
+        self.grid.update_favorite("Movie 9999")
+        self.assertEqual(self.grid.visible[second].star.cget("text"), "☆")
+
+
+if __name__ == "__main__":
+    unittest.main()
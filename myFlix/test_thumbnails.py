@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from PIL import Image
+
+from myFlix.thumbnails import ThumbnailCache
+
+
+class TestThumbnailCache(unittest.TestCase):
+    def setUp(self):
+        """Create a large poster and an empty cache folder."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.poster = os.path.join(self.tmp.name, "movie1.jpg")
+        Image.new("RGB", (2000, 3000), "red").save(self.poster, "JPEG")
+        self.cache = ThumbnailCache(os.path.join(self.tmp.name, "cache"), max_workers=2)
+
+    def tearDown(self):
+        self.cache.shutdown()
+        self.tmp.cleanup()
+
+    def test_thumbnail_is_cached(self):
+        """Test that the second load comes from the cache, not the poster."""
+        thumb = self.cache.request(self.poster).result()
+        self.assertEqual(thumb.size, (150, 220))
+        self.assertTrue(os.path.exists(self.cache.cache_path(self.poster)))
+        with patch("myFlix.thumbnails.Image.open", wraps=Image.open) as mock_open:
+            self.cache.load(self.poster)
+            mock_open.assert_called_once_with(self.cache.cache_path(self.poster))
+
+    def test_changed_poster_gets_new_entry(self):
+        """Test that replacing the poster file invalidates the thumbnail."""
+        old_entry = self.cache.cache_path(self.poster)
+        self.cache.load(self.poster)
+        Image.new("RGB", (400, 600), "blue").save(self.poster, "JPEG")
+        os.utime(self.poster, ns=(0, 10 ** 9))
+        self.assertNotEqual(self.cache.cache_path(self.poster), old_entry)
+        self.assertGreater(self.cache.load(self.poster).getpixel((10, 10))[2], 200)
+
+    def test_cache_is_pruned(self):
+        """Test that the least recently used thumbnails go when the cache is full."""
+        posters = []
+        for i in range(4):
+            poster = os.path.join(self.tmp.name, f"movie{i + 2}.jpg")
+            Image.new("RGB", (300, 450), (60 * i, 0, 0)).save(poster, "JPEG")
+            self.cache.load(poster)
+            posters.append(poster)
+        for poster, used in zip(posters, (100, 10, 20, 30)):
+            os.utime(self.cache.cache_path(poster), (used, used))
+        self.cache.max_bytes = self.cache.total - 1
+        self.cache.load(self.poster)
+        left = [poster for poster in posters if os.path.exists(self.cache.cache_path(poster))]
+        self.assertIn(posters[0], left)
+        self.assertNotIn(posters[1], left)
+        self.assertLessEqual(self.cache.total, self.cache.max_bytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+POSTER_SIZE = (150, 220)
+# Thumbnails on disk beyond this are pruned, least recently used first
+MAX_CACHE_BYTES = 200 * 1024 * 1024
+
+
+def default_cache_dir():
+    # Per-user cache folder for poster thumbnails
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "MyFlix", "thumbnails")
+
+
+class ThumbnailCache:
+    # Posters scaled to the tile size and stored on disk, keyed by source path,
+    # mtime and size. Misses decode the source in JPEG draft mode, which lets
+    # libjpeg scale down while decoding instead of inflating the full image.
+    # Decoding runs on a worker pool; request() returns a future of a PIL image
+    # (PhotoImage objects must still be created on the Tk thread).
+    # Hits touch the entry's mtime; once the folder outgrows max_bytes the
+    # entries used longest ago are deleted down to three quarters of it.
+
+    def __init__(self, cache_dir=None, size=POSTER_SIZE, max_workers=4, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.size = size
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnails")
+        self.lock = threading.Lock()
+        # Bytes in the cache folder, counted on the first write
+        self.total = None
+
+    def cache_path(self, path):
+        st = os.stat(path)
+        key = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{self.size[0]}x{self.size[1]}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png")
+
+    def load(self, path):
+        # Return the poster thumbnail, creating the cache entry if needed
+        cached = self.cache_path(path)
+        try:
+            with Image.open(cached) as img:
+                img.load()
+            os.utime(cached)
+            return img
+        except (OSError, ValueError):
+            pass
+        with Image.open(path) as img:
+            img.draft("RGB", self.size)
+            thumb = img.convert("RGB").resize(self.size)
+        # A temp file of its own, as another worker may be making the same thumbnail
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                thumb.save(f, "PNG")
+            os.replace(tmp, cached)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        self.stored(os.path.getsize(cached))
+        return thumb
+
+    def stored(self, size):
+        with self.lock:
+            if self.total is None:
+                self.total = sum(size for _, size, _ in self.entries())
+            else:
+                self.total += size
+            if self.total > self.max_bytes:
+                self.total = self.prune(self.max_bytes * 3 // 4)
+
+    def entries(self):
+        # (mtime, size, path) of every thumbnail in the folder
+        found = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(".png"):
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, st.st_size, entry.path))
+        return found
+
+    def prune(self, target):
+        # Delete the least recently used thumbnails until at most target
+        # bytes are left; returns the bytes left
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+        return total
+
+    def request(self, path):
+        return self.pool.submit(self.load, path)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,1102 @@
+import bisect
+import functools
+import heapq
+import os
+import sys
+import threading
+from collections import deque
+from io import BytesIO
+
+import pygame
+
+from audio_cache import DecodedStream
+from favorites_store import FavoritesStore, load_in_background
+from instrumentation import STATS
+from library import LibraryIndex
+from loudness import LoudnessAnalyzer
+from playlist import load_in_background as load_playlist_in_background, write_playlist
+from search_index import SearchIndex
+from seek_table import SeekTableCache
+from shuffle import SHUFFLE_MODES, ShuffleEngine
+from watcher import is_audio, watch_folders
+
+MUSIC_END = pygame.USEREVENT + 1
+
+
+def locked(method):
+    # Run a PlayerCore method holding the core's lock, so front ends on
+    # different threads (the Tk view and the control server) take turns
+    @functools.wraps(method)
+    def run(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return run
+
+
+class PlayerCore:
+    # Playlist, favorites and playback state without any GUI. Front ends call the
+    # command methods (or dispatch() by name) and subscribe to events. Nothing runs
+    # on its own: poll() has to be called regularly, e.g. from root.after in the Tk
+    # view or from a plain loop when running headless with SDL_AUDIODRIVER=dummy.
+    #
+    # Events are delivered as listener(event, data):
+    #   "songs"      the song list changed            {"count"}, {"removed"} from remove_songs()
+    #   "favorites"  songs were starred               {"paths"}
+    #   "loading"    a song is being opened           {"path"}
+    #   "track"      a song started                   {"path", "index", "duration"}
+    #   "failed"     a song could not be opened       {"path"}
+    #   "paused" / "resumed" / "stopped"              {"path"}
+    #   "volume"     the volume changed               {"volume"}
+    #   "seeked"     playback jumped within the song  {"path", "position"}
+    #   "renamed"    files of listed songs were renamed {"paths"}
+    #   "equalizer"  the DSP equalizer changed        {"gains"}
+    #   "queued"     songs were queued to play next   {"paths"}
+
+    COMMANDS = ("set_songs", "append_songs", "play_random", "play_index", "play_song", "play_next",
+                "play_previous", "pause_resume", "stop", "seek", "set_volume", "set_equalizer", "set_shuffle_mode",
+                "add_favorites", "load_favorites", "save_favorites", "play_favorites", "load_playlist", "save_playlist",
+                "play_playlist", "enqueue", "remove_songs", "watch", "unwatch", "search", "analyze_loudness",
+                "status")
+
+    # Missing files skipped in a row before shuffle gives up
+    MAX_SKIPS = 100
+    # Songs at least this long (seconds) get their seek table built as soon as
+    # they start; shorter ones are scanned on the first seek
+    LONG_TRACK = 600
+    # Songs up to this size are read into memory by the I/O executor, so the
+    # mixer opens them without touching the disk on the caller's thread
+    PRELOAD_BYTES = 32 * 1024 * 1024
+    # Appended songs are indexed for search right away up to this many, and
+    # on a background thread beyond
+    INDEX_INLINE = 2000
+
+    def __init__(self, library=None, gapless=True, shuffle_mode="uniform", normalize=True, seek_tables=None,
+                 lazy=False, io=None, decoded_cache=None, dsp=None):
+        # lazy opens the audio device on a background thread and restores the
+        # song list from the library snapshot, for a fast first frame. Queries
+        # answer "not playing" until the mixer is up; the first command that
+        # needs it waits for it.
+        #
+        # With an IOExecutor, songs are opened on its threads and start when
+        # its callbacks run; play commands return right away and report the
+        # song with a "track" or "failed" event. Without one they block until
+        # the song plays.
+        #
+        # With a DecodedAudioCache, the songs around the current one are
+        # decoded in the background and previous/next start them from memory.
+        #
+        # With a DSPEngine, songs play through it instead of
+        # pygame.mixer.music: the queued follow-up song is crossfaded in and
+        # the equalizer can be set.
+        self.io = io
+        self.dsp = dsp
+        # Commands may come from more than one thread; see locked()
+        self.lock = threading.RLock()
+        self.decoded = decoded_cache
+        # True while the mixer plays a song from the decoded cache
+        self.from_cache = False
+        # The song being opened in the background
+        self.loading = None
+        self.failed_loads = 0
+        self.mixer_ready = False
+        self.mixer_thread = None
+        self.want_gapless = gapless
+        self.use_endevent = False
+        self.gapless = False
+        if lazy:
+            self.mixer_thread = threading.Thread(target=pygame.mixer.init, name="mixer-init", daemon=True)
+            self.mixer_thread.start()
+        else:
+            pygame.mixer.init()
+        self.library = library or LibraryIndex()
+        self.seek_tables = seek_tables or SeekTableCache()
+        # File object the mixer plays from: a preloaded song or a seek table view
+        self.stream = None
+        self.listeners = []
+        self._was_busy = False
+        self.queued_index = None
+        self.queued_track = None
+
+        # Player state, restored from the saved library index
+        if lazy:
+            self.songs, self.favorites = self.library.load_fast()
+        else:
+            self.songs = self.library.load()
+            self.favorites = self.library.favorites()
+        self.song_positions = {path: index for index, path in enumerate(self.songs)}
+        # Old indices of the songs each remove_songs() took off this song list,
+        # for search index builds running meanwhile; set_songs() starts a new one
+        self.song_removals = []
+        # Favorites in song list order, kept up to date as they change; None
+        # after the song list changed until the next ordered_favorites()
+        self.favorites_order = None
+        self.search_index = SearchIndex()
+        self.index_songs_in_background()
+        # The .fav file last saved or loaded; new favorites are appended to it
+        self.favorites_store = None
+        self.playlist = []
+        # Songs queued by enqueue(), played before the playlist goes on
+        self.up_next = deque()
+        self.shuffle = None
+        self.shuffle_mode = shuffle_mode
+        self.current_index = 0
+        self.current_song = ""
+        self.is_paused = False
+        self.keep_playing = False
+        self.total_duration = 0
+        # get_pos() counts from play(); a seek moves the song position against it
+        self.seek_offset = 0.0
+        self.volume = 1.0
+        # Per-song loudness gain applied on top of the volume; songs are measured
+        # in the background once analyze_loudness() has been called
+        self.normalize = normalize
+        self.gain = 1.0
+        self.analyzer = None
+        # Folder watcher and the change sets it found, applied by poll()
+        self.watcher = None
+        self.watch_adds = True
+        self.file_changes = deque()
+        if not lazy:
+            self.ensure_mixer()
+
+    def mixer_starting(self):
+        # True while the background mixer init of a lazy core is still running
+        return self.mixer_thread is not None and self.mixer_thread.is_alive()
+
+    @locked
+    def ensure_mixer(self):
+        # Finish opening the mixer, waiting for the background init if needed.
+        # The end event needs the display module, which is set up on the
+        # calling thread.
+        if self.mixer_ready:
+            return
+        if self.mixer_thread is not None:
+            with STATS.timer("mixer.wait_init"):
+                self.mixer_thread.join()
+            self.mixer_thread = None
+        if not pygame.mixer.get_init():
+            pygame.mixer.init()
+        self.use_endevent = self.init_endevent()
+        # Gapless mode hands the next shuffled song to the mixer while the current one plays.
+        # The DSP engine reports song changes itself and always takes the next song.
+        self.gapless = self.want_gapless and self.use_endevent or self.dsp is not None
+        self.mixer_ready = True
+        self.apply_volume()
+
+    def init_endevent(self):
+        # Song ends are reported through pygame's event queue, which needs the display
+        # module. It is left alone on macOS where it clashes with Tk's own app setup;
+        # there poll() watches get_busy() instead.
+        if sys.platform == "darwin":
+            return False
+        try:
+            pygame.display.init()
+            pygame.mixer.music.set_endevent(MUSIC_END)
+        except pygame.error:
+            return False
+        return True
+
+    # Events
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self.listeners.remove(listener)
+
+    def emit(self, event, **data):
+        for listener in list(self.listeners):
+            listener(event, data)
+
+    def dispatch(self, command, **args):
+        # Run a command by name, for front ends that are not Python callers
+        if command not in self.COMMANDS:
+            raise ValueError(f"Unknown command: {command}")
+        return getattr(self, command)(**args)
+
+    # Song list and favorites
+
+    @locked
+    def set_songs(self, paths):
+        self.songs = self.library.set_songs(paths)
+        self.song_positions = {path: index for index, path in enumerate(self.songs)}
+        self.song_removals = []
+        self.favorites_order = None
+        self.search_index = SearchIndex()
+        self.index_songs_in_background()
+        if self.analyzer is not None:
+            self.analyzer.analyze(self.songs)
+        self.emit("songs", count=len(self.songs))
+
+    @locked
+    def append_songs(self, paths):
+        paths = self.library.append_songs(paths)
+        start = len(self.songs)
+        for path in paths:
+            self.song_positions[path] = len(self.songs)
+            self.songs.append(path)
+        if paths:
+            self.favorites_order = None
+        if len(paths) > self.INDEX_INLINE:
+            self.index_songs_in_background(start)
+        else:
+            self.search_index.add_many((i, self.search_fields(self.songs[i])) for i in range(start, len(self.songs)))
+        if self.shuffle is not None and self.playlist is self.songs:
+            self.shuffle.resize(len(self.songs))
+        if self.analyzer is not None:
+            self.analyzer.analyze(paths)
+        self.emit("songs", count=len(self.songs))
+
+    @locked
+    def remove_songs(self, paths):
+        # Take songs off the song list; returns how many were listed
+        gone = {path for path in paths if path in self.song_positions}
+        if not gone:
+            return 0
+        removed = sorted(self.song_positions[path] for path in gone)
+        old_songs = self.songs
+        self.library.drop_songs(gone)
+        self.songs = [path for path in old_songs if path not in gone]
+        # Only the songs after the first removed one move
+        for index in range(removed[0], len(self.songs)):
+            self.song_positions[self.songs[index]] = index
+        for path in gone:
+            del self.song_positions[path]
+        self.song_removals.append(removed)
+        self.favorites_order = None
+        self.search_index.remove_docs(removed)
+        if self.playlist is old_songs:
+            self.playlist = self.songs
+            if self.current_song in self.song_positions:
+                self.current_index = self.song_positions[self.current_song]
+        else:
+            self.playlist = [path for path in self.playlist if path not in gone]
+            if self.current_song in self.playlist:
+                self.current_index = self.playlist.index(self.current_song)
+        if self.shuffle is not None:
+            # The pass goes on without the removed songs
+            self.shuffle.remove(removed)
+            if self.queued_index is not None:
+                if self.queued_track.path in gone:
+                    self.queue_next_song()
+                else:
+                    self.queued_index = self.song_positions[self.queued_track.path]
+        self.emit("songs", count=len(self.songs), removed=removed)
+        return len(gone)
+
+    def index_of(self, path):
+        return self.song_positions.get(path)
+
+    # Search
+
+    def search_fields(self, path):
+        # Texts a song is found by: file name plus any known tags
+        track = self.library.tracks.get(path)
+        name = os.path.splitext(os.path.basename(path))[0]
+        if track is None:
+            return (name,)
+        return (name, track.title, track.artist, track.album)
+
+    def index_songs_in_background(self, start=0):
+        # Building the index for a large library takes seconds, so songs from
+        # start on are indexed on a thread into an index of their own, and
+        # searches never wait for it. A full build (start 0) replaces the live
+        # index when done, taking over the songs appended and updated in the
+        # live one meanwhile; a partial one is merged into the live index.
+        # Songs removed meanwhile are removed from the build before that, and
+        # a build for a song list that was replaced since is dropped.
+        songs, count, live = self.songs, len(self.songs), self.search_index
+        removals, seen = self.song_removals, len(self.song_removals)
+
+        def build():
+            # Tags may still be loading after a fast start
+            self.library.wait_loaded()
+            index = SearchIndex()
+            with STATS.timer("search.build", songs=count - start):
+                index.add_many((i, self.search_fields(songs[i])) for i in range(start, count))
+            with self.lock:
+                if self.song_removals is not removals:
+                    return
+                for removed in removals[seen:]:
+                    index.remove_docs(removed)
+                if start:
+                    self.search_index.merge(index)
+                elif self.search_index is live:
+                    index.merge(live)
+                    self.search_index = index
+        threading.Thread(target=build, daemon=True).start()
+
+    @locked
+    def search(self, query, limit=1000):
+        # Indices of songs matching all words of the query, in song list order
+        return self.search_index.search(query, limit=limit)
+
+    @locked
+    def add_favorites(self, paths):
+        paths = [path for path in dict.fromkeys(paths) if path not in self.favorites]
+        self.favorites.update(paths)
+        if self.favorites_order is not None and paths:
+            if len(paths) == 1:
+                bisect.insort(self.favorites_order, paths[0], key=self.favorite_key)
+            else:
+                added = sorted(paths, key=self.favorite_key)
+                self.favorites_order = list(heapq.merge(self.favorites_order, added, key=self.favorite_key))
+        self.library.set_favorite(paths)
+        if self.favorites_store is not None:
+            for path in paths:
+                self.favorites_store.add(path)
+        if self.shuffle is not None:
+            for path in paths:
+                index = self.song_positions.get(path)
+                if index is not None:
+                    self.shuffle.add_favorite(index)
+        self.emit("favorites", paths=paths)
+        return len(paths)
+
+    @locked
+    def clear_favorites(self):
+        paths = list(self.favorites)
+        self.favorites.clear()
+        self.favorites_order = []
+        self.library.set_favorite(paths, False)
+        if self.favorites_store is not None:
+            for path in paths:
+                self.favorites_store.remove(path)
+        if self.shuffle is not None:
+            self.shuffle.favorites.clear()
+        self.emit("favorites", paths=[])
+
+    def favorite_key(self, path):
+        # Song list order, then favorites that are not in the list by path
+        return self.song_positions.get(path, len(self.songs)), path
+
+    @locked
+    def ordered_favorites(self):
+        # Sorted only after the song list changed; add_favorites() keeps it
+        if self.favorites_order is None:
+            self.favorites_order = sorted(self.favorites, key=self.favorite_key)
+        return list(self.favorites_order)
+
+    @locked
+    def save_favorites(self, filepath):
+        # Write all favorites to a .fav file, which then keeps receiving new favorites
+        self.close_favorites()
+        self.favorites_store = FavoritesStore(filepath)
+        self.favorites_store.replace_all(self.ordered_favorites())
+
+    def read_favorites(self, filepath):
+        # Read a .fav file and check its entries in the background. Hand the
+        # future's result to finish_loading_favorites() on the caller's thread.
+        return load_in_background(filepath)
+
+    @locked
+    def finish_loading_favorites(self, result):
+        store, existing = result
+        self.close_favorites()
+        self.favorites_store = store
+        favs = set(existing)
+        self.add_favorites(favs)
+        return favs
+
+    def load_favorites(self, filepath):
+        # Add the existing songs listed in a favorites file; returns them. The
+        # file is read without holding the lock.
+        return self.finish_loading_favorites(self.read_favorites(filepath).result())
+
+    def close_favorites(self):
+        if self.favorites_store is not None:
+            self.favorites_store.close()
+            self.favorites_store = None
+
+    # Playlists
+
+    def read_playlist(self, filepath):
+        # Read an M3U/M3U8/PLS playlist and check its entries in the background.
+        # Hand the future's result to finish_loading_playlist() on the caller's thread.
+        return load_playlist_in_background(filepath)
+
+    @locked
+    def finish_loading_playlist(self, result):
+        # Add the playlist's songs that are not in the song list yet; returns
+        # (songs in playlist order, missing entries)
+        songs, missing = result
+        new = [path for path in dict.fromkeys(songs) if path not in self.song_positions]
+        if new:
+            self.append_songs(new)
+        return songs, missing
+
+    def load_playlist(self, filepath):
+        # Read without holding the lock, which finish_loading_playlist() takes
+        return self.finish_loading_playlist(self.read_playlist(filepath).result())
+
+    def save_playlist(self, filepath, songs=None):
+        # Write songs (by default the current playlist, or else the song list)
+        # to a playlist file; the format follows the extension. Only picking
+        # the songs holds the lock, not writing the file.
+        if songs is None:
+            with self.lock:
+                songs = list(self.playlist or self.songs)
+        write_playlist(filepath, songs, self.library.tracks)
+
+    @locked
+    def play_playlist(self, songs):
+        # Play songs in order, without shuffling
+        if not songs:
+            return False
+        self.keep_playing = False
+        self.shuffle = None
+        self.playlist = list(songs)
+        self.current_index = 0
+        return self.play_song(self.playlist[self.current_index])
+
+    # Watching folders
+
+    @locked
+    def watch(self, folders, recursive=True, add_new=True, backend="auto"):
+        # Follow files being added, removed and renamed below folders (inotify
+        # on Linux, polling elsewhere). With add_new False only songs already
+        # listed are updated. The watcher collects changes in the background;
+        # apply_file_changes() applies them, and poll() calls it.
+        self.unwatch()
+        self.watch_adds = add_new
+        self.watcher = watch_folders(folders, self.file_changes.append, recursive=recursive, backend=backend)
+
+    @locked
+    def unwatch(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
+        self.file_changes.clear()
+
+    @locked
+    def apply_file_changes(self):
+        # Apply the change sets found so far; returns True if anything changed
+        changed = False
+        while self.file_changes:
+            changes = self.file_changes.popleft()
+            with STATS.timer("watch.apply", added=len(changes.added), removed=len(changes.removed),
+                             renamed=len(changes.renamed)):
+                changed |= self.apply_changes(changes)
+        return changed
+
+    def apply_changes(self, changes):
+        # Renames are applied in place, then removed songs are taken off the
+        # list and new files appended
+        renamed = [(old, new) for old, new in changes.renamed if old in self.song_positions or old in self.favorites]
+        if renamed:
+            self.rename_songs(renamed)
+        gone = set()
+        for path in changes.removed:
+            if path in self.song_positions:
+                gone.add(path)
+            elif not is_audio(path):
+                prefix = os.path.join(path, "")
+                gone.update(song for song in self.songs if song.startswith(prefix))
+        added = changes.added if self.watch_adds else []
+        if changes.present is not None and self.watcher is not None:
+            # The watcher lost track and rescanned: compare with the list
+            present = set(changes.present)
+            prefixes = tuple(os.path.join(folder, "") for folder in self.watcher.folders)
+            gone.update(song for song in self.songs if song.startswith(prefixes) and song not in present)
+            added = changes.present if self.watch_adds else []
+        added = [path for path in dict.fromkeys(added) if path not in self.song_positions and path not in gone]
+        if gone:
+            self.remove_songs(gone)
+        if added:
+            self.append_songs(added)
+        return bool(renamed or gone or added)
+
+    def rename_songs(self, renames):
+        # Follow files renamed on disk, keeping their place in the list
+        renames = [(old, new) for old, new in renames if old != new]
+        overwritten = [new for old, new in renames if new in self.song_positions]
+        if overwritten:
+            self.remove_songs(overwritten)
+        self.library.rename(renames)
+        self.favorites_order = None
+        moved = dict(renames)
+        for old, new in renames:
+            if old in self.favorites:
+                self.favorites.discard(old)
+                self.favorites.add(new)
+                if self.favorites_store is not None:
+                    self.favorites_store.remove(old)
+                    self.favorites_store.add(new)
+            index = self.song_positions.pop(old, None)
+            if index is not None:
+                self.songs[index] = new
+                self.song_positions[new] = index
+                self.search_index.update(index, *self.search_fields(new))
+        if self.playlist is not self.songs:
+            self.playlist = [moved.get(path, path) for path in self.playlist]
+        self.current_song = moved.get(self.current_song, self.current_song)
+        self.emit("renamed", paths=[new for old, new in renames])
+
+    # Loudness
+
+    @locked
+    def analyze_loudness(self, max_workers=1):
+        # Measure songs without a stored gain on a low-priority process pool;
+        # songs added later are queued as they come in
+        if self.analyzer is None:
+            self.analyzer = LoudnessAnalyzer(self.library, max_workers=max_workers)
+        self.analyzer.analyze(self.songs)
+
+    def apply_volume(self):
+        if not self.mixer_ready:
+            return
+        if self.dsp is not None:
+            # Song gains are applied per song, so crossfades mix them right
+            self.dsp.set_volume(self.volume)
+        else:
+            pygame.mixer.music.set_volume(self.volume * self.gain)
+
+    def track_gain(self, track):
+        if not self.normalize or track.gain is None:
+            return 1.0
+        return track.gain
+
+    @locked
+    def close(self):
+        # Stop playback and write out pending state before exiting
+        self.stop()
+        self.unwatch()
+        self.close_favorites()
+        if self.analyzer is not None:
+            self.analyzer.close()
+        if self.dsp is not None:
+            self.dsp.close()
+        self.seek_tables.shutdown()
+        if self.decoded is not None:
+            self.decoded.shutdown()
+        # The snapshot lets the next fast start show the list right away
+        self.library.close(self.songs, self.favorites)
+
+    # Playback
+
+    @locked
+    def play_random(self):
+        # Start playing random songs continuously; poll() moves on at each song end.
+        # The shuffle order is drawn lazily, so this costs the same for any library size.
+        if not self.songs:
+            return False
+        self.keep_playing = True
+        self.playlist = self.songs
+        self.shuffle = self.new_shuffle()
+        self.play_shuffled(self.shuffle.next)
+        return True
+
+    def new_shuffle(self):
+        favorites = (self.song_positions[path] for path in self.favorites if path in self.song_positions)
+        return ShuffleEngine(len(self.songs), mode=self.shuffle_mode,
+                             favorites=favorites if self.shuffle_mode == "favorites" else ())
+
+    @locked
+    def set_shuffle_mode(self, mode):
+        # Takes effect the next time shuffle is started
+        if mode not in SHUFFLE_MODES:
+            raise ValueError(f"Unknown shuffle mode: {mode}")
+        self.shuffle_mode = mode
+
+    def play_shuffled(self, step):
+        # Play the song step() picks from the shuffle engine, skipping missing files
+        for _ in range(self.MAX_SKIPS):
+            index = step()
+            if index is None:
+                return False
+            self.current_index = index
+            if self.play_song(self.playlist[index]):
+                return True
+            step = self.shuffle.next
+        return False
+
+    @locked
+    def play_index(self, index):
+        # Play one song from the song list, without shuffling on afterwards
+        self.current_index = index
+        self.keep_playing = False
+        self.shuffle = None
+        self.playlist = self.songs
+        return self.play_song(self.playlist[self.current_index])
+
+    @locked
+    def play_favorites(self):
+        return self.play_playlist(self.ordered_favorites())
+
+    @locked
+    def play_song(self, song_path):
+        # Load and play a song; duration comes from the library index
+        if self.io is None:
+            return self.start_song(song_path, self.open_song(song_path, preload=False))
+        self.loading = song_path
+        self.io.submit(self.open_song, song_path, key="song",
+                       callback=lambda future: self._song_opened(song_path, future))
+        self.emit("loading", path=song_path)
+        return True
+
+    def open_song(self, song_path, preload=True):
+        # The blocking part of playing a song, safe to run on any thread: the
+        # library lookup (a header probe for new files) and reading the file.
+        # Returns (track, stream), stream being None unless the song was
+        # preloaded or decoded, or None for a missing file.
+        track = self.library.get(song_path)
+        if track is None:
+            return None
+        if self.decoded is not None and self.dsp is None:
+            data = self.decoded.get(track)
+            if data is not None:
+                return track, DecodedStream(data)
+        stream = None
+        if preload and self.dsp is None and track.size <= self.PRELOAD_BYTES:
+            with STATS.timer("io.preload", path=song_path):
+                with open(song_path, "rb") as f:
+                    stream = BytesIO(f.read())
+        return track, stream
+
+    @locked
+    def _song_opened(self, song_path, future):
+        if song_path != self.loading:
+            return
+        self.loading = None
+        opened = future.result() if future.exception() is None else None
+        if self.start_song(song_path, opened):
+            self.failed_loads = 0
+            return
+        self.emit("failed", path=song_path)
+        # Shuffle skips missing files, as play_shuffled() does for blocking loads
+        self.failed_loads += 1
+        if self.keep_playing and self.shuffle is not None and self.failed_loads < self.MAX_SKIPS:
+            self.play_shuffled(self.shuffle.next)
+
+    def start_song(self, song_path, opened):
+        # Hand an opened song to the mixer and start it; cheap once open_song()
+        # has run
+        if opened is None:
+            return False
+        track, stream = opened
+        self.ensure_mixer()
+        self.current_song = song_path
+        if self.dsp is not None:
+            return self.start_in_engine(track, stream)
+        with STATS.timer("mixer.load", path=song_path):
+            if stream is None:
+                pygame.mixer.music.load(song_path)
+            elif isinstance(stream, DecodedStream):
+                pygame.mixer.music.load(stream, "wav")
+            else:
+                pygame.mixer.music.load(stream, os.path.splitext(song_path)[1].lstrip(".").lower())
+        self.close_stream()
+        self.stream = stream
+        self.from_cache = isinstance(stream, DecodedStream)
+        self.gain = self.track_gain(track)
+        self.apply_volume()
+        with STATS.timer("mixer.play"):
+            pygame.mixer.music.play()
+        self._discard_end_events()
+        return self.song_started(track)
+
+    def start_in_engine(self, track, stream):
+        # The DSP engine opens and decodes the song on its own threads
+        if stream is not None:
+            stream.close()
+        self.close_stream()
+        self.from_cache = False
+        self.gain = self.track_gain(track)
+        self.apply_volume()
+        with STATS.timer("dsp.play"):
+            self.dsp.play(track.path, self.gain)
+        return self.song_started(track)
+
+    def song_started(self, track):
+        # Bookkeeping once the mixer or the DSP engine has the song
+        song_path = track.path
+        self.seek_offset = 0.0
+        self.is_paused = False
+        self._was_busy = True
+        self.total_duration = track.duration or 0
+        if self.total_duration >= self.LONG_TRACK and self.dsp is None:
+            self.seek_tables.request(song_path)
+        index = self.song_positions.get(song_path)
+        if index is not None and track.title:
+            self.search_index.update(index, *self.search_fields(song_path))
+        # load() dropped whatever was queued; queue the follow-up song again
+        self.queued_index = None
+        self.queued_track = None
+        if self.gapless and (self.keep_playing or self.up_next):
+            self.queue_next_song()
+        self.decode_neighbours(track)
+        self.emit("track", path=song_path, index=self.current_index, duration=self.total_duration)
+        return True
+
+    def decode_neighbours(self, track):
+        # Decode the current song and the ones previous/next would play, so
+        # flipping between them needs no decoder. With an I/O executor the
+        # neighbours are looked up in the library on its threads.
+        if self.decoded is None or self.dsp is not None:
+            return
+        self.request_decode(track)
+        if self.shuffle is not None:
+            neighbours = [index for index in (self.shuffle.back[-1] if self.shuffle.back else None,
+                                              self.shuffle.peek()) if index is not None]
+        else:
+            neighbours = [index for index in (self.current_index - 1, self.current_index + 1)
+                          if 0 <= index < len(self.playlist)]
+        for index in neighbours:
+            if self.io is None:
+                self.request_decode(self.library.get(self.playlist[index]))
+            else:
+                self.io.submit(self.library.get, self.playlist[index], callback=self._neighbour_found)
+
+    @locked
+    def _neighbour_found(self, future):
+        self.request_decode(future.result() if future.exception() is None else None)
+
+    def request_decode(self, track):
+        if track is None or not self.mixer_ready:
+            return
+        rate, size, channels = pygame.mixer.get_init()
+        expected = track.duration * rate * channels * abs(size) // 8 if track.duration else None
+        self.decoded.request(track, expected)
+
+    @locked
+    def play_previous(self):
+        if self.shuffle is not None:
+            return self.play_shuffled(self.shuffle.previous)
+        if self.current_index > 0:
+            self.current_index -= 1
+            return self.play_song(self.playlist[self.current_index])
+        return False
+
+    @locked
+    def play_next(self):
+        if self.play_up_next():
+            return True
+        if self.shuffle is not None:
+            return self.play_shuffled(self.shuffle.next)
+        if self.current_index < len(self.playlist) - 1:
+            self.current_index += 1
+            return self.play_song(self.playlist[self.current_index])
+        return False
+
+    @locked
+    def pause_resume(self):
+        # Pause or resume the song (get_busy() is False while paused)
+        if not self.mixer_ready or not (self.is_paused or self.is_playing()):
+            return False
+        if self.is_paused:
+            if self.dsp is not None:
+                self.dsp.resume()
+            else:
+                pygame.mixer.music.unpause()
+            self.is_paused = False
+            self.emit("resumed", path=self.current_song)
+        else:
+            if self.dsp is not None:
+                self.dsp.pause()
+            else:
+                pygame.mixer.music.pause()
+            self.is_paused = True
+            self.emit("paused", path=self.current_song)
+        return True
+
+    @locked
+    def stop(self):
+        self.keep_playing = False
+        self.shuffle = None
+        self.is_paused = False
+        if self.io is not None:
+            self.loading = None
+            self.io.cancel("song")
+            self.io.cancel("queue")
+        if self.dsp is not None:
+            self.dsp.stop()
+        elif self.mixer_ready:
+            pygame.mixer.music.stop()
+            if self.stream is not None:
+                pygame.mixer.music.unload()
+                self.close_stream()
+            self._discard_end_events()
+        self.queued_index = None
+        self.queued_track = None
+        self.emit("stopped", path=self.current_song)
+
+    @locked
+    def seek(self, seconds):
+        # Jump within the current song, also while paused. With a seek table the
+        # mixer is reopened right at the target frame, so the decoder never scans
+        # the file up to it; otherwise SDL_mixer seeks with set_pos().
+        if not self.mixer_ready or not (self.is_paused or self.is_playing()):
+            return False
+        seconds = max(0.0, min(seconds, self.total_duration or seconds))
+        if self.dsp is not None:
+            if not self.dsp.seek(self.current_song, seconds):
+                return False
+            self.emit("seeked", path=self.current_song, position=seconds)
+            return True
+        # Decoded songs are WAV in memory, which SDL_mixer seeks directly
+        table = None if self.from_cache else self.seek_table(self.current_song)
+        if table is not None:
+            seconds = self.seek_with_table(table, seconds)
+        else:
+            try:
+                pygame.mixer.music.set_pos(seconds)
+            except pygame.error:
+                return False
+            self.seek_offset = seconds - max(0, pygame.mixer.music.get_pos()) / 1000
+        self.emit("seeked", path=self.current_song, position=seconds)
+        return True
+
+    def seek_table(self, path):
+        # The song's seek table, or None while a long song is still being
+        # scanned in the background or for files without one. With an I/O
+        # executor the scan never runs on the caller's thread.
+        table = self.seek_tables.get(path)
+        if table is None and self.io is not None:
+            self.seek_tables.request(path)
+        elif table is None and not self.seek_tables.is_pending(path):
+            try:
+                with STATS.timer("seek_table.build", path=path):
+                    table = self.seek_tables.load(path)
+            except (OSError, ValueError):
+                return None
+        return table
+
+    def seek_with_table(self, table, seconds):
+        # Play from the frame at or before the target; returns where that is.
+        # get_pos() restarts at 0, so the position counts from seek_offset.
+        start, stream = table.open(self.current_song, seconds)
+        with STATS.timer("mixer.seek_load", path=self.current_song, position=start):
+            pygame.mixer.music.load(stream, table.kind)
+        self.close_stream()
+        self.stream = stream
+        self.from_cache = False
+        pygame.mixer.music.play()
+        if self.is_paused:
+            pygame.mixer.music.pause()
+        self._discard_end_events()
+        self._was_busy = True
+        self.seek_offset = start
+        # load() dropped the gapless follow-up song
+        self.queued_index = None
+        self.queued_track = None
+        if self.gapless and (self.keep_playing or self.up_next):
+            self.queue_next_song()
+        return start
+
+    def close_stream(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    @locked
+    def set_equalizer(self, gains):
+        # Band gains in dB for the DSP engine's equalizer, one per band
+        if self.dsp is None:
+            return False
+        self.dsp.set_eq(gains)
+        self.emit("equalizer", gains=list(gains))
+        return True
+
+    @locked
+    def set_volume(self, volume):
+        # Volume from 0.0 to 1.0
+        self.volume = volume
+        self.apply_volume()
+        self.emit("volume", volume=volume)
+
+    def position(self):
+        # Seconds played of the current song
+        if not self.mixer_ready:
+            return 0.0
+        if self.dsp is not None:
+            return self.dsp.position()
+        return max(0.0, self.seek_offset + max(0, pygame.mixer.music.get_pos()) / 1000)
+
+    def is_playing(self):
+        if self.dsp is not None:
+            return self.mixer_ready and self.dsp.is_busy()
+        return self.mixer_ready and pygame.mixer.music.get_busy()
+
+    @locked
+    def status(self):
+        return {
+            "song": self.current_song,
+            "index": self.current_index,
+            "position": self.position(),
+            "duration": self.total_duration,
+            "paused": self.is_paused,
+            "shuffle": self.keep_playing,
+            "shuffle_mode": self.shuffle_mode,
+            "volume": self.volume,
+            "songs": len(self.songs),
+            "up_next": len(self.up_next),
+        }
+
+    @locked
+    def poll(self, refresh_ms=500):
+        # Handle a finished song. Returns how many ms the caller may wait before the
+        # next poll (waking right at the end of the song if that comes sooner), or
+        # None while nothing is playing.
+        if self.io is not None and self.io.root is None:
+            # Headless: poll() is what runs the executor's callbacks
+            self.io.run_callbacks()
+        if self.file_changes:
+            self.apply_file_changes()
+        if not self.mixer_ready:
+            return None
+        if self.dsp is not None:
+            self.handle_engine_events()
+        elif self._song_ended():
+            self.on_song_end()
+        if not self.is_playing():
+            return None
+        delay = refresh_ms
+        if self.total_duration:
+            remaining = (self.total_duration - self.position()) * 1000
+            delay = max(10, min(delay, int(remaining)))
+        return delay
+
+    def handle_engine_events(self):
+        for event, path in self.dsp.take_events():
+            if event == "advanced" and self.queued_track is not None and path == self.queued_track.path:
+                self.advance_to_queued()
+            elif event == "ended" and path == self.current_song:
+                self.on_song_end()
+
+    def _song_ended(self):
+        if self.use_endevent:
+            return bool(pygame.event.get(MUSIC_END))
+        busy = pygame.mixer.music.get_busy()
+        ended = self._was_busy and not busy and not self.is_paused
+        self._was_busy = busy
+        return ended
+
+    def _discard_end_events(self):
+        # Drop end events from a song that was replaced or stopped on purpose
+        if self.use_endevent:
+            pygame.event.clear(MUSIC_END)
+
+    def on_song_end(self):
+        # Move on to the next queued or shuffled song
+        if self.queued_track is not None and self.is_playing():
+            # The mixer already started the queued song without a gap
+            self.advance_to_queued()
+            return
+        if self.play_up_next():
+            return
+        if not self.keep_playing or self.shuffle is None:
+            return
+        self.play_shuffled(self.shuffle.next)
+
+    @locked
+    def enqueue(self, paths):
+        # Play these songs next, in order, before the playlist or shuffle goes
+        # on. Returns how many songs are waiting.
+        paths = [paths] if isinstance(paths, str) else list(paths)
+        first = not self.up_next
+        self.up_next.extend(paths)
+        if paths and first and self.gapless and (self.is_playing() or self.is_paused):
+            # Put the song in the mixer queue in place of the shuffle's pick
+            self.queue_next_song()
+        self.emit("queued", paths=paths)
+        return len(self.up_next)
+
+    def play_up_next(self):
+        # Play the first queued song that opens; False when none is left
+        while self.up_next:
+            if self.play_song(self.up_next.popleft()):
+                return True
+        return False
+
+    def queue_next_song(self):
+        # Pre-open the song that comes next in the mixer queue: the first one
+        # from enqueue(), or else the shuffle engine's pick
+        self.queued_index = None
+        self.queued_track = None
+        if self.queue_up_next() or self.shuffle is None:
+            return
+        if self.io is not None:
+            self._queue_in_background()
+            return
+        for _ in range(self.MAX_SKIPS):
+            index = self.shuffle.peek()
+            if index is None:
+                return
+            track = self.library.get(self.playlist[index])
+            if track is not None:
+                try:
+                    self.queue_track(track)
+                except pygame.error:
+                    track = None
+            if track is None:
+                self.shuffle.drop_next()
+                continue
+            self.queued_index = index
+            self.queued_track = track
+            return
+
+    def queue_up_next(self):
+        # Songs from enqueue() are usually in the library already, so they
+        # are looked up here even with an I/O executor
+        while self.up_next:
+            track = self.library.get(self.up_next[0])
+            if track is not None:
+                try:
+                    self.queue_track(track)
+                except pygame.error:
+                    track = None
+            if track is not None:
+                self.queued_track = track
+                return True
+            self.up_next.popleft()
+        return False
+
+    def _queue_in_background(self, skips=0):
+        # Look the next song up on the I/O executor, then queue it here
+        index = self.shuffle.peek()
+        if index is None or skips >= self.MAX_SKIPS:
+            return
+        current = self.current_song
+        self.io.submit(self.library.get, self.playlist[index], key="queue",
+                       callback=lambda future: self._queue_checked(index, current, skips, future))
+
+    @locked
+    def _queue_checked(self, index, current, skips, future):
+        if self.shuffle is None or self.current_song != current or self.up_next or self.shuffle.peek() != index:
+            return
+        track = future.result() if future.exception() is None else None
+        if track is not None:
+            try:
+                self.queue_track(track)
+            except pygame.error:
+                track = None
+        if track is None:
+            self.shuffle.drop_next()
+            self._queue_in_background(skips + 1)
+            return
+        self.queued_index = index
+        self.queued_track = track
+
+    def queue_track(self, track):
+        # Hand the follow-up song to the mixer, or to the DSP engine to crossfade into
+        with STATS.timer("mixer.queue", path=track.path):
+            if self.dsp is not None:
+                self.dsp.queue(track.path, self.track_gain(track))
+            else:
+                pygame.mixer.music.queue(track.path)
+
+    def advance_to_queued(self):
+        # Make the song the mixer moved on to the current one and queue its successor
+        track = self.queued_track
+        if self.queued_index is None:
+            # A song from enqueue(); the playlist position stays where it was
+            self.up_next.popleft()
+        else:
+            self.current_index = self.shuffle.next()
+        self.current_song = track.path
+        self.total_duration = track.duration or 0
+        self.seek_offset = 0.0
+        self.gain = self.track_gain(track)
+        self.apply_volume()
+        self.queue_next_song()
+        self.emit("track", path=track.path, index=self.current_index, duration=self.total_duration)
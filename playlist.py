@@ -0,0 +1,120 @@
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from urllib.parse import unquote, urlparse
+from urllib.request import url2pathname
+
+from favorites_store import validate_paths
+from instrumentation import STATS
+
+_background = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playlist")
+
+PLAYLIST_TYPES = [("Playlist", "*.m3u *.m3u8 *.pls"), ("M3U Playlist", "*.m3u *.m3u8"), ("PLS Playlist", "*.pls")]
+
+# Entries checked for existence at a time while a playlist is loaded
+BATCH_SIZE = 2048
+
+
+def _decode(raw):
+    # .m3u files come in UTF-8 or the writer's ANSI code page; try UTF-8 first
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def resolve_entry(entry, base):
+    # Absolute path of a playlist entry, or None for URLs that are not files
+    entry = entry.strip()
+    if not entry:
+        return None
+    if entry.lower().startswith("file:"):
+        entry = url2pathname(unquote(urlparse(entry).path))
+    elif "://" in entry:
+        return None
+    return os.path.normpath(os.path.join(base, os.path.expanduser(entry)))
+
+
+def read_playlist(path):
+    # Yield the song paths of an M3U, M3U8 or PLS playlist in order, one line
+    # at a time. Relative entries are resolved against the playlist's folder.
+    base = os.path.dirname(os.path.abspath(path))
+    pls = path.lower().endswith(".pls")
+    with open(path, "rb") as f:
+        for number, raw in enumerate(f):
+            line = _decode(raw).strip()
+            if number == 0:
+                line = line.lstrip("\ufeff")
+            if pls:
+                key, _, value = line.partition("=")
+                if not key.lower().startswith("file"):
+                    continue
+                line = value
+            elif line.startswith("#"):
+                continue
+            song = resolve_entry(line, base)
+            if song is not None:
+                yield song
+
+
+def load_in_background(path, batch_size=BATCH_SIZE):
+    # Read a playlist and check its entries off the calling thread, a batch at
+    # a time. The future resolves to (existing songs in order, missing count).
+    def load():
+        songs = []
+        missing = 0
+        with STATS.timer("playlist.load", path=path):
+            entries = read_playlist(path)
+            while True:
+                batch = list(islice(entries, batch_size))
+                if not batch:
+                    break
+                existing = validate_paths(batch)
+                missing += len(batch) - len(existing)
+                songs.extend(existing)
+        return songs, missing
+    return _background.submit(load)
+
+
+def write_playlist(path, songs, tracks=None):
+    # Write songs to an M3U/M3U8 (by default) or PLS playlist, streaming the
+    # entries into a temp file that replaces the playlist when complete. Songs
+    # below the playlist's folder are stored relative to it. tracks maps paths
+    # to library Tracks for titles and lengths; unknown songs get none.
+    tracks = tracks or {}
+    folder = os.path.dirname(os.path.abspath(path))
+    pls = path.lower().endswith(".pls")
+
+    prefix = os.path.join(folder, "")
+
+    def entry(song):
+        return song[len(prefix):] if song.startswith(prefix) else song
+
+    def title(song, track):
+        name = os.path.splitext(os.path.basename(song))[0]
+        if track is None or not track.title:
+            return name
+        return f"{track.artist} - {track.title}" if track.artist else track.title
+
+    with STATS.timer("playlist.save", path=path):
+        fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".playlist-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="\n") as f:
+                f.write("[playlist]\n" if pls else "#EXTM3U\n")
+                count = 0
+                for count, song in enumerate(songs, 1):
+                    track = tracks.get(song)
+                    length = round(track.duration) if track is not None and track.duration else -1
+                    if pls:
+                        f.write(f"File{count}={entry(song)}\nTitle{count}={title(song, track)}\n"
+                                f"Length{count}={length}\n")
+                    else:
+                        f.write(f"#EXTINF:{length},{title(song, track)}\n{entry(song)}\n")
+                if pls:
+                    f.write(f"NumberOfEntries={count}\nVersion=2\n")
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
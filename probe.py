@@ -0,0 +1,275 @@
+import io
+import os
+import struct
+from collections import namedtuple
+
+from mutagen import File as MutagenFile
+
+# What a probe found and how many bytes it had to read for it. source is
+# "header" for the format probes and "fallback" when mutagen parsed the file.
+AudioInfo = namedtuple("AudioInfo", "duration rate channels bytes_read source")
+
+# MPEG audio header fields, indexed by the version bits (0 = 2.5, 2 = 2, 3 = 1)
+MPEG_RATES = {0: (11025, 12000, 8000), 2: (22050, 24000, 16000), 3: (44100, 48000, 32000)}
+MPEG1_BITRATES = {
+    1: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+}
+MPEG2_BITRATES = {
+    1: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    3: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# Header probes read this much at a time, doubling up to HEADER_LIMIT bytes
+# (past any tag) before giving up on a file
+HEADER_STEP = 4 * 1024
+HEADER_LIMIT = 64 * 1024
+
+# ID3v2 text frames read for the library (v2.3/2.4 ids, then v2.2 ids)
+ID3_TEXT_FRAMES = {b"TIT2": "title", b"TPE1": "artist", b"TALB": "album",
+                   b"TT2": "title", b"TP1": "artist", b"TAL": "album"}
+ID3_ENCODINGS = ("latin-1", "utf-16", "utf-16-be", "utf-8")
+
+
+class CountingReader:
+    # Binary file wrapper that adds up the bytes read through it
+
+    def __init__(self, f):
+        self.f = f
+        self.name = getattr(f, "name", "")
+        self.bytes_read = 0
+        self.size = os.fstat(f.fileno()).st_size
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.bytes_read += len(data)
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self.f.seek(offset, whence)
+
+    def tell(self):
+        return self.f.tell()
+
+
+def syncsafe(data):
+    # 7 bits per byte, as ID3v2 stores sizes
+    size = 0
+    for byte in data:
+        size = (size << 7) | (byte & 0x7F)
+    return size
+
+
+def id3_size(data, pos):
+    # Length of an ID3v2 tag at pos, or 0
+    if data[pos:pos + 3] != b"ID3" or len(data) < pos + 10:
+        return 0
+    return 10 + syncsafe(data[pos + 6:pos + 10]) + (10 if data[pos + 5] & 0x10 else 0)
+
+
+def read_id3_text(f):
+    # {"title": [...], "artist": [...], "album": [...]} from the ID3v2 tag at
+    # the start of f. Only frame headers and the wanted text frames are read;
+    # cover art and other frames are seeked over. None without a tag, or when
+    # the tag needs a full parser (unsynchronised, compressed, encrypted).
+    f.seek(0)
+    header = f.read(10)
+    if len(header) < 10 or header[:3] != b"ID3" or header[3] not in (2, 3, 4):
+        return None
+    version, flags = header[3], header[5]
+    if flags & 0x80 or (version == 2 and flags & 0x40):
+        return None
+    end = 10 + syncsafe(header[6:10])
+    pos = 10
+    if flags & 0x40:
+        # Extended header: its size counts itself in v2.4 but not in v2.3
+        data = f.read(4)
+        pos += syncsafe(data) if version == 4 else 4 + struct.unpack(">I", data)[0]
+        f.seek(pos)
+    head_size = 6 if version == 2 else 10
+    # Frame flags that put extra bytes before the text or transform it
+    unusual = {2: 0, 3: 0xE0, 4: 0x4F}[version]
+    found = {}
+    while pos + head_size <= end and len(found) < 3:
+        head = f.read(head_size)
+        if len(head) < head_size or head[0] == 0:
+            # Padding
+            break
+        if version == 2:
+            frame, size, frame_flags = head[:3], int.from_bytes(head[3:6], "big"), 0
+        else:
+            frame, frame_flags = head[:4], head[9]
+            size = syncsafe(head[4:8]) if version == 4 else struct.unpack(">I", head[4:8])[0]
+        pos += head_size + size
+        key = ID3_TEXT_FRAMES.get(frame)
+        if key is None or key in found:
+            f.seek(pos)
+            continue
+        if frame_flags & unusual:
+            return None
+        body = f.read(size)
+        if not body or body[0] >= len(ID3_ENCODINGS):
+            return None
+        text = body[1:].decode(ID3_ENCODINGS[body[0]], errors="replace")
+        found[key] = [value for value in text.split("\0") if value]
+    return found
+
+
+def mpeg_frame(data, pos):
+    # (length, rate, samples) of the MPEG audio frame at pos, or None
+    if data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    version, layer = (data[pos + 1] >> 3) & 3, 4 - ((data[pos + 1] >> 1) & 3)
+    bitrate_index, rate_index = data[pos + 2] >> 4, (data[pos + 2] >> 2) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    rate = MPEG_RATES[version][rate_index]
+    bitrate = (MPEG1_BITRATES if version == 3 else MPEG2_BITRATES)[layer][bitrate_index] * 1000
+    padding = (data[pos + 2] >> 1) & 1
+    if layer == 1:
+        return (12 * bitrate // rate + padding) * 4, rate, 384
+    samples = 1152 if layer == 2 or version == 3 else 576
+    return samples // 8 * bitrate // rate + padding, rate, samples
+
+
+def probe_wav(f):
+    # Everything is in the RIFF header: fmt chunk and the data chunk size
+    riff = f.read(12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise ValueError("Not a RIFF/WAVE file")
+    fmt = None
+    while fmt is None or f.tell() < f.size:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+        name, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if name == b"fmt ":
+            fmt = f.read(16)
+            f.seek(size + (size & 1) - 16, io.SEEK_CUR)
+        elif name == b"data" and fmt is not None:
+            channels, rate, byte_rate = struct.unpack("<HII", fmt[2:12])
+            size = min(size, f.size - f.tell())
+            return size / byte_rate, rate, channels
+        else:
+            f.seek(size + (size & 1), io.SEEK_CUR)
+    raise ValueError("WAV file has no fmt and data chunks")
+
+
+def probe_mp3(f):
+    # First frame header, then the Xing/Info or VBRI frame count if there is one;
+    # without it the stream is constant bitrate and the file size gives the length
+    start = id3_size(f.read(10), 0)
+    f.seek(start)
+    data = f.read(HEADER_STEP)
+    pos = 0
+    while True:
+        pos = data.find(b"\xff", pos)
+        if pos < 0 or pos + 64 > len(data):
+            # The frame and its Xing/VBRI header may not be fully read yet
+            if len(data) >= HEADER_LIMIT or f.tell() >= f.size:
+                if pos < 0 or pos + 4 > len(data):
+                    raise ValueError("No MPEG audio frame in the file header")
+            else:
+                data += f.read(len(data))
+                pos = max(0, pos)
+                continue
+        frame = mpeg_frame(data, pos)
+        if frame is not None:
+            break
+        pos += 1
+    rate, samples = frame[1:]
+    mono = data[pos + 3] >> 6 == 3
+    channels = 1 if mono else 2
+    mpeg1 = (data[pos + 1] >> 3) & 3 == 3
+    xing = pos + 4 + (17 if mpeg1 and mono else 32 if mpeg1 else 9 if mono else 17)
+    if data[xing:xing + 4] in (b"Xing", b"Info") and data[xing + 7] & 1:
+        frames = struct.unpack(">I", data[xing + 8:xing + 12])[0]
+        return frames * samples / rate, rate, channels
+    if data[pos + 36:pos + 40] == b"VBRI":
+        frames = struct.unpack(">I", data[pos + 50:pos + 54])[0]
+        return frames * samples / rate, rate, channels
+    end = f.size
+    f.seek(max(0, end - 128))
+    if f.read(3) == b"TAG":
+        end -= 128
+    layer = 4 - ((data[pos + 1] >> 1) & 3)
+    bitrate = (MPEG1_BITRATES if mpeg1 else MPEG2_BITRATES)[layer][data[pos + 2] >> 4] * 1000
+    return (end - start - pos) * 8 / bitrate, rate, channels
+
+
+def probe_ogg(f):
+    # Rate and channels from the Vorbis identification header, length from the
+    # granule position of the last page
+    page = f.read(28 + 30)
+    if page[:4] != b"OggS":
+        raise ValueError("Not an Ogg file")
+    packet = page[27 + page[26]:]
+    if packet[:7] != b"\x01vorbis":
+        raise ValueError("Not an Ogg Vorbis stream")
+    channels, rate = struct.unpack("<BI", packet[11:16])
+    tail = HEADER_STEP
+    while True:
+        start = max(0, f.size - tail)
+        f.seek(start)
+        data = f.read(f.size - start)
+        pos = data.rfind(b"OggS")
+        while pos >= 0:
+            granule = struct.unpack("<q", data[pos + 6:pos + 14])[0] if pos + 14 <= len(data) else -1
+            if granule >= 0:
+                return granule / rate, rate, channels
+            pos = data.rfind(b"OggS", 0, pos)
+        if start == 0 or tail >= HEADER_LIMIT:
+            raise ValueError("No Ogg page with a granule position near the end")
+        tail *= 2
+
+
+PROBES = {".wav": probe_wav, ".mp3": probe_mp3, ".ogg": probe_ogg}
+
+
+def register_probe(extension, probe):
+    # probe(f) gets a CountingReader and returns (duration, rate, channels), or
+    # raises ValueError to let the fallback have a go
+    PROBES[extension.lower()] = probe
+
+
+def probe_fallback(f):
+    # Let mutagen parse the file; slower and may read much more of it
+    audio = MutagenFile(f)
+    if audio is None:
+        raise ValueError("Unknown audio format")
+    info = audio.info
+    return getattr(info, "length", 0) or 0, getattr(info, "sample_rate", None), getattr(info, "channels", None)
+
+
+def probe_audio(path):
+    # AudioInfo of a file, with zeros and Nones if nothing could read it.
+    # OSError is raised for unreadable files.
+    with open(path, "rb") as raw:
+        return _probe(CountingReader(raw), path)
+
+
+def probe_with_tags(path, read_tags):
+    # (AudioInfo, tags): the stream probe, then read_tags(f) on the same
+    # reader, so bytes_read counts the tag reads too
+    with open(path, "rb") as raw:
+        f = CountingReader(raw)
+        duration, rate, channels, _, source = _probe(f, path)
+        f.seek(0)
+        tags = read_tags(f)
+        return AudioInfo(duration, rate, channels, f.bytes_read, source), tags
+
+
+def _probe(f, path):
+    probe = PROBES.get(os.path.splitext(path)[1].lower())
+    if probe is not None:
+        try:
+            return AudioInfo(*probe(f), f.bytes_read, "header")
+        except (ValueError, struct.error, IndexError, ZeroDivisionError):
+            pass
+    f.seek(0)
+    try:
+        return AudioInfo(*probe_fallback(f), f.bytes_read, "fallback")
+    except Exception:
+        return AudioInfo(0, None, None, f.bytes_read, "fallback")
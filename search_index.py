@@ -0,0 +1,184 @@
+import bisect
+import heapq
+import itertools
+import re
+import threading
+
+WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return WORD.findall(text.lower())
+
+
+class SearchIndex:
+    # Inverted index for search-as-you-type over songs (file name, title, artist,
+    # album). Songs map to words and every distinct word is indexed once by its
+    # trigrams and its one- and two-letter prefixes. A query term finds its words
+    # through the trigram postings (smallest first, confirmed with a substring
+    # test) and the songs of those words; the terms' song sets are intersected.
+    # Songs can be added, updated and removed one at a time, removed from a list
+    # with the later ids moving down, and an index built on the side can be
+    # merged in.
+    #
+    # Songs are stored under slots that never change. Removing songs from the
+    # list leaves holes in the slots instead of renumbering the songs after
+    # them: a song's id is its slot less the holes below it. The holes go
+    # away with the index when the song list is replaced.
+
+    def __init__(self):
+        self.doc_words = {}
+        self.word_docs = {}
+        self.trigrams = {}
+        self.prefixes = {}
+        # Highest slot used
+        self.max_id = -1
+        # Slots of removed songs, sorted, and each hole less the holes below
+        # it, which finds the slot of an id with one bisect
+        self._holes = []
+        self._shifted = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.doc_words)
+
+    def add(self, doc_id, *fields):
+        words = self._words(fields)
+        with self.lock:
+            self._add(self._slot(doc_id), words)
+
+    update = add
+
+    def add_many(self, items, chunk_size=2000):
+        # items yields (doc_id, fields) pairs. The lock is taken per chunk so
+        # searches can run while a large library is being indexed.
+        items = iter(items)
+        while True:
+            chunk = [(doc_id, self._words(fields)) for doc_id, fields in itertools.islice(items, chunk_size)]
+            if not chunk:
+                return
+            with self.lock:
+                for doc_id, words in chunk:
+                    self._add(self._slot(doc_id), words)
+
+    def merge(self, other):
+        # Take over other's songs, replacing entries with the same id
+        with other.lock:
+            docs = [(other._doc_id(slot), words) for slot, words in other.doc_words.items()]
+        with self.lock:
+            for doc_id, words in docs:
+                self._add(self._slot(doc_id), words)
+
+    def remove(self, doc_id):
+        with self.lock:
+            self._remove(self._slot(doc_id))
+
+    def remove_docs(self, doc_ids):
+        # Remove songs taken off the list; the ids above each one move down
+        # by one. Only the removed songs' entries are touched.
+        with self.lock:
+            slots = [self._slot(doc_id) for doc_id in sorted(set(doc_ids))]
+            if not slots:
+                return
+            for slot in slots:
+                self._remove(slot)
+            self._holes = list(heapq.merge(self._holes, slots))
+            self._shifted = [hole - below for below, hole in enumerate(self._holes)]
+
+    def search(self, query, limit=None):
+        # Ids of songs matching every word of the query, lowest ids first
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self.lock:
+            sets = []
+            for term in set(terms):
+                docs = self._term_docs(term)
+                if not docs:
+                    return []
+                sets.append(docs)
+            sets.sort(key=len)
+            candidates = sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+            if limit is None:
+                found = sorted(candidates)
+            elif len(candidates) > 4 * limit:
+                # Dense result: walking slots in order stops early
+                found = []
+                for slot in range(self.max_id + 1):
+                    if slot in candidates:
+                        found.append(slot)
+                        if len(found) == limit:
+                            break
+            else:
+                found = heapq.nsmallest(limit, candidates)
+            if not self._holes:
+                return found
+            return [self._doc_id(slot) for slot in found]
+
+    def _term_docs(self, term):
+        # Songs with a word containing term (or starting with it, for short terms)
+        if len(term) < 3:
+            words = self.prefixes.get(term, ())
+        else:
+            postings = sorted((self.trigrams.get(term[i:i + 3], ()) for i in range(len(term) - 2)), key=len)
+            if not postings[0]:
+                return set()
+            words = [word for word in postings[0]
+                     if term in word and all(word in posting for posting in postings[1:])]
+        docs = set()
+        for word in words:
+            docs |= self.word_docs[word]
+        return docs
+
+    @staticmethod
+    def _words(fields):
+        words = set()
+        for field in fields:
+            if field:
+                words.update(tokenize(field))
+        return words
+
+    def _slot(self, doc_id):
+        return doc_id + bisect.bisect_right(self._shifted, doc_id)
+
+    def _doc_id(self, slot):
+        return slot - bisect.bisect_left(self._holes, slot)
+
+    def _add(self, slot, words):
+        if slot in self.doc_words:
+            self._remove(slot)
+        self.doc_words[slot] = words
+        self.max_id = max(self.max_id, slot)
+        for word in words:
+            docs = self.word_docs.get(word)
+            if docs is None:
+                docs = self.word_docs[word] = set()
+                self._index_word(word)
+            docs.add(slot)
+
+    def _remove(self, slot):
+        for word in self.doc_words.pop(slot, ()):
+            docs = self.word_docs[word]
+            docs.discard(slot)
+            if not docs:
+                del self.word_docs[word]
+                self._unindex_word(word)
+
+    def _index_word(self, word):
+        for gram in self._grams(word):
+            self.trigrams.setdefault(gram, set()).add(word)
+        for prefix in {word[:1], word[:2]}:
+            self.prefixes.setdefault(prefix, set()).add(word)
+
+    def _unindex_word(self, word):
+        for index, keys in ((self.trigrams, self._grams(word)), (self.prefixes, {word[:1], word[:2]})):
+            for key in keys:
+                posting = index.get(key)
+                if posting is not None:
+                    posting.discard(word)
+                    if not posting:
+                        del index[key]
+
+    @staticmethod
+    def _grams(word):
+        return {word[i:i + 3] for i in range(len(word) - 2)}
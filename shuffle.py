@@ -0,0 +1,189 @@
+import bisect
+import heapq
+import random
+from collections import deque
+
+SHUFFLE_MODES = ("uniform", "favorites", "fresh")
+
+
+class ShuffleEngine:
+    # Shuffled order over song indices 0..size-1. The permutation is a lazy
+    # Fisher-Yates: each draw swaps one slot and only displaced slots are kept in
+    # a dict, so starting costs O(1) and memory grows with the songs played, not
+    # with the library. Back/forward history is bounded. Songs taken off the
+    # list leave holes in the slots still to be drawn, which draws skip and
+    # which are closed when the next pass starts.
+    #
+    # Modes:
+    #   uniform    every song once per pass
+    #   favorites  favorite songs come up favorite_weight times as often
+    #   fresh      songs from the last recent_window plays are put off (at
+    #              most size - 1 of them, so some song is always fresh)
+
+    def __init__(self, size, mode="uniform", favorites=(), favorite_weight=3,
+                 recent_window=50, history=500, rng=None):
+        if mode not in SHUFFLE_MODES:
+            raise ValueError(f"Unknown shuffle mode: {mode}")
+        self.size = size
+        self.mode = mode
+        self.favorites = list(favorites)
+        self.favorite_weight = favorite_weight
+        self.rng = rng or random.Random()
+        self.back = deque(maxlen=history)
+        self.forward = deque(maxlen=history)
+        self.current = None
+        self.recent_window = recent_window
+        self.recent = deque(maxlen=self._window())
+        self.recent_set = set()
+        self.deferred = deque()
+        self._swaps = {}
+        self._drawn = 0
+        # Slot values of removed songs, sorted; a song's index is its slot
+        # value less the holes below it
+        self._holes = []
+
+    def resize(self, size):
+        # Songs appended to the library join the current pass; a smaller library restarts it
+        if size < self.size:
+            self._swaps.clear()
+            self._drawn = 0
+            self._holes = []
+            self.back.clear()
+            self.forward.clear()
+            self.deferred.clear()
+        self.size = size
+        self._fit_recent()
+
+    def remove(self, indices):
+        # Songs at these indices were taken off the list: they are not drawn
+        # again this pass, history drops them and later indices move down
+        removed = sorted(set(indices))
+        if not removed:
+            return
+        # Index to slot value: count the holes at or below the value
+        values = []
+        holes = 0
+        for index in removed:
+            while holes < len(self._holes) and self._holes[holes] <= index + holes:
+                holes += 1
+            values.append(index + holes)
+        self._holes = list(heapq.merge(self._holes, values))
+        self.size -= len(removed)
+        gone = set(removed)
+
+        def moved(indices):
+            return [index - bisect.bisect_left(removed, index) for index in indices if index not in gone]
+        self.back = deque(moved(self.back), maxlen=self.back.maxlen)
+        self.forward = deque(moved(self.forward), maxlen=self.forward.maxlen)
+        if self.current is not None:
+            self.current = (moved([self.current]) or [None])[0]
+        self.recent = deque(moved(self.recent), maxlen=self.recent.maxlen)
+        self.recent_set = set(self.recent)
+        self._fit_recent()
+        self.deferred = deque(moved(self.deferred))
+        self.favorites = moved(self.favorites)
+
+    def add_favorite(self, index):
+        self.favorites.append(index)
+
+    def next(self):
+        # Advance to the next song; replays the forward history after previous()
+        if self.forward:
+            index = self.forward.pop()
+        else:
+            index = self._choose()
+        if index is None:
+            return None
+        if self.current is not None:
+            self.back.append(self.current)
+        self.current = index
+        self._remember(index)
+        return index
+
+    def peek(self):
+        # The song next() will return, drawn now if needed
+        if not self.forward:
+            index = self._choose()
+            if index is None:
+                return None
+            self.forward.append(index)
+        return self.forward[-1]
+
+    def drop_next(self):
+        # Skip the peeked song, e.g. because its file is gone
+        if self.forward:
+            self.forward.pop()
+
+    def previous(self):
+        if not self.back:
+            return None
+        self.forward.append(self.current)
+        self.current = self.back.pop()
+        return self.current
+
+    def _draw(self):
+        # One step of the lazy Fisher-Yates; a new pass starts when all are drawn
+        while True:
+            slots = self.size + len(self._holes)
+            if self._drawn >= slots:
+                self._swaps.clear()
+                self._drawn = 0
+                self._holes = []
+                slots = self.size
+            if slots == 0:
+                return None
+            i = self._drawn
+            j = self.rng.randrange(i, slots)
+            chosen = self._swaps.get(j, j)
+            if j != i:
+                self._swaps[j] = self._swaps.get(i, i)
+            self._swaps.pop(i, None)
+            self._drawn += 1
+            below = bisect.bisect_left(self._holes, chosen)
+            if below == len(self._holes) or self._holes[below] != chosen:
+                return chosen - below
+
+    def _choose(self):
+        if self.mode == "favorites" and self.favorites:
+            others = max(self.size - len(self.favorites), 0)
+            weighted = self.favorite_weight * len(self.favorites)
+            if self.rng.random() * (weighted + others) < weighted:
+                return self.rng.choice(self.favorites)
+        if self.mode == "fresh":
+            return self._choose_fresh()
+        return self._draw()
+
+    def _choose_fresh(self):
+        # Put off recently played songs; they come back once they drop out of the window
+        if self.deferred and self.deferred[0] not in self.recent_set:
+            return self.deferred.popleft()
+        for _ in range(8):
+            if len(self.deferred) >= self.size:
+                # Never more put off than there are songs
+                break
+            index = self._draw()
+            if index is None or index not in self.recent_set:
+                return index
+            self.deferred.append(index)
+        return self.deferred.popleft()
+
+    def _window(self):
+        return max(0, min(self.recent_window, self.size - 1))
+
+    def _fit_recent(self):
+        # Keep the window below the library size as songs come and go
+        if self.recent.maxlen != self._window():
+            self.recent = deque(self.recent, maxlen=self._window())
+            self.recent_set = set(self.recent)
+
+    def _remember(self, index):
+        if not self.recent.maxlen:
+            return
+        if len(self.recent) == self.recent.maxlen:
+            oldest = self.recent[0]
+            self.recent.append(index)
+            if oldest not in self.recent:
+                self.recent_set.discard(oldest)
+        else:
+            self.recent.append(index)
+        self.recent_set.add(index)
@@ -0,0 +1,160 @@
+import bisect
+import tkinter as tk
+
+
+class VirtualSongList(tk.Frame):
+    # Listbox that only holds the visible window of rows. Row text comes from
+    # format_row(index), so the model can be any size and a change to one track
+    # only re-renders that row if it is on screen. set_filter() shows a subset
+    # of the model; indices passed in and out are always model indices.
+
+    def __init__(self, parent, format_row, rows=8, on_select=None, **listbox_options):
+        super().__init__(parent, bg=parent.cget("bg"))
+        self.format_row = format_row
+        self.rows = rows
+        self.on_select = on_select
+        self.model_count = 0
+        self.count = 0
+        self.rows_filter = None
+        self.filter_positions = None
+        self.top = 0
+        self.selected = set()
+
+        self.listbox = tk.Listbox(self, height=rows, exportselection=False, **listbox_options)
+        self.listbox.pack(side=tk.LEFT)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox.bind('<<ListboxSelect>>', self._sync_selection)
+        self.listbox.bind('<MouseWheel>', self._on_mousewheel)
+        self.listbox.bind('<Button-4>', lambda e: self.scroll_to(self.top - 3))
+        self.listbox.bind('<Button-5>', lambda e: self.scroll_to(self.top + 3))
+        self.listbox.bind('<Up>', lambda e: self._on_arrow(-1))
+        self.listbox.bind('<Down>', lambda e: self._on_arrow(1))
+
+    def set_count(self, count, removed=()):
+        # Resize the model; selected and filtered rows beyond the new end are
+        # dropped. removed lists the old indices of rows taken out of the
+        # model: they leave the selection and filter, and later rows move up.
+        # Run the filter again to show matching rows that were added.
+        self.model_count = count
+        if removed:
+            removed = sorted(removed)
+            gone = set(removed)
+
+            def moved(indices):
+                return [i - bisect.bisect_left(removed, i) for i in indices if i not in gone]
+            self.selected = set(moved(self.selected))
+            if self.rows_filter is not None:
+                self.rows_filter = moved(self.rows_filter)
+        self.selected = {i for i in self.selected if i < count}
+        if self.rows_filter is None:
+            self.count = count
+        else:
+            self.rows_filter = [i for i in self.rows_filter if i < count]
+            self.filter_positions = {index: row for row, index in enumerate(self.rows_filter)}
+            self.count = len(self.rows_filter)
+        self.top = max(0, min(self.top, self.count - self.rows))
+        self.redraw()
+
+    def set_filter(self, indices):
+        # Show only the given model indices (in that order); None shows everything
+        self.rows_filter = indices
+        if indices is None:
+            self.filter_positions = None
+            self.count = self.model_count
+        else:
+            self.filter_positions = {index: row for row, index in enumerate(indices)}
+            self.count = len(indices)
+        self.top = 0
+        self.redraw()
+
+    def model_index(self, row):
+        return row if self.rows_filter is None else self.rows_filter[row]
+
+    def row_of(self, index):
+        if self.rows_filter is None:
+            return index if index < self.count else None
+        return self.filter_positions.get(index)
+
+    def size(self):
+        return self.count
+
+    def redraw(self):
+        # Re-render the visible window only
+        visible = [self.model_index(row) for row in range(self.top, min(self.top + self.rows, self.count))]
+        self.listbox.delete(0, tk.END)
+        if visible:
+            self.listbox.insert(tk.END, *(self.format_row(i) for i in visible))
+        for row, index in enumerate(visible):
+            if index in self.selected:
+                self.listbox.selection_set(row)
+        self._update_scrollbar()
+
+    def refresh_rows(self, indices):
+        # Re-render the given model rows if they are currently visible
+        for index in indices:
+            row = self.row_of(index)
+            if row is None:
+                continue
+            row -= self.top
+            if 0 <= row < self.rows:
+                self.listbox.delete(row)
+                self.listbox.insert(row, self.format_row(index))
+                if index in self.selected:
+                    self.listbox.selection_set(row)
+
+    def curselection(self):
+        return tuple(sorted(self.selected))
+
+    def selection_set(self, index):
+        self.selected.add(index)
+        self.refresh_rows([index])
+
+    def selection_clear(self):
+        self.selected.clear()
+        self.listbox.selection_clear(0, tk.END)
+
+    def see(self, index):
+        row = self.row_of(index)
+        if row is not None and (row < self.top or row >= self.top + self.rows):
+            self.scroll_to(row - self.rows // 2)
+
+    def scroll_to(self, top):
+        top = max(0, min(top, self.count - self.rows))
+        if top != self.top:
+            self.top = top
+            self.redraw()
+        return "break"
+
+    def yview(self, *args):
+        # Scrollbar protocol: ("moveto", fraction) or ("scroll", n, "units"/"pages")
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * self.count))
+        elif args[0] == "scroll":
+            step = self.rows if args[2] == "pages" else 1
+            self.scroll_to(self.top + int(args[1]) * step)
+
+    def _update_scrollbar(self):
+        if self.count <= self.rows:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / self.count, (self.top + self.rows) / self.count)
+
+    def _sync_selection(self, event=None):
+        visible = range(self.top, min(self.top + self.rows, self.count))
+        self.selected.difference_update(self.model_index(row) for row in visible)
+        self.selected.update(self.model_index(self.top + row) for row in self.listbox.curselection())
+        if self.on_select:
+            self.on_select(event)
+
+    def _on_mousewheel(self, event):
+        return self.scroll_to(self.top - int(event.delta / 120) * 3)
+
+    def _on_arrow(self, step):
+        active = self.top + self.listbox.index(tk.ACTIVE) + step
+        if 0 <= active < self.count:
+            if active < self.top or active >= self.top + self.rows:
+                self.scroll_to(active - self.rows // 2)
+            self.listbox.activate(active - self.top)
+        return "break"
@@ -1,39 +1,140 @@
 import tkinter as tk
 from tkinter import filedialog, ttk
-import pygame
+import multiprocessing
 import os
-import random
+import sys
 import threading
-import time
-from mutagen.mp3 import MP3  # For accurate MP3 duration
+from collections import deque
+from audio_cache import DecodedAudioCache
+from control import ControlServer, run_daemon
+from dsp import DSPEngine
+from importer import FolderImporter
+from instrumentation import STATS, StallMonitor
+from io_executor import IOExecutor
+from player_core import PlayerCore
+from playlist import PLAYLIST_TYPES
+from shuffle import SHUFFLE_MODES
+from song_list import VirtualSongList
+from stats_panel import StatsPanel
+from waveform import WaveformCache
+from waveform_bar import WaveformBar
+
+
+def _core_attribute(name):
+    # Expose a PlayerCore attribute on the view under the same name
+    return property(lambda self: getattr(self.core, name),
+                    lambda self, value: setattr(self.core, name, value))
 
 
 class MusicPlayer:
-    def __init__(self, root):
-        pygame.mixer.init()
+    # Tk front end for PlayerCore. Buttons send commands to the core and the
+    # widgets are updated from the events it emits.
+
+    songs = _core_attribute("songs")
+    favorites = _core_attribute("favorites")
+    playlist = _core_attribute("playlist")
+    current_index = _core_attribute("current_index")
+    current_song = _core_attribute("current_song")
+    is_paused = _core_attribute("is_paused")
+    keep_playing = _core_attribute("keep_playing")
+    total_duration = _core_attribute("total_duration")
+    library = _core_attribute("library")
+
+    # Most search results shown in the list at once
+    SEARCH_LIMIT = 1000
+    # How often events from control socket commands are shown, in ms
+    EVENTS_MS = 50
+
+    def __init__(self, root, library=None, refresh_ms=500, gapless=True, core=None, waveform=True,
+                 fast_start=False, watch=False, cache_mb=0, dsp=False, control=False, analyze=True):
+        # Disk and decoder work runs on the I/O executor; results come back to
+        # the Tk thread in batches
+        self.io = core.io if core is not None and core.io is not None else IOExecutor()
+        self.io.attach(root)
+        # fast_start opens the audio device in the background and shows the
+        # song list from the library snapshot (see fast_start.py)
+        # cache_mb keeps that many MB of decoded songs around the current one,
+        # so previous/next start from memory
+        decoded = DecodedAudioCache(cache_mb * 1024 * 1024) if cache_mb else None
+        # dsp plays through the block engine (crossfade, equalizer) instead
+        # of pygame.mixer.music
+        self.core = core or PlayerCore(library, gapless=gapless, lazy=fast_start, io=self.io,
+                                       decoded_cache=decoded, dsp=DSPEngine() if dsp else None)
+        # Waveform seek bar instead of the plain progress bar
+        self.waveforms = WaveformCache() if waveform else None
+        self.refresh_ms = refresh_ms
+        self._clock = None
+        # With watch, songs follow their files being added, removed and renamed
+        self.watch = watch
+        self._watch_job = None
+        self._search_job = None
+        self.importer = None
+        self.stats_panel = None
+        # Commands from the control socket run on its thread; the events they
+        # cause wait here for the Tk thread
+        self.tk_thread = threading.get_ident()
+        self.core_events = deque()
+        self._events_job = None
 
         self.root = root
         self.root.title("Simple Music Player")
-        self.root.geometry("500x650")
+        self.root.geometry("500x800")
         self.root.configure(bg="#808080")
 
-        # Initialize player state
-        self.songs = []
-        self.favorites = set()
-        self.playlist = []
-        self.current_index = 0
-        self.current_song = ""
-        self.is_paused = False
-        self.keep_playing = False
-        self.total_duration = 0
-
         # Create GUI components
         self.create_buttons()
+        self.create_search_box()
         self.create_listbox()
         self.create_volume_slider()
         self.create_progress_bar()
         self.create_status_label()
 
+        self.core.subscribe(self.receive_core_event)
+        # control serves the control socket (see control.py) next to the window
+        self.control = None
+        if control:
+            self.control = ControlServer(self.core)
+            self.control.start_thread()
+            self._events_job = self.root.after(self.EVENTS_MS, self.show_socket_events)
+        if self.songs:
+            self.update_song_list()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+        # With instrumentation on, also watch how long the Tk thread is blocked
+        self.stall_monitor = StallMonitor(self.root, STATS) if STATS.enabled else None
+        if self.stall_monitor is not None:
+            self.stall_monitor.start()
+        if fast_start:
+            self.root.after(50, self.finish_mixer_start)
+        # Measure song loudness for volume normalization once the window is up;
+        # --no-analyze or MUSIC_PLAYER_ANALYZE=0 leaves the library alone
+        if analyze and self.core.normalize:
+            self.root.after(2000, self.core.analyze_loudness)
+
+    def finish_mixer_start(self):
+        # Take over the mixer once its background init is done, without
+        # blocking the Tk thread on it
+        if self.core.mixer_starting():
+            self.root.after(50, self.finish_mixer_start)
+        else:
+            self.core.ensure_mixer()
+
+    def close(self):
+        # Save pending state and close the window
+        self.cancel_import()
+        self.stop_clock()
+        if self._watch_job is not None:
+            self.root.after_cancel(self._watch_job)
+        if self.stall_monitor is not None:
+            self.stall_monitor.stop()
+        if self.control is not None:
+            self.root.after_cancel(self._events_job)
+            self.control.close()
+        self.core.close()
+        self.io.shutdown()
+        if self.waveforms is not None:
+            self.waveforms.shutdown()
+        self.root.destroy()
+
     def create_buttons(self):
         # Helper to create styled buttons
         def create_btn(text, cmd):
@@ -41,7 +142,13 @@ class MusicPlayer:
 
         # Action buttons
         create_btn("Select Songs", self.select_songs).pack(pady=5)
+        create_btn("Import Folder", self.import_folder).pack(pady=5)
+        create_btn("Cancel Import", self.cancel_import).pack(pady=5)
         create_btn("Play Random", self.play_random).pack(pady=5)
+        self.shuffle_mode = tk.StringVar(value=self.core.shuffle_mode)
+        mode_menu = tk.OptionMenu(self.root, self.shuffle_mode, *SHUFFLE_MODES, command=self.core.set_shuffle_mode)
+        mode_menu.config(bg="#333", fg="#fff", width=22, highlightthickness=0)
+        mode_menu.pack(pady=5)
         create_btn("Previous", self.play_previous).pack(pady=5)
         create_btn("Next", self.play_next).pack(pady=5)
         create_btn("Pause / Resume", self.pause_resume).pack(pady=5)
@@ -49,16 +156,27 @@ class MusicPlayer:
         create_btn("Add to Favorites", self.add_to_favorites).pack(pady=5)
         create_btn("Save Favorites", self.save_favorites).pack(pady=5)
         create_btn("Load Favorites", self.load_favorites).pack(pady=5)
+        create_btn("Load Playlist", self.load_playlist).pack(pady=5)
+        create_btn("Save Playlist", self.save_playlist).pack(pady=5)
 
         # Button to play selected song
         play_btn = tk.Button(self.root, text="Play Selected", command=self.play_selected_song, bg="#333", fg="#4169E1", width=25)
         play_btn.pack(pady=5)
+        if STATS.enabled:
+            create_btn("Stats", self.show_stats).pack(pady=5)
+
+    def create_search_box(self):
+        # Search field; the list is filtered shortly after typing stops
+        self.search_text = tk.StringVar()
+        self.search_text.trace_add("write", lambda *args: self.schedule_search())
+        tk.Entry(self.root, textvariable=self.search_text, width=40, bg="#333", fg="#fff",
+                 insertbackground="#fff").pack(pady=(5, 0))
 
     def create_listbox(self):
         # Listbox for songs
-        self.song_listbox = tk.Listbox(self.root, height=8, width=50, bg="#333", fg="#4169E1", selectbackground="gray", selectmode=tk.MULTIPLE)
+        self.song_listbox = VirtualSongList(self.root, self.format_song_row, rows=8, on_select=self.update_selected_indices,
+                                            width=50, bg="#333", fg="#4169E1", selectbackground="gray", selectmode=tk.MULTIPLE)
         self.song_listbox.pack(pady=10)
-        self.song_listbox.bind('<<ListboxSelect>>', self.update_selected_indices)
 
     def create_volume_slider(self):
         # Volume control slider
@@ -66,11 +184,14 @@ class MusicPlayer:
                                       command=self.set_volume, bg="#808080", fg="#FFFFFF", highlightbackground="#808080", troughcolor="#00008B")
         self.volume_slider.set(30)
         self.volume_slider.pack(pady=10)
-        pygame.mixer.music.set_volume(0.7)
+        self.core.set_volume(0.7)
 
     def create_progress_bar(self):
-        # Song progress bar
-        self.progress = ttk.Progressbar(self.root, orient=tk.HORIZONTAL, length=350, mode='determinate')
+        # Song progress bar, or a clickable waveform of the song
+        if self.waveforms is not None:
+            self.progress = WaveformBar(self.root, on_seek=self.seek_to, width=350, height=48, bg="#333")
+        else:
+            self.progress = ttk.Progressbar(self.root, orient=tk.HORIZONTAL, length=350, mode='determinate')
         self.progress.pack(pady=(10, 0))
         self.time_label = tk.Label(self.root, text="00:00 / 00:00", bg="#808080", fg="#FFFFFF")
         self.time_label.pack(pady=(0, 10))
@@ -80,51 +201,162 @@ class MusicPlayer:
         self.label = tk.Label(self.root, text="", wraplength=450, bg="#808080", fg="#FFFFFF")
         self.label.pack(pady=10)
 
-    def update_song_list(self):
-        # Update listbox display with song names and highlight favorites with a star
-        self.song_listbox.delete(0, tk.END)
-        for song in self.songs:
-            name = os.path.basename(song)
-            if song in self.favorites:
-                name = "★ " + name  # Add a star symbol for favorites
-            self.song_listbox.insert(tk.END, name)
-        self.label.config(text=f"{len(self.songs)} songs loaded.")
+    def format_song_row(self, index):
+        # Song name for a list row, with a star for favorites
+        song = self.songs[index]
+        name = os.path.basename(song)
+        if song in self.favorites:
+            name = "★ " + name  # Add a star symbol for favorites
+        return name
+
+    def update_song_list(self, removed=()):
+        # Point the list view at the current song list; only visible rows are
+        # rendered. Removed songs are taken out of the filter and selection.
+        with STATS.timer("view.update_song_list", songs=len(self.songs)):
+            self.song_listbox.set_count(len(self.songs), removed)
+            if self.search_text.get().strip() and not removed:
+                # Show matches among songs added or moved since the last query
+                self.run_search()
+            else:
+                self.label.config(text=f"{len(self.songs)} songs loaded.")
+
+    def schedule_search(self, delay_ms=150):
+        # Debounce keystrokes so only the last one runs a query
+        if self._search_job is not None:
+            self.root.after_cancel(self._search_job)
+        self._search_job = self.root.after(delay_ms, self.run_search)
+
+    def run_search(self):
+        # Filter the list by file name, title, artist and album
+        self._search_job = None
+        query = self.search_text.get().strip()
+        if not query:
+            self.song_listbox.set_filter(None)
+            self.label.config(text=f"{len(self.songs)} songs loaded.")
+            return
+        with STATS.timer("view.search", query=query):
+            matches = self.core.search(query, limit=self.SEARCH_LIMIT)
+            self.song_listbox.set_filter(matches)
+        more = "+" if len(matches) >= self.SEARCH_LIMIT else ""
+        self.label.config(text=f"{len(matches)}{more} matching songs.")
 
     def select_songs(self):
         # Select songs to load into the player
         files = filedialog.askopenfilenames(filetypes=[("Audio Files", "*.mp3 *.wav *.ogg")])
-        self.songs = list(files)
-        self.update_song_list()
+        self.core.set_songs(files)
+        if files:
+            # Only the chosen files are followed, not their neighbours
+            self.start_watching(sorted({os.path.dirname(path) for path in files}), recursive=False, add_new=False)
+
+    def import_folder(self):
+        # Import every audio file below a folder without blocking the UI
+        folder = filedialog.askdirectory()
+        if not folder:
+            return
+        self.cancel_import()
+        self.core.set_songs([])
+        self.importer = FolderImporter(self.root, self.library, on_batch=self.core.append_songs,
+                                       on_progress=self._show_import_progress, on_done=self._import_finished)
+        self.importer.start(folder)
+        self.start_watching([folder])
+
+    def start_watching(self, folders, recursive=True, add_new=True):
+        if not self.watch:
+            return
+        self.core.watch(folders, recursive=recursive, add_new=add_new)
+        if self._watch_job is None:
+            self._watch_job = self.root.after(self.refresh_ms, self._check_files)
+
+    def _check_files(self):
+        # Apply the watcher's findings; the core's events update the list
+        self.core.apply_file_changes()
+        self._watch_job = self.root.after(self.refresh_ms, self._check_files)
+
+    def cancel_import(self):
+        # Stop a running folder import; songs found so far are kept
+        if self.importer and self.importer.running:
+            self.importer.cancel()
+
+    def _show_import_progress(self, imported, found):
+        self.label.config(text=f"Importing... {imported} of {found} files ready.")
+
+    def _import_finished(self, cancelled):
+        if cancelled:
+            self.label.config(text=f"Import cancelled. {len(self.songs)} songs loaded.")
+        else:
+            self.label.config(text=f"{len(self.songs)} songs imported.")
+
+    def receive_core_event(self, event, data):
+        # Tk must only be called from its own thread
+        if threading.get_ident() == self.tk_thread:
+            self.on_core_event(event, data)
+        else:
+            self.core_events.append((event, data))
+
+    def show_socket_events(self):
+        while self.core_events:
+            self.on_core_event(*self.core_events.popleft())
+        # Songs opened for socket commands report back here too
+        self.io.run_callbacks()
+        self._events_job = self.root.after(self.EVENTS_MS, self.show_socket_events)
+
+    def on_core_event(self, event, data):
+        # Reflect player state changes in the widgets
+        if event == "songs":
+            self.update_song_list(data.get("removed", ()))
+        elif event == "renamed":
+            indices = (self.core.index_of(path) for path in data["paths"])
+            self.song_listbox.refresh_rows([index for index in indices if index is not None])
+        elif event == "favorites":
+            indices = (self.core.index_of(path) for path in data["paths"])
+            self.song_listbox.refresh_rows([index for index in indices if index is not None])
+        elif event == "loading":
+            self.label.config(text=f"Loading:\n{os.path.basename(data['path'])}")
+        elif event == "failed":
+            self.label.config(text=f"Could not play:\n{os.path.basename(data['path'])}")
+        elif event == "track":
+            self.label.config(text=f"Now Playing:\n{os.path.basename(data['path'])}")
+            self.show_waveform(data["path"])
+            self.show_progress(0)
+            self.time_label.config(text="00:00 / " + self.format_time(data["duration"]))
+            self.start_clock()
+        elif event == "paused":
+            self.label.config(text="Paused")
+        elif event == "resumed":
+            self.label.config(text=f"Resumed: {os.path.basename(data['path'])}")
+            self.start_clock()
+        elif event == "seeked":
+            self.update_progress()
+        elif event == "stopped":
+            self.stop_clock()
+            self.label.config(text="Stopped")
+            self.show_progress(0)
+            self.time_label.config(text="00:00 / 00:00")
+
+    def start_clock(self):
+        # Make sure the single progress clock is running
+        if self._clock is None:
+            self._clock = self.root.after(0, self._tick)
+
+    def stop_clock(self):
+        if self._clock is not None:
+            self.root.after_cancel(self._clock)
+            self._clock = None
+
+    def _tick(self):
+        # One timer drives both end-of-song handling and the progress display.
+        # It stops rescheduling itself while nothing is playing.
+        self._clock = None
+        delay = self.core.poll(self.refresh_ms)
+        if self._clock is not None or delay is None:
+            return
+        self.update_progress()
+        self._clock = self.root.after(delay, self._tick)
 
     def play_random(self):
         # Start playing random songs continuously
-        if not self.songs:
+        if not self.core.play_random():
             self.label.config(text="Please select songs first.")
-            return
-        self.keep_playing = True
-        self.playlist = self.songs[:]
-        random.shuffle(self.playlist)
-        self.current_index = 0
-        threading.Thread(target=self._play_loop).start()
-
-    def _play_loop(self):
-        # Background loop to auto play shuffled songs
-        while self.keep_playing:
-            if self.current_index >= len(self.playlist):
-                self.current_index = 0
-                random.shuffle(self.playlist)
-            self.play_song(self.playlist[self.current_index])
-            threading.Thread(target=self.update_progress_loop, daemon=True).start()
-            while pygame.mixer.music.get_busy() and self.keep_playing:
-                time.sleep(0.5)
-            if not self.is_paused:
-                self.current_index += 1
-
-    def update_progress_loop(self):
-        # Continuously update progress bar
-        while pygame.mixer.music.get_busy():
-            self.update_progress()
-            time.sleep(1)
 
     def update_selected_indices(self, event=None):
         # Store selected indices
@@ -133,72 +365,69 @@ class MusicPlayer:
     def play_selected_song(self):
         # Play first selected song
         if hasattr(self, 'selected_indices') and self.selected_indices:
-            self.current_index = self.selected_indices[0]
-            self.keep_playing = False
-            self.playlist = self.songs[:]
-            self.play_song(self.playlist[self.current_index])
+            self.core.play_index(self.selected_indices[0])
 
     def play_song(self, song_path):
-        # Load and play the selected song
-        if os.path.exists(song_path):
-            self.current_song = song_path
-            pygame.mixer.music.load(song_path)
-            pygame.mixer.music.play()
-            try:
-                audio = MP3(song_path)
-                self.total_duration = audio.info.length
-            except:
-                self.total_duration = 0
-            name = os.path.basename(song_path)
-            self.label.config(text=f"Now Playing:\n{name}")
-            self.progress['value'] = 0
-            self.time_label.config(text="00:00 / " + self.format_time(self.total_duration))
+        return self.core.play_song(song_path)
 
     def play_previous(self):
-        # Play previous song
-        if self.current_index > 0:
-            self.current_index -= 1
-            self.play_song(self.playlist[self.current_index])
+        self.core.play_previous()
 
     def play_next(self):
-        # Play next song
-        if self.current_index < len(self.playlist) - 1:
-            self.current_index += 1
-            self.play_song(self.playlist[self.current_index])
+        self.core.play_next()
 
     def pause_resume(self):
-        # Pause or resume the song
-        if pygame.mixer.music.get_busy():
-            if self.is_paused:
-                pygame.mixer.music.unpause()
-                self.label.config(text=f"Resumed: {os.path.basename(self.current_song)}")
-            else:
-                pygame.mixer.music.pause()
-                self.label.config(text="Paused")
-            self.is_paused = not self.is_paused
+        self.core.pause_resume()
 
     def stop(self):
-        # Stop current playback
-        self.keep_playing = False
-        pygame.mixer.music.stop()
-        self.label.config(text="Stopped")
-        self.progress['value'] = 0
-        self.time_label.config(text="00:00 / 00:00")
+        self.core.stop()
 
     def set_volume(self, val):
         # Set the playback volume
-        volume = int(val) / 100
-        pygame.mixer.music.set_volume(volume)
+        self.core.set_volume(int(val) / 100)
 
     def update_progress(self):
         # Update progress bar and time label
         try:
-            pos = pygame.mixer.music.get_pos() / 1000
-            percent = (pos / self.total_duration) * 100 if self.total_duration else 0
-            self.progress['value'] = percent
+            pos = self.core.position()
+            self.show_progress(pos / self.total_duration if self.total_duration else 0)
             self.time_label.config(text=f"{self.format_time(pos)} / {self.format_time(self.total_duration)}")
         except:
-            self.progress['value'] = 0
+            self.show_progress(0)
+
+    def show_progress(self, fraction):
+        if self.waveforms is not None:
+            self.progress.set_fraction(fraction)
+        else:
+            self.progress['value'] = fraction * 100
+
+    def show_waveform(self, path):
+        # Draw the cached overview once the I/O executor has read it, so a slow
+        # disk does not stall the UI; songs not seen before are analyzed in the
+        # background and drawn when ready
+        if self.waveforms is None:
+            return
+        self.progress.set_peaks(None)
+        self.io.submit(self.waveforms.get, path, key="waveform",
+                       callback=lambda future: self._waveform_read(path, future))
+
+    def _waveform_read(self, path, future):
+        if path != self.current_song or future.exception() is not None:
+            return
+        peaks = future.result()
+        if peaks is None:
+            self.io.when_done(self.waveforms.request(path), lambda future: self._waveform_ready(path, future))
+        else:
+            self.progress.set_peaks(peaks)
+
+    def _waveform_ready(self, path, future):
+        if path == self.current_song and not future.cancelled() and future.exception() is None:
+            self.progress.set_peaks(future.result())
+
+    def seek_to(self, fraction):
+        # Jump to a point of the song clicked on the waveform
+        if self.total_duration:
+            self.core.seek(fraction * self.total_duration)
 
     def format_time(self, seconds):
         # Format seconds into MM:SS
@@ -213,12 +442,7 @@ class MusicPlayer:
             self.label.config(text="No songs selected.")
             return
 
-        for index in selected_indices:
-            if index < len(self.songs):
-                song_path = self.songs[index]
-                self.favorites.add(song_path)
-
-        self.update_song_list()
+        self.core.add_favorites(self.songs[index] for index in selected_indices if index < len(self.songs))
         self.label.config(text=f"{len(selected_indices)} songs added to favorites.")
 
     def save_favorites(self):
@@ -228,30 +452,93 @@ class MusicPlayer:
             return
         filepath = filedialog.asksaveasfilename(defaultextension=".fav", filetypes=[("Favorite List", "*.fav")])
         if filepath:
-            with open(filepath, 'w') as file:
-                for song in self.favorites:
-                    file.write(song + '\n')
+            self.core.save_favorites(filepath)
             self.label.config(text="Favorites saved.")
 
     def load_favorites(self):
         # Load favorite songs from a file
         filepath = filedialog.askopenfilename(filetypes=[("Favorite List", "*.fav")])
         if filepath:
-            with open(filepath, 'r') as file:
-                favs = set(line.strip() for line in file if os.path.exists(line.strip()))
-            self.favorites.update(favs)
-            self.update_song_list()
+            self.label.config(text="Loading favorites...")
+            self.io.when_done(self.core.read_favorites(filepath), self._favorites_loaded)
 
-            if self.favorites:
-                self.playlist = list(self.favorites)
-                self.current_index = 0
-                self.play_song(self.playlist[self.current_index])
-                self.label.config(text=f"{len(favs)} favorites loaded and playing.")
-            else:
-                self.label.config(text="No valid favorites found.")
+    def _favorites_loaded(self, future):
+        # An unreadable .fav file keeps the current favorites and their file
+        try:
+            result = future.result()
+        except (OSError, ValueError) as error:
+            self.label.config(text=f"Could not load favorites:\n{error}")
+            return
+        favs = self.core.finish_loading_favorites(result)
+        if self.core.play_favorites():
+            self.label.config(text=f"{len(favs)} favorites loaded and playing.")
+        else:
+            self.label.config(text="No valid favorites found.")
+
+    def load_playlist(self):
+        # Add the songs of an M3U/M3U8/PLS playlist and play it in order
+        filepath = filedialog.askopenfilename(filetypes=PLAYLIST_TYPES)
+        if filepath:
+            self.label.config(text="Loading playlist...")
+            self.io.when_done(self.core.read_playlist(filepath), self._playlist_loaded)
+
+    def _playlist_loaded(self, future):
+        # An unreadable playlist leaves the song list as it was
+        try:
+            result = future.result()
+        except (OSError, ValueError) as error:
+            self.label.config(text=f"Could not load the playlist:\n{error}")
+            return
+        songs, missing = self.core.finish_loading_playlist(result)
+        if self.core.play_playlist(songs):
+            text = f"{len(songs)} playlist songs loaded and playing."
+            self.label.config(text=text + (f"\n{missing} missing files skipped." if missing else ""))
+        else:
+            self.label.config(text="No valid songs in the playlist.")
+
+    def save_playlist(self):
+        # Save the current playlist, or the song list, as M3U8, M3U or PLS
+        songs = list(self.playlist or self.songs)
+        if not songs:
+            self.label.config(text="No songs to save.")
+            return
+        filepath = filedialog.asksaveasfilename(defaultextension=".m3u8", filetypes=PLAYLIST_TYPES)
+        if filepath:
+            self.io.submit(self.core.save_playlist, filepath, songs, callback=self._playlist_saved)
+
+    def _playlist_saved(self, future):
+        error = future.exception()
+        if error is None:
+            self.label.config(text="Playlist saved.")
+        else:
+            self.label.config(text=f"Could not save the playlist:\n{error}")
+
+    def show_stats(self):
+        # Open the live stats window, or bring it to the front
+        if self.stats_panel is not None and self.stats_panel.winfo_exists():
+            self.stats_panel.lift()
+        else:
+            self.stats_panel = StatsPanel(self.root, STATS)
 
 
 if __name__ == "__main__":
+    # The loudness analyzer starts worker processes, also from a frozen build
+    multiprocessing.freeze_support()
+    # Timers and counters on the hot paths, shown in a Stats window
+    if "--stats" in sys.argv or os.environ.get("MUSIC_PLAYER_STATS"):
+        STATS.enable()
+    # MUSIC_PLAYER_CACHE_MB sets the memory for decoded songs; off unless set
+    cache_mb = int(os.environ.get("MUSIC_PLAYER_CACHE_MB", "0"))
+    dsp = "--dsp" in sys.argv or bool(os.environ.get("MUSIC_PLAYER_DSP"))
+    analyze = "--no-analyze" not in sys.argv and os.environ.get("MUSIC_PLAYER_ANALYZE", "1") != "0"
+    if "--daemon" in sys.argv:
+        # No window: the player is controlled through the control socket only
+        decoded = DecodedAudioCache(cache_mb * 1024 * 1024) if cache_mb else None
+        core = PlayerCore(io=IOExecutor(), decoded_cache=decoded, dsp=DSPEngine() if dsp else None)
+        sys.exit(run_daemon(core))
     root = tk.Tk()
-    player = MusicPlayer(root)
+    # Follow files added, removed and renamed in the song folders; --control
+    # also takes commands on the control socket
+    player = MusicPlayer(root, watch="--watch" in sys.argv or bool(os.environ.get("MUSIC_PLAYER_WATCH")),
+                         cache_mb=cache_mb, dsp=dsp, control="--control" in sys.argv, analyze=analyze)
     root.mainloop()
@@ -181,9 +181,9 @@ class MusicPlayer:
 
     def play_random(self):
         if self.songs:
-            random_song = random.choice(self.songs)
+            self.current_index = random.randrange(len(self.songs))
+            random_song = self.songs[self.current_index]
             self.current_song = random_song
-            self.current_index = self.songs.index(random_song)
             pygame.mixer.music.load(random_song)
             pygame.mixer.music.play()
             self.update_status(f"Playing random: {os.path.basename(random_song)}")
@@ -0,0 +1,55 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Fast-start build: a folder (onedir) instead of a single file, so nothing is
+# unpacked to a temp directory on launch, and no UPX, so the DLLs and .pyd
+# files are not decompressed on every start. fast_start.py draws the window
+# before importing the player.
+#
+#   pyinstaller spotify_fast.spec
+#   dist\spotify_fast\spotify_fast.exe --measure-startup
+#
+# The build has no console, so --measure-startup appends its JSON line to
+# %APPDATA%\SimpleMusicPlayer\startup_times.jsonl instead of printing it.
+
+
+a = Analysis(
+    ['fast_start.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[],
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='spotify_fast',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+    icon=['music.ico'],
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='spotify_fast',
+)
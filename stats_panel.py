@@ -0,0 +1,65 @@
+import tkinter as tk
+from tkinter import filedialog
+
+
+def format_stats(snapshot):
+    # Text table of a Stats.snapshot(): timers with recent percentiles, then
+    # counters, gauges and live threads
+    lines = [f"{'timer':28}{'count':>8}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}"]
+    for name, timing in sorted(snapshot["timings"].items()):
+        lines.append(f"{name:28}{timing['count']:>8}{timing['recent_p50'] * 1000:>9.1f}"
+                     f"{timing['recent_p95'] * 1000:>9.1f}{timing['max'] * 1000:>9.1f}")
+    if snapshot["counters"]:
+        lines.append("")
+        lines.extend(f"{name:28}{value:>8}" for name, value in sorted(snapshot["counters"].items()))
+    if snapshot["gauges"]:
+        lines.append("")
+        lines.extend(f"{name:28}{value:>8}" for name, value in sorted(snapshot["gauges"].items()))
+    if snapshot["threads"]:
+        lines.append("")
+        lines.append("live threads")
+        lines.extend(f"  {name:26}{count:>8}" for name, count in sorted(snapshot["threads"].items()))
+    return "\n".join(lines)
+
+
+class StatsPanel(tk.Toplevel):
+    # Window showing the live numbers of a Stats instance, redrawn every
+    # refresh_ms while it is open, with buttons to save a JSON or trace dump
+
+    def __init__(self, parent, stats, refresh_ms=1000):
+        super().__init__(parent, bg="#808080")
+        self.title("Player Stats")
+        self.stats = stats
+        self.refresh_ms = refresh_ms
+        self.text = tk.Text(self, width=62, height=30, bg="#333", fg="#fff", font=("Courier", 10))
+        self.text.pack(padx=10, pady=(10, 5), fill=tk.BOTH, expand=True)
+        buttons = tk.Frame(self, bg="#808080")
+        buttons.pack(pady=(0, 10))
+        for text, command in (("Save JSON", self.save_json), ("Save Chrome Trace", self.save_trace),
+                              ("Reset", self.stats.reset)):
+            tk.Button(buttons, text=text, command=command, bg="#333", fg="#fff").pack(side=tk.LEFT, padx=5)
+        self.job = None
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.refresh()
+
+    def refresh(self):
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", format_stats(self.stats.snapshot()))
+        self.job = self.after(self.refresh_ms, self.refresh)
+
+    def save_json(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if path:
+            self.stats.dump_json(path)
+
+    def save_trace(self):
+        path = filedialog.asksaveasfilename(parent=self, defaultextension=".json",
+                                            filetypes=[("Chrome trace", "*.json")])
+        if path:
+            self.stats.dump_chrome_trace(path)
+
+    def close(self):
+        if self.job is not None:
+            self.after_cancel(self.job)
+            self.job = None
+        self.destroy()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+import wave
+from io import BytesIO
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import pygame
+
+from audio_cache import DecodedAudioCache, decode_to_wav
+from library import LibraryIndex
+from test_player_core import write_mp3, write_silence
+
+
+class TestDecodedAudioCache(unittest.TestCase):
+    def setUp(self):
+        """Create a library over a few short songs."""
+        pygame.mixer.init()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.library = LibraryIndex(os.path.join(self.tmp.name, "library.db"))
+        self.tracks = []
+        for name in ["a.wav", "b.wav", "c.wav", "d.wav", "e.wav"]:
+            path = os.path.join(self.tmp.name, name)
+            write_silence(path, 0.5)
+            self.tracks.append(self.library.get(path))
+
+    def tearDown(self):
+        self.library.close()
+        self.tmp.cleanup()
+
+    def test_hits_and_misses(self):
+        """Test that get() counts misses until a track is decoded and hits after."""
+        cache = DecodedAudioCache()
+        self.assertIsNone(cache.get(self.tracks[0]))
+        cache.request(self.tracks[0]).result()
+        self.assertIn(self.tracks[0], cache)
+        data = cache.get(self.tracks[0])
+        with open(self.tracks[0].path, "rb") as f:
+            self.assertEqual(data, f.read())
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertIsNone(cache.request(self.tracks[0]))
+        cache.shutdown()
+
+    def test_evicts_least_recently_used(self):
+        """Test that the cache stays under its byte budget, dropping the oldest song first."""
+        size = self.tracks[0].size
+        cache = DecodedAudioCache(max_bytes=4 * size + 100)
+        for track in self.tracks[:4]:
+            cache.load(track)
+        cache.get(self.tracks[0])
+        cache.load(self.tracks[4])
+        self.assertIn(self.tracks[0], cache)
+        self.assertNotIn(self.tracks[1], cache)
+        self.assertIn(self.tracks[4], cache)
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+        cache.shutdown()
+
+    def test_skips_songs_over_budget(self):
+        """Test that songs taking more than a quarter of the budget are not requested or kept."""
+        cache = DecodedAudioCache(max_bytes=self.tracks[0].size)
+        self.assertIsNone(cache.request(self.tracks[0], expected_size=self.tracks[0].size))
+        cache.load(self.tracks[0])
+        self.assertNotIn(self.tracks[0], cache)
+        cache.shutdown()
+
+    def test_decodes_compressed_songs(self):
+        """Test that an MP3 is decoded to a WAV image in the mixer's format."""
+        path = os.path.join(self.tmp.name, "song.mp3")
+        write_mp3(path, 100)
+        with wave.open(BytesIO(decode_to_wav(path)), "rb") as w:
+            rate, _, channels = pygame.mixer.get_init()
+            self.assertEqual((w.getframerate(), w.getnchannels(), w.getsampwidth()), (rate, channels, 2))
+            self.assertAlmostEqual(w.getnframes() / rate, 100 * 1152 / 44100, delta=0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import tempfile
+import unittest
+
+from benchmark import compare, make_favorites_file, make_library
+from probe import probe_audio
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_compare_flags_slow_and_unbaselined_cases(self):
+        """Test that clear slowdowns and cases missing from the baseline fail."""
+        baseline = {"cases": {"fast": {"seconds": 0.001, "median": 0.002}, "slow": {"seconds": 0.1, "median": 0.1},
+                              "noisy": {"seconds": 0.1, "median": 0.1}, "gone": {"seconds": 1.0, "median": 1.0}}}
+        results = {"fast": {"seconds": 0.005, "median": 0.006}, "slow": {"seconds": 0.3, "median": 0.3},
+                   "noisy": {"seconds": 0.1, "median": 0.2}, "new": {"seconds": 5.0, "median": 5.0}}
+        self.assertEqual(compare(results, baseline), [("slow", 0.1, 0.3), ("new", None, 5.0)])
+        self.assertEqual(compare(results, baseline, tolerance=2.0), [("new", None, 5.0)])
+        del results["new"]
+        self.assertEqual(compare(results, baseline, tolerance=2.0), [])
+
+    def test_synthetic_library(self):
+        """Test that generated songs are valid and the favorites file has stale entries."""
+        with tempfile.TemporaryDirectory() as tmp:
+            songs = make_library(os.path.join(tmp, "music"), 4)
+            self.assertEqual([os.path.splitext(song)[1] for song in songs], [".wav", ".mp3", ".wav", ".mp3"])
+            for song in songs:
+                self.assertGreater(probe_audio(song).duration, 0)
+            fav_file = os.path.join(tmp, "a.fav")
+            make_favorites_file(fav_file, songs, 10)
+            with open(fav_file, encoding="utf-8") as f:
+                lines = f.read().splitlines()
+            self.assertEqual(lines[:4], songs)
+            self.assertEqual(len(lines), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+from control import ControlClient, ControlServer
+from io_executor import IOExecutor
+from library import LibraryIndex
+from player_core import PlayerCore
+from seek_table import SeekTableCache
+from test_player_core import write_silence
+
+
+class TestControlServer(unittest.TestCase):
+    def setUp(self):
+        """Create a headless core served on a socket in a temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.songs = []
+        for name in ["abba.wav", "beatles.wav", "cream.wav"]:
+            path = os.path.join(self.tmp.name, name)
+            write_silence(path, 2)
+            self.songs.append(path)
+        self.library = LibraryIndex(os.path.join(self.tmp.name, "library.db"))
+        self.core = PlayerCore(self.library, seek_tables=SeekTableCache(os.path.join(self.tmp.name, "tables")),
+                               io=IOExecutor())
+        self.core.set_songs(self.songs)
+        self.path = os.path.join(self.tmp.name, "control.sock")
+        self.server = ControlServer(self.core, self.path)
+        self.server.start()
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.client = ControlClient(self.path)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.running = False
+        self.server.wake()
+        self.thread.join()
+        self.server.close()
+        self.core.close()
+        self.tmp.cleanup()
+
+    def wait_for_event(self, name, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            event = self.client.next_event()
+            if event["event"] == name:
+                return event
+        return None
+
+    def test_status_and_volume(self):
+        """Test that commands answer on the same line protocol and echo request ids."""
+        self.assertEqual(self.client.call("status")["songs"], 3)
+        self.assertEqual(self.client.call("volume", value=0.25), 0.25)
+        self.assertEqual(self.client.call("volume"), 0.25)
+        self.client.sock.sendall(b'{"id":7,"cmd":"status"}\n')
+        reply = self.client.read()
+        self.assertEqual((reply["id"], reply["ok"]), (7, True))
+
+    def test_errors_keep_the_connection(self):
+        """Test that bad requests get an error reply and later commands still work."""
+        self.client.sock.sendall(b"not json\n[1]\n")
+        self.assertFalse(self.client.read()["ok"])
+        self.assertFalse(self.client.read()["ok"])
+        with self.assertRaises(RuntimeError):
+            self.client.call("fly")
+        with self.assertRaises(RuntimeError):
+            self.client.call("volume", loudness=3)
+        self.assertEqual(self.client.call("status")["songs"], 3)
+
+    def test_play_queue_and_events(self):
+        """Test that subscribers see the songs started by play, queue and next."""
+        self.assertTrue(self.client.call("subscribe"))
+        self.assertTrue(self.client.call("play", index=0))
+        self.assertEqual(self.wait_for_event("track")["path"], self.songs[0])
+        self.assertEqual(self.client.call("queue", path=self.songs[2]), 1)
+        self.assertEqual(self.wait_for_event("queued")["paths"], [self.songs[2]])
+        self.assertTrue(self.client.call("next"))
+        self.assertEqual(self.wait_for_event("track")["path"], self.songs[2])
+        self.assertEqual(self.client.call("status")["up_next"], 0)
+        self.assertTrue(self.client.call("pause"))
+        self.assertEqual(self.wait_for_event("paused")["path"], self.songs[2])
+
+    def test_search(self):
+        """Test that search returns matching songs with their list positions."""
+        deadline = time.time() + 5
+        while len(self.core.search_index) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.client.call("search", query="beat"), [{"index": 1, "path": self.songs[1]}])
+
+    def test_commands_are_fast(self):
+        """Test that a command round trip stays well under a millisecond on average."""
+        for _ in range(20):
+            self.client.call("status")
+        start = time.perf_counter()
+        for _ in range(500):
+            self.client.call("status")
+        self.assertLess((time.perf_counter() - start) / 500, 0.001)
+
+    def test_file_commands_are_refused(self):
+        """Test that commands writing or reading files by name are not run for clients."""
+        target = os.path.join(self.tmp.name, "out.m3u")
+        for command in ("save_playlist", "save_favorites", "load_playlist", "load_favorites"):
+            with self.assertRaises(RuntimeError):
+                self.client.call(command, filepath=target)
+        self.assertFalse(os.path.exists(target))
+        self.client.call("set_volume", volume=0.5)
+        self.assertEqual(self.client.call("volume"), 0.5)
+
+    def test_socket_is_owner_only(self):
+        """Test that the socket file is created without group or other access."""
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_one_server_per_socket(self):
+        """Test that a live socket is not taken over and a stale one is replaced."""
+        with self.assertRaises(OSError):
+            ControlServer(self.core, self.path).start()
+        stale = os.path.join(self.tmp.name, "stale.sock")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(stale)
+        sock.close()
+        server = ControlServer(self.core, stale)
+        server.start()
+        server.close()
+        self.assertFalse(os.path.exists(stale))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+import os
+import tempfile
+import time
+import unittest
+import wave
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+from dsp import ArraySource, DSPEngine, Equalizer, Pipeline, open_source, to_pcm
+from test_player_core import write_silence
+
+RATE = 44100
+
+
+def constant(path, seconds, value=0.5):
+    # Source of a constant signal, easy to follow through the pipeline
+    return ArraySource(path, np.full((int(RATE * seconds), 2), value, dtype=np.float32), RATE)
+
+
+def sine(freq, seconds=1.0):
+    t = np.arange(int(RATE * seconds)) / RATE
+    samples = (0.25 * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+    return np.stack((samples, samples), axis=1)
+
+
+class TestPipeline(unittest.TestCase):
+    def render(self, pipeline):
+        tags, blocks = [], []
+        item = pipeline.next_block()
+        while item is not None:
+            tags.append(item[0])
+            blocks.append(item[1])
+            item = pipeline.next_block()
+        return tags, np.concatenate(blocks)
+
+    def test_crossfade_keeps_power(self):
+        """Test that consecutive songs overlap by the crossfade with equal power."""
+        pipeline = Pipeline(RATE, 2, block_frames=1024, crossfade=0.5)
+        pipeline.start(constant("a", 2.0))
+        pipeline.queue(constant("b", 2.0))
+        tags, out = self.render(pipeline)
+        self.assertAlmostEqual(len(out) / RATE, 3.5, delta=2 * 1024 / RATE)
+        self.assertEqual(tags[0], ("a", 0.0))
+        switch = [tag[0] for tag in tags].index("b")
+        self.assertAlmostEqual(switch * 1024 / RATE, 1.5, delta=1024 / RATE)
+        self.assertEqual(tags[switch][1], 0.0)
+        fade = out[switch * 1024:int(2.0 * RATE), 0]
+        # Equal-power fade of identical signals peaks at sqrt(2) in the middle
+        self.assertAlmostEqual(float(fade.max()), 0.5 * np.sqrt(2), places=3)
+        self.assertAlmostEqual(float(out[int(2.5 * RATE), 0]), 0.5, places=5)
+
+    def test_songs_join_without_crossfade(self):
+        """Test that a song queued too late to fade follows without a gap and the end is padded."""
+        pipeline = Pipeline(RATE, 2, block_frames=1000, crossfade=0.0)
+        pipeline.start(constant("a", 0.05))
+        pipeline.queue(constant("b", 0.05, value=0.25))
+        _, out = self.render(pipeline)
+        self.assertEqual(len(out), 5000)
+        self.assertTrue(np.all(out[:int(0.05 * RATE), 0] == 0.5))
+        self.assertTrue(np.all(out[int(0.05 * RATE):int(0.1 * RATE), 0] == 0.25))
+        self.assertTrue(np.all(out[int(0.1 * RATE):] == 0))
+
+    def test_seek(self):
+        """Test that seeking the incoming song ends the crossfade and moves it."""
+        pipeline = Pipeline(RATE, 2, block_frames=1024, crossfade=1.0)
+        pipeline.start(constant("a", 1.0))
+        pipeline.queue(constant("b", 3.0))
+        tag, _ = pipeline.next_block()
+        self.assertEqual(tag[0], "b")
+        self.assertFalse(pipeline.seek("c", 1.0))
+        self.assertTrue(pipeline.seek("b", 2.0))
+        self.assertIsNone(pipeline.next)
+        self.assertEqual(pipeline.next_block()[0], ("b", 2.0))
+
+    def test_equalizer_bands(self):
+        """Test that a band gain boosts its frequency and leaves far ones alone."""
+        eq = Equalizer(RATE, 2)
+        signal = sine(1000)
+        self.assertIs(eq.process(signal), signal)
+        gains = [0] * 10
+        gains[4] = 12
+        eq.set_gains(gains)
+        for freq, expected in ((1000, 12.0), (60, 0.0)):
+            eq.reset()
+            signal = sine(freq)
+            out = np.concatenate([eq.process(signal[start:start + 4096]) for start in range(0, len(signal), 4096)])
+            level = 20 * np.log10(np.abs(out[RATE // 2:]).max() / 0.25)
+            self.assertAlmostEqual(level, expected, delta=1.0)
+        with self.assertRaises(ValueError):
+            eq.set_gains([0, 1])
+
+    def test_volume_ramp(self):
+        """Test that the volume stage ramps between blocks and clips to 16 bits."""
+        block = np.ones((100, 2), dtype=np.float32)
+        pcm = np.frombuffer(to_pcm(block, 1.0, 0.0, -16), dtype="<i2").reshape(-1, 2)
+        self.assertEqual(pcm[0, 0], 0)
+        self.assertEqual(pcm[-1, 0], 32767)
+        self.assertTrue(np.all(np.diff(pcm[:, 0].astype(int)) >= 0))
+
+
+class TestDSPEngine(unittest.TestCase):
+    def setUp(self):
+        """Create an engine on the dummy audio driver and a few short songs."""
+        pygame.mixer.init()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.songs = []
+        for name in ["a.wav", "b.wav"]:
+            path = os.path.join(self.tmp.name, name)
+            write_silence(path, 0.5)
+            self.songs.append(path)
+        self.engine = DSPEngine(block_frames=2048, crossfade=0.2)
+
+    def tearDown(self):
+        self.engine.close()
+        self.tmp.cleanup()
+
+    def wait_for(self, event, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            for item in self.engine.take_events():
+                if item[0] == event:
+                    return item
+            time.sleep(0.01)
+        return None
+
+    def test_plays_and_advances(self):
+        """Test that the engine plays a song, crossfades into the queued one and reports the end."""
+        self.engine.play(self.songs[0])
+        self.engine.queue(self.songs[1])
+        self.assertTrue(self.engine.is_busy())
+        self.assertEqual(self.wait_for("advanced"), ("advanced", self.songs[1]))
+        self.assertEqual(self.wait_for("ended"), ("ended", self.songs[1]))
+        self.assertFalse(self.engine.is_busy())
+
+    def test_pause_and_seek(self):
+        """Test that pausing holds the position and seeking moves it."""
+        self.engine.play(self.songs[0])
+        time.sleep(0.2)
+        self.engine.pause()
+        position = self.engine.position()
+        time.sleep(0.1)
+        self.assertEqual(self.engine.position(), position)
+        self.assertTrue(self.engine.seek(self.songs[0], 0.4))
+        self.assertGreaterEqual(self.engine.position(), 0.4)
+        self.engine.resume()
+        self.assertEqual(self.wait_for("ended"), ("ended", self.songs[0]))
+
+    def test_missing_song_ends(self):
+        """Test that a song that cannot be opened is reported as ended."""
+        missing = os.path.join(self.tmp.name, "missing.mp3")
+        self.engine.play(missing)
+        self.assertEqual(self.wait_for("ended"), ("ended", missing))
+
+    def test_open_source_converts_format(self):
+        """Test that songs not in the mixer's format are decoded to it."""
+        rate, _, channels = pygame.mixer.get_init()
+        source = open_source(self.songs[0], rate, channels)
+        self.assertEqual(source.read(10).shape, (10, channels))
+        mono = os.path.join(self.tmp.name, "mono.wav")
+        with wave.open(mono, "wb") as w:
+            w.setnchannels(1)
+            w.setsampwidth(2)
+            w.setframerate(22050)
+            w.writeframes(b"\0" * 22050 * 2)
+        source = open_source(mono, rate, channels)
+        self.assertAlmostEqual(source.frames / rate, 1.0, delta=0.01)
+        self.assertEqual(source.read(10).shape, (10, channels))
+
+
+if __name__ == "__main__":
+    unittest.main()
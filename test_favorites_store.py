@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+
+from favorites_store import FavoritesStore, load_in_background, validate_paths
+
+
+class TestFavoritesStore(unittest.TestCase):
+    def setUp(self):
+        """Use a temporary folder for favorites files."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "list.fav")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_changes_are_appended_to_log(self):
+        """Test that a change appends to the log instead of rewriting the file."""
+        store = FavoritesStore(self.path, debounce=60)
+        store.replace_all(["a.mp3", "b.mp3"])
+        store.add("c.mp3")
+        store.remove("a.mp3")
+        store.flush()
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "a.mp3\nb.mp3\n")
+        with open(self.path + ".log") as f:
+            self.assertEqual(f.read(), "+\tc.mp3\n-\ta.mp3\n")
+        self.assertEqual(list(FavoritesStore(self.path)), ["b.mp3", "c.mp3"])
+
+    def test_close_compacts(self):
+        """Test that closing folds the log into the snapshot."""
+        store = FavoritesStore(self.path, debounce=60)
+        store.add("a.mp3")
+        store.close()
+        self.assertFalse(os.path.exists(self.path + ".log"))
+        with open(self.path) as f:
+            self.assertEqual(f.read(), "a.mp3\n")
+
+    def test_log_compacts_when_long(self):
+        """Test that a long log is compacted automatically."""
+        store = FavoritesStore(self.path, debounce=60, min_compact=10)
+        for i in range(6):
+            store.toggle("a.mp3")
+            store.toggle("b.mp3")
+        store.flush()
+        self.assertFalse(os.path.exists(self.path + ".log"))
+        self.assertEqual(len(FavoritesStore(self.path)), 0)
+
+    def test_torn_log_line_is_ignored(self):
+        """Test that a half-written last log line is skipped."""
+        with open(self.path + ".log", "w") as f:
+            f.write("+\ta.mp3\n+\tb.m")
+        store = FavoritesStore(self.path, debounce=60)
+        self.assertEqual(list(store), ["a.mp3"])
+        store.add("c.mp3")
+        store.flush()
+        with open(self.path + ".log") as f:
+            self.assertEqual(f.read(), "+\ta.mp3\n+\tc.mp3\n")
+        self.assertEqual(list(FavoritesStore(self.path)), ["a.mp3", "c.mp3"])
+
+    def test_json_format(self):
+        """Test the JSON list format used by MyFlix."""
+        path = os.path.join(self.tmp.name, "favorites.json")
+        with open(path, "w") as f:
+            json.dump(["Movie 1"], f)
+        store = FavoritesStore(path, fmt="json", debounce=60)
+        self.assertTrue(store.toggle("Movie 2"))
+        store.close()
+        with open(path) as f:
+            self.assertEqual(json.load(f), ["Movie 1", "Movie 2"])
+
+    def test_validate_in_background(self):
+        """Test that missing files are dropped when loading."""
+        song = os.path.join(self.tmp.name, "song.mp3")
+        open(song, "w").close()
+        missing = [os.path.join(self.tmp.name, f"gone{i}.mp3") for i in range(600)]
+        with open(self.path, "w") as f:
+            f.write("\n".join(missing + [song]) + "\n")
+        store, existing = load_in_background(self.path).result()
+        self.assertEqual(existing, [song])
+        self.assertEqual(len(store), 601)
+        self.assertEqual(validate_paths([song, missing[0]]), [song])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from fake_tk import FakeRoot
+from importer import FolderImporter, iter_audio_files
+from library import LibraryIndex
+
+
+class TestFolderImport(unittest.TestCase):
+    def setUp(self):
+        """Build a small folder tree with audio and non-audio files."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.music = os.path.join(self.tmp.name, "music")
+        for rel in ["a.mp3", "notes.txt", "sub/b.wav", "sub/deeper/c.OGG", "z/d.mp3"]:
+            path = os.path.join(self.music, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(b"\0")
+        self.library = LibraryIndex(os.path.join(self.tmp.name, "library.db"))
+
+    def tearDown(self):
+        self.library.close()
+        self.tmp.cleanup()
+
+    def test_iter_audio_files(self):
+        """Test that the walk finds audio files in every subfolder."""
+        names = [os.path.relpath(p, self.music).replace(os.sep, "/") for p in iter_audio_files(self.music)]
+        self.assertEqual(names, ["a.mp3", "sub/b.wav", "sub/deeper/c.OGG", "z/d.mp3"])
+
+    def test_import_streams_batches(self):
+        """Test that probed files arrive on the UI side in batches."""
+        root = FakeRoot()
+        batches = []
+        done = []
+        importer = FolderImporter(root, self.library, on_batch=batches.append,
+                                  on_done=done.append, chunk_size=2)
+        with patch("library.probe_metadata", return_value=(1, None, None, None, None, None)):
+            importer.start(self.music)
+            deadline = time.time() + 5
+            while not done and time.time() < deadline:
+                root.run_pending()
+                time.sleep(0.01)
+        self.assertEqual(done, [False])
+        imported = [path for batch in batches for path in batch]
+        self.assertEqual(len(imported), 4)
+        self.assertEqual(importer.found, 4)
+        self.assertEqual(self.library.duration(imported[0]), 1)
+
+    def test_cancel(self):
+        """Test that a cancelled import reports cancellation."""
+        root = FakeRoot()
+        done = []
+        importer = FolderImporter(root, self.library, on_batch=lambda batch: None, on_done=done.append)
+        importer.cancel()
+        importer.start(self.music)
+        deadline = time.time() + 5
+        while not done and time.time() < deadline:
+            root.run_pending()
+            time.sleep(0.01)
+        self.assertEqual(done, [True])
+
+
+if __name__ == "__main__":
+    unittest.main()
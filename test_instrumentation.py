@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from fake_tk import FakeRoot
+from instrumentation import NO_TIMER, StallMonitor, Stats, _thread_group
+from stats_panel import format_stats
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self):
+        """Create a fresh stats collector."""
+        self.stats = Stats(window=4)
+
+    def test_disabled_records_nothing(self):
+        """Test that a disabled collector hands out the shared no-op timer."""
+        self.assertIs(self.stats.timer("mixer.load"), NO_TIMER)
+        with self.stats.timer("mixer.load"):
+            pass
+        self.stats.count("favorites.validated", 10)
+        self.stats.sample_threads()
+        self.assertEqual(self.stats.snapshot()["timings"], {})
+        self.assertEqual(self.stats.snapshot()["counters"], {})
+        self.assertEqual(len(self.stats.trace), 0)
+
+    def test_timer_totals_and_window(self):
+        """Test that timers keep totals and a rolling window of recent durations."""
+        self.stats.enable()
+        for seconds in (0.5, 0.1, 0.2, 0.3, 0.4, 0.1):
+            self.stats.add_timing("library.probe", 0.0, seconds)
+        with self.stats.timer("mixer.load", path="a.mp3"):
+            pass
+        self.stats.count("ui.stalls")
+        self.stats.count("ui.stalls", 2)
+        snapshot = self.stats.snapshot()
+        probe = snapshot["timings"]["library.probe"]
+        self.assertEqual(probe["count"], 6)
+        self.assertAlmostEqual(probe["total"], 1.6)
+        self.assertEqual(probe["max"], 0.5)
+        self.assertEqual(probe["recent_max"], 0.4)
+        self.assertEqual(snapshot["timings"]["mixer.load"]["count"], 1)
+        self.assertEqual(snapshot["counters"], {"ui.stalls": 3})
+        self.assertIn("library.probe", format_stats(snapshot))
+
+    def test_chrome_trace(self):
+        """Test that timed blocks are exported as complete trace events."""
+        self.stats.enable()
+        with self.stats.timer("mixer.load", path="a.mp3"):
+            pass
+        self.stats.add_timing("ui.heartbeat_delay", 0.0, 0.01, trace=False)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            self.stats.dump_chrome_trace(path)
+            with open(path, encoding="utf-8") as f:
+                trace = json.load(f)
+        events = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["name"], "mixer.load")
+        self.assertEqual(events[0]["args"], {"path": "a.mp3"})
+        self.assertEqual(events[0]["tid"], threading.get_ident())
+        self.assertTrue(any(event["ph"] == "M" for event in trace["traceEvents"]))
+
+    def test_thread_groups(self):
+        """Test that pool and plain thread names are grouped."""
+        self.assertEqual(_thread_group("waveform_3"), "waveform")
+        self.assertEqual(_thread_group("Thread-12 (add_many)"), "Thread (add_many)")
+        self.assertEqual(_thread_group("MainThread"), "MainThread")
+        self.stats.enable()
+        self.stats.sample_threads()
+        self.assertEqual(self.stats.snapshot()["gauges"]["threads"], threading.active_count())
+
+    def test_stall_monitor(self):
+        """Test that a late heartbeat is recorded as a UI stall."""
+        self.stats.enable()
+        root = FakeRoot()
+        monitor = StallMonitor(root, self.stats, interval_ms=100, stall_ms=100, thread_every=1)
+        monitor.start()
+        monitor.expected -= 0.5  # fired 0.4 s late
+        root.jobs[-1]()
+        snapshot = self.stats.snapshot()
+        self.assertGreaterEqual(snapshot["timings"]["ui.heartbeat_delay"]["max"], 0.4)
+        self.assertEqual(snapshot["counters"], {"ui.stalls": 1})
+        self.assertIn("threads", snapshot["gauges"])
+        monitor.stop()
+        self.assertIsNone(root.jobs[-1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import threading
+import unittest
+
+from fake_tk import FakeRoot
+from io_executor import IOExecutor
+
+
+class TestIOExecutor(unittest.TestCase):
+    def setUp(self):
+        """Create an executor attached to a fake Tk root."""
+        self.root = FakeRoot()
+        self.io = IOExecutor(max_workers=1)
+        self.io.attach(self.root)
+
+    def tearDown(self):
+        self.io.shutdown()
+
+    def test_callbacks_run_in_one_batch(self):
+        """Test that finished futures are handed back through a single after job."""
+        results = []
+        futures = [self.io.submit(pow, 2, i, callback=lambda future: results.append(future.result()))
+                   for i in range(5)]
+        self.assertEqual(len(self.root.jobs), 1)
+        for future in futures:
+            future.result()
+        self.assertEqual(results, [])
+        self.root.run_pending()
+        self.assertEqual(results, [1, 2, 4, 8, 16])
+        self.assertEqual(self.root.jobs, [])
+
+    def test_newer_work_replaces_older(self):
+        """Test that only the last submission under a key reports back."""
+        gate = threading.Event()
+        results = []
+        self.io.submit(gate.wait, key="block")
+        futures = [self.io.submit(str, i, key="song", callback=lambda future: results.append(future.result()))
+                   for i in range(3)]
+        self.assertTrue(futures[0].cancelled())
+        self.assertTrue(futures[1].cancelled())
+        gate.set()
+        futures[2].result()
+        self.root.run_pending()
+        self.assertEqual(results, ["2"])
+
+    def test_cancel_drops_callback(self):
+        """Test that cancelled work never calls back, even if it already ran."""
+        results = []
+        future = self.io.submit(str, 1, key="song", callback=results.append)
+        future.result()
+        self.io.cancel("song")
+        self.root.run_pending()
+        self.assertEqual(results, [])
+        self.assertEqual(self.io.outstanding, 0)
+
+    def test_when_done_for_other_futures(self):
+        """Test that futures from other executors are dispatched too."""
+        results = []
+        other = IOExecutor()
+        self.io.when_done(other.submit(len, "abc"), lambda future: results.append(future.result()))
+        other.pool.shutdown(wait=True)
+        self.root.run_pending()
+        self.assertEqual(results, [3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from library import LibraryIndex
+from test_player_core import write_silence
+
+
+class TestLibraryIndex(unittest.TestCase):
+    def setUp(self):
+        """Create a library index in a temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "library.db")
+        self.library = LibraryIndex(self.db_path)
+        self.song = os.path.join(self.tmp.name, "song1.mp3")
+        with open(self.song, "wb") as f:
+            f.write(b"\0" * 128)
+
+    def tearDown(self):
+        self.library.close()
+        self.tmp.cleanup()
+
+    def test_probe_only_when_file_changes(self):
+        """Test that metadata is re-read only after size or mtime change."""
+        with patch("library.probe_metadata", return_value=(120, "T", "A", "B", 44100, 2)) as mock_probe:
+            self.assertEqual(self.library.duration(self.song), 120)
+            self.assertEqual(self.library.duration(self.song), 120)
+            self.assertEqual(mock_probe.call_count, 1)
+            with open(self.song, "ab") as f:
+                f.write(b"\0")
+            self.library.get(self.song)
+            self.assertEqual(mock_probe.call_count, 2)
+
+    def test_missing_file(self):
+        """Test that a missing file returns no track."""
+        self.assertIsNone(self.library.get(os.path.join(self.tmp.name, "missing.mp3")))
+
+    def test_state_survives_reopen(self):
+        """Test that the song list, metadata and favorites persist."""
+        with patch("library.probe_metadata", return_value=(90, None, None, None, None, None)):
+            self.library.set_songs([self.song, "other.mp3"])
+            self.library.get(self.song)
+        self.library.set_favorite([self.song])
+        self.library.close()
+
+        self.library = LibraryIndex(self.db_path)
+        self.assertEqual(self.library.load(), [self.song, "other.mp3"])
+        self.assertEqual(self.library.favorites(), {self.song})
+        with patch("library.probe_metadata") as mock_probe:
+            self.assertEqual(self.library.duration(self.song), 90)
+            mock_probe.assert_not_called()
+
+    def test_stream_info_is_stored(self):
+        """Test that probed rate and channels are kept in the index."""
+        song = os.path.join(self.tmp.name, "song2.wav")
+        write_silence(song, 1)
+        track = self.library.get(song)
+        self.assertEqual((track.duration, track.rate, track.channels), (1.0, 44100, 2))
+        self.library.close()
+        self.library = LibraryIndex(self.db_path)
+        self.library.load()
+        self.assertEqual(self.library.tracks[song].rate, 44100)
+
+    def test_snapshot_restores_list(self):
+        """Test that a fast load takes the song list from the snapshot."""
+        with patch("library.probe_metadata", return_value=(90, "T", None, None, None, None)):
+            self.library.set_songs([self.song, "other.mp3"])
+            self.library.get(self.song)
+        self.library.set_favorite([self.song])
+        self.library.close([self.song, "other.mp3"], {self.song})
+
+        self.library = LibraryIndex(self.db_path)
+        with patch.object(LibraryIndex, "load", wraps=self.library.load) as mock_load:
+            self.assertEqual(self.library.load_fast(), ([self.song, "other.mp3"], {self.song}))
+            self.library.wait_loaded()
+            self.assertEqual(self.library.tracks[self.song].title, "T")
+            mock_load.assert_called_once()
+
+    def test_stale_snapshot_is_ignored(self):
+        """Test that a snapshot is not used after the database changed."""
+        self.library.set_songs([self.song])
+        self.library.close([self.song], set())
+        self.library = LibraryIndex(self.db_path)
+        self.library.set_songs(["other.mp3"])
+        self.library.close()
+
+        self.library = LibraryIndex(self.db_path)
+        self.assertIsNone(self.library.read_snapshot())
+        self.assertEqual(self.library.load_fast(), (["other.mp3"], set()))
+
+    def test_bad_snapshot_is_a_miss(self):
+        """Test that a damaged, foreign or old snapshot is ignored rather than loaded."""
+        self.library.set_songs([self.song])
+        self.library.close([self.song], set())
+        self.library = LibraryIndex(self.db_path)
+        self.assertEqual(self.library.read_snapshot(), ([self.song], set()))
+        source = list(self.library.db_state)
+        bad = [b"\x80\x04\x95", b"{\"source\": 1", b"[1, 2]",
+               json.dumps({"source": [1] + source[1:], "songs": [self.song], "favorites": []}).encode(),
+               json.dumps({"source": source, "songs": [1], "favorites": []}).encode(),
+               json.dumps({"source": source, "songs": [self.song], "favorites": {}}).encode()]
+        for data in bad:
+            with open(self.library.snapshot_path, "wb") as f:
+                f.write(data)
+            self.assertIsNone(self.library.read_snapshot())
+        self.assertEqual(self.library.load_fast(), ([self.song], set()))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import tempfile
+import time
+import unittest
+import wave
+from unittest.mock import patch
+
+import numpy as np
+
+from library import LibraryIndex
+import loudness
+from loudness import ABSOLUTE_GATE, LoudnessAnalyzer, analyze_file, decode, gain_for, integrated_loudness, step_energies
+
+
+def write_tone(path, seconds, amplitude, rate=44100):
+    # Stereo 1 kHz sine WAV file
+    t = np.arange(int(rate * seconds)) / rate
+    samples = (amplitude * 32767 * np.sin(2 * np.pi * 1000 * t)).astype("<i2")
+    with wave.open(path, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(np.repeat(samples[:, None], 2, axis=1).tobytes())
+
+
+class TestLoudness(unittest.TestCase):
+    def setUp(self):
+        """Create a temporary directory with a library index."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.library = LibraryIndex(os.path.join(self.tmp.name, "library.db"))
+
+    def tearDown(self):
+        self.library.close()
+        self.tmp.cleanup()
+
+    def test_chunking_does_not_change_result(self):
+        """Test that step energies do not depend on chunk boundaries."""
+        samples = np.random.default_rng(1).uniform(-0.5, 0.5, (44100, 2)).astype(np.float32)
+        whole, whole_peak = step_energies([samples], 44100)
+        parts, parts_peak = step_energies(np.array_split(samples, 7), 44100)
+        np.testing.assert_allclose(whole, parts, rtol=1e-5)
+        self.assertEqual(whole_peak, parts_peak)
+
+    def test_sine_loudness(self):
+        """Test that a full-scale stereo sine measures about 0 LUFS."""
+        path = os.path.join(self.tmp.name, "loud.wav")
+        write_tone(path, 2, 1.0)
+        loudness, peak = analyze_file(path)
+        self.assertAlmostEqual(loudness, -0.691 + 10 * np.log10(2 * 0.5), delta=0.1)
+        self.assertAlmostEqual(peak, 0, delta=0.1)
+
+    @unittest.skipIf(loudness.soundfile is None, "soundfile not installed")
+    def test_compressed_file_is_streamed(self):
+        """Test that a FLAC file is decoded a chunk at a time, not as a whole."""
+        wav = os.path.join(self.tmp.name, "tone.wav")
+        write_tone(wav, 3, 0.5)
+        flac = os.path.join(self.tmp.name, "tone.flac")
+        data, rate = loudness.soundfile.read(wav, dtype="int16")
+        loudness.soundfile.write(flac, data, rate)
+        with patch("loudness._decode_pygame") as whole:
+            rate, chunks = decode(flac, chunk_seconds=1)
+            self.assertEqual([len(chunk) for chunk in chunks], [44100] * 3)
+            whole.assert_not_called()
+        self.assertAlmostEqual(analyze_file(flac)[0], analyze_file(wav)[0], places=3)
+
+    def test_silence_is_gated(self):
+        """Test that silence reports the absolute gate and unit gain."""
+        self.assertEqual(integrated_loudness(np.zeros(20)), ABSOLUTE_GATE)
+        self.assertEqual(gain_for(ABSOLUTE_GATE), 1.0)
+
+    def test_gain_only_turns_down(self):
+        """Test that loud songs are attenuated and quiet ones are left alone."""
+        self.assertAlmostEqual(gain_for(-8.0, target=-18.0), 10 ** (-10 / 20))
+        self.assertEqual(gain_for(-30.0, target=-18.0), 1.0)
+
+    def test_analyzer_stores_gain_once(self):
+        """Test that analyzed songs are not measured again until they change."""
+        path = os.path.join(self.tmp.name, "song.wav")
+        write_tone(path, 1, 0.9)
+        analyzer = LoudnessAnalyzer(self.library)
+        analyzer.analyze([path])
+        analyzer.wait(60)
+        track = self.library.get(path)
+        self.assertLess(track.gain, 1.0)
+        self.assertIsNotNone(track.loudness)
+
+        # Reopened index keeps the result and the analyzer skips the song
+        self.library.close()
+        self.library = LibraryIndex(os.path.join(self.tmp.name, "library.db"))
+        self.library.load()
+        analyzer = LoudnessAnalyzer(self.library)
+        with patch("loudness.multiprocessing.get_context") as get_context:
+            analyzer.analyze([path])
+            analyzer.wait(10)
+            get_context.assert_not_called()
+        self.assertEqual(self.library.get(path).gain, track.gain)
+
+        # A changed file loses its gain
+        write_tone(path, 2, 0.1)
+        os.utime(path, (1, 1))
+        self.assertIsNone(self.library.get(path).gain)
+
+    def test_close_does_not_wait_for_workers(self):
+        """Test that closing abandons the songs being measured."""
+        paths = []
+        for i in range(6):
+            path = os.path.join(self.tmp.name, f"song{i}.wav")
+            write_tone(path, 60, 0.5)
+            paths.append(path)
+        analyzer = LoudnessAnalyzer(self.library)
+        analyzer.analyze(paths)
+        time.sleep(0.5)
+        started = time.perf_counter()
+        analyzer.close()
+        self.assertLess(time.perf_counter() - started, 1.5)
+        self.assertIsNone(analyzer.thread)
+        self.assertLess(analyzer.analyzed, len(paths))
+
+    def test_stale_result_is_dropped(self):
+        """Test that a result for a file that changed meanwhile is not stored."""
+        path = os.path.join(self.tmp.name, "song.wav")
+        write_tone(path, 1, 0.5)
+        track = self.library.get(path)
+        os.utime(path, (1, 1))
+        self.library.get(path)
+        self.library.set_loudness([(track, -10.0, -1.0, 0.5)])
+        self.assertIsNone(self.library.get(path).gain)
+
+
+if __name__ == "__main__":
+    unittest.main()
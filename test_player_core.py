@@ -0,0 +1,378 @@
+import os
+import tempfile
+import time
+import unittest
+import wave
+
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+
+import pygame
+
+from audio_cache import DecodedAudioCache, DecodedStream
+from dsp import DSPEngine
+from io_executor import IOExecutor
+from library import LibraryIndex
+from player_core import PlayerCore
+from seek_table import SeekTableCache
+from watcher import Changes
+
+
+def write_silence(path, seconds):
+    # Tiny silent WAV file for playback tests
+    with wave.open(path, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(44100)
+        w.writeframes(b"\0" * int(44100 * seconds) * 4)
+
+
+def write_mp3(path, frames):
+    # Silent MP3 file of bare 128 kbit/s frames
+    with open(path, "wb") as f:
+        f.write((bytes([0xFF, 0xFB, 0x90, 0x64]) + bytes(413)) * frames)
+
+
+class TestPlayerCore(unittest.TestCase):
+    def setUp(self):
+        """Create a headless player over a few short songs."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.songs = []
+        for name in ["a.wav", "b.wav", "c.wav"]:
+            path = os.path.join(self.tmp.name, name)
+            write_silence(path, 0.3)
+            self.songs.append(path)
+        self.library = LibraryIndex(os.path.join(self.tmp.name, "library.db"))
+        self.core = PlayerCore(self.library, seek_tables=SeekTableCache(os.path.join(self.tmp.name, "tables")))
+        self.events = []
+        self.core.subscribe(lambda event, data: self.events.append((event, data)))
+
+    def tearDown(self):
+        self.core.stop()
+        self.library.close()
+        self.tmp.cleanup()
+
+    def run_until(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            self.core.poll(refresh_ms=20)
+            time.sleep(0.01)
+        return condition()
+
+    def tracks_started(self):
+        return [data["path"] for event, data in self.events if event == "track"]
+
+    def test_set_songs_emits_event(self):
+        """Test that loading songs is reported to subscribers."""
+        self.core.set_songs(self.songs)
+        self.assertEqual(self.events, [("songs", {"count": 3})])
+        self.assertEqual(self.core.index_of(self.songs[2]), 2)
+
+    def test_play_index(self):
+        """Test playing one song and stopping."""
+        self.core.set_songs(self.songs)
+        self.assertTrue(self.core.play_index(1))
+        self.assertEqual(self.core.current_song, self.songs[1])
+        self.assertTrue(self.core.is_playing())
+        self.core.stop()
+        self.assertFalse(self.core.keep_playing)
+        self.assertEqual(self.events[-1][0], "stopped")
+        self.assertIsNone(self.core.poll())
+
+    def test_shuffle_moves_on_at_song_end(self):
+        """Test that shuffle plays on through the whole playlist."""
+        self.core.set_songs(self.songs)
+        self.core.play_random()
+        self.assertTrue(self.run_until(lambda: len(self.tracks_started()) >= 4))
+        self.assertEqual(set(self.tracks_started()[:3]), set(self.songs))
+
+    def test_play_random_twice_restarts(self):
+        """Test that starting shuffle again restarts a single playback."""
+        self.core.set_songs(self.songs)
+        self.core.play_random()
+        first = self.core.shuffle
+        self.core.play_random()
+        self.assertEqual(len(self.tracks_started()), 2)
+        self.assertIsNot(self.core.shuffle, first)
+        self.assertFalse(self.core.shuffle.back)
+        # current_index is the song's place in the song list, wherever the
+        # shuffle started
+        self.assertEqual(self.core.current_song, self.songs[self.core.current_index])
+
+    def test_pause_resume(self):
+        """Test pausing and resuming."""
+        self.core.set_songs(self.songs)
+        self.core.play_index(0)
+        self.assertTrue(self.core.pause_resume())
+        self.assertTrue(self.core.is_paused)
+        self.assertTrue(self.core.pause_resume())
+        self.assertFalse(self.core.is_paused)
+
+    def test_search(self):
+        """Test searching the song list by file name."""
+        self.core.set_songs(self.songs)
+        deadline = time.time() + 5
+        while len(self.core.search_index) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.core.search("b"), [1])
+        self.core.append_songs([os.path.join(self.tmp.name, "bb.wav")])
+        self.assertEqual(self.core.search("b"), [1, 3])
+
+    def test_dispatch(self):
+        """Test running commands by name."""
+        self.core.dispatch("set_volume", volume=0.5)
+        self.assertEqual(self.core.status()["volume"], 0.5)
+        with self.assertRaises(ValueError):
+            self.core.dispatch("format_disk")
+
+    def test_favorites_round_trip(self):
+        """Test saving and loading favorites files."""
+        self.core.set_songs(self.songs)
+        self.core.add_favorites(self.songs[:2])
+        fav_file = os.path.join(self.tmp.name, "list.fav")
+        self.core.save_favorites(fav_file)
+        self.core.clear_favorites()
+        self.assertEqual(self.core.load_favorites(fav_file), set(self.songs[:2]))
+        self.assertEqual(self.core.favorites, set(self.songs[:2]))
+
+    def test_seek(self):
+        """Test that seeking moves the reported position."""
+        long_song = os.path.join(self.tmp.name, "long.wav")
+        write_silence(long_song, 3)
+        self.core.set_songs([long_song])
+        self.assertFalse(self.core.seek(1.0))
+        self.core.play_index(0)
+        self.assertTrue(self.core.seek(2.0))
+        self.assertGreaterEqual(self.core.position(), 2.0)
+        self.assertIn(("seeked", {"path": long_song, "position": 2.0}), self.events)
+        self.assertTrue(self.run_until(lambda: not self.core.is_playing(), timeout=2.5))
+
+    def test_seek_long_mp3(self):
+        """Test that a seek table seek lands on a frame and counts on from there."""
+        song = os.path.join(self.tmp.name, "set.mp3")
+        write_mp3(song, int(600 * 44100 / 1152))
+        self.core.set_songs([song])
+        self.core.play_index(0)
+        self.core.seek_tables.request(song).result()
+        self.assertTrue(self.core.seek(456.7))
+        landed = self.events[-1][1]["position"]
+        self.assertLessEqual(landed, 456.7)
+        self.assertGreater(landed, 456.7 - 1152 / 44100)
+        self.assertIsNotNone(self.core.stream)
+        time.sleep(0.2)
+        self.assertGreaterEqual(self.core.position(), landed + 0.1)
+        self.assertTrue(self.core.is_playing())
+        self.core.stop()
+        self.assertIsNone(self.core.stream)
+
+    def test_loudness_gain(self):
+        """Test that a song's stored gain scales the volume while it plays."""
+        self.core.set_songs(self.songs)
+        self.core.set_volume(0.8)
+        track = self.library.get(self.songs[1])
+        self.library.set_loudness([(track, -12.0, -3.0, 0.5)])
+        self.core.play_index(1)
+        self.assertAlmostEqual(pygame.mixer.music.get_volume(), 0.4, delta=0.01)
+        self.core.play_index(0)
+        self.assertAlmostEqual(pygame.mixer.music.get_volume(), 0.8, delta=0.01)
+        self.core.normalize = False
+        self.core.play_index(1)
+        self.assertAlmostEqual(pygame.mixer.music.get_volume(), 0.8, delta=0.01)
+        self.assertEqual(self.core.status()["volume"], 0.8)
+
+    def test_lazy_start(self):
+        """Test that a lazy core restores the list and opens the mixer on first play."""
+        self.core.set_songs(self.songs)
+        self.core.close()
+        self.library = LibraryIndex(os.path.join(self.tmp.name, "library.db"))
+        self.core = PlayerCore(self.library, seek_tables=SeekTableCache(os.path.join(self.tmp.name, "tables")),
+                               lazy=True)
+        self.assertEqual(self.core.songs, self.songs)
+        self.assertIsNone(self.core.poll())
+        self.assertTrue(self.core.play_index(0))
+        self.assertTrue(self.core.mixer_ready)
+        self.assertTrue(self.core.is_playing())
+
+    def test_background_loading(self):
+        """Test that songs opened on the I/O executor start from poll() and rapid skips play only the last."""
+        self.core.io = IOExecutor()
+        self.core.set_songs(self.songs + [os.path.join(self.tmp.name, "missing.wav")])
+        for index in range(3):
+            self.assertTrue(self.core.play_index(index))
+        self.assertTrue(self.run_until(lambda: self.tracks_started()))
+        self.assertEqual(self.tracks_started(), [self.songs[2]])
+        self.assertIsNotNone(self.core.stream)
+        self.core.play_index(3)
+        self.assertTrue(self.run_until(lambda: self.events[-1][0] == "failed"))
+        self.assertEqual(self.core.current_song, self.songs[2])
+        self.core.io.shutdown()
+
+    def test_decoded_cache(self):
+        """Test that previous and next play songs decoded in the background from memory."""
+        self.core.decoded = DecodedAudioCache()
+        self.core.set_songs(self.songs)
+        self.core.play_index(1)
+        self.assertFalse(self.core.from_cache)
+        self.assertTrue(self.run_until(lambda: all(self.library.get(song) in self.core.decoded
+                                                   for song in self.songs)))
+        self.assertTrue(self.core.play_next())
+        self.assertIsInstance(self.core.stream, DecodedStream)
+        self.assertTrue(self.core.is_playing())
+        self.assertTrue(self.core.seek(0.1))
+        self.assertTrue(self.core.play_previous())
+        self.assertTrue(self.core.from_cache)
+        self.assertEqual(self.core.current_song, self.songs[1])
+        self.assertEqual(self.core.decoded.hits, 2)
+        self.core.decoded.shutdown()
+
+    def test_dsp_engine(self):
+        """Test that shuffle crossfades through the DSP engine and its controls reach it."""
+        self.core.dsp = DSPEngine(block_frames=2048, crossfade=0.1)
+        self.core.gapless = True
+        self.core.set_songs(self.songs)
+        self.assertTrue(self.core.set_equalizer([3] * 10))
+        self.core.set_volume(0.5)
+        self.assertTrue(self.core.play_random())
+        self.assertTrue(self.core.is_playing())
+        self.assertIsNotNone(self.core.queued_track)
+        self.assertTrue(self.run_until(lambda: len(self.tracks_started()) >= 3))
+        self.assertEqual(self.core.dsp.volume, 0.5)
+        self.assertTrue(self.core.pause_resume())
+        self.assertFalse(self.core.is_playing())
+        self.assertTrue(self.core.seek(0.1))
+        self.assertGreaterEqual(self.core.position(), 0.1)
+        self.core.stop()
+        self.assertFalse(self.core.is_playing())
+        self.core.dsp.close()
+
+    def test_enqueue(self):
+        """Test that queued songs play next, ahead of the playlist, and are handed to the mixer early."""
+        self.core.set_songs(self.songs)
+        self.core.play_index(0)
+        self.assertEqual(self.core.enqueue([self.songs[2]]), 1)
+        if self.core.gapless:
+            self.assertEqual(self.core.queued_track.path, self.songs[2])
+        self.assertTrue(self.run_until(lambda: self.songs[2] in self.tracks_started()))
+        self.assertEqual(self.core.status()["up_next"], 0)
+        self.core.stop()
+        self.core.enqueue(self.songs[1])
+        self.assertTrue(self.core.play_next())
+        self.assertEqual(self.core.current_song, self.songs[1])
+        self.assertIn(("queued", {"paths": [self.songs[1]]}), self.events)
+
+    def test_playlist_round_trip(self):
+        """Test that a saved playlist loads in order and only adds new songs."""
+        self.core.set_songs(self.songs[:2])
+        path = os.path.join(self.tmp.name, "list.m3u8")
+        self.core.save_playlist(path, [self.songs[2], self.songs[0], os.path.join(self.tmp.name, "gone.wav")])
+        songs, missing = self.core.load_playlist(path)
+        self.assertEqual(songs, [self.songs[2], self.songs[0]])
+        self.assertEqual(missing, 1)
+        self.assertEqual(self.core.songs, self.songs)
+        self.assertTrue(self.core.play_playlist(songs))
+        self.assertEqual(self.tracks_started(), [self.songs[2]])
+
+    def test_saved_favorites_keep_list_order(self):
+        """Test that favorites are written in song list order."""
+        self.core.set_songs(self.songs)
+        self.core.add_favorites([self.songs[2], self.songs[0]])
+        path = os.path.join(self.tmp.name, "list.fav")
+        self.core.save_favorites(path)
+        with open(path, encoding="utf-8") as f:
+            self.assertEqual(f.read().splitlines(), [self.songs[0], self.songs[2]])
+
+    def test_favorites_order_follows_changes(self):
+        """Test that the favorites order is kept up to date without a sort per save."""
+        self.core.set_songs(self.songs[1:])
+        self.core.add_favorites([self.songs[2], "/elsewhere/b.wav"])
+        self.assertEqual(self.core.ordered_favorites(), [self.songs[2], "/elsewhere/b.wav"])
+        self.core.add_favorites([self.songs[1]])
+        self.core.add_favorites(["/elsewhere/a.wav", self.songs[0]])
+        self.assertEqual(self.core.ordered_favorites(),
+                         [self.songs[1], self.songs[2], "/elsewhere/a.wav", "/elsewhere/b.wav", self.songs[0]])
+        self.core.append_songs([self.songs[0]])
+        self.assertEqual(self.core.ordered_favorites()[:3], [self.songs[1], self.songs[2], self.songs[0]])
+        self.core.clear_favorites()
+        self.assertEqual(self.core.ordered_favorites(), [])
+        self.assertEqual(self.core.favorites, set())
+
+    def test_file_changes(self):
+        """Test that renamed, removed and new files update the list in place."""
+        self.core.set_songs(self.songs)
+        self.core.add_favorites([self.songs[2]])
+        self.core.play_index(2)
+        renamed = os.path.join(self.tmp.name, "z.wav")
+        os.rename(self.songs[2], renamed)
+        added = os.path.join(self.tmp.name, "d.wav")
+        write_silence(added, 0.1)
+        self.events.clear()
+        self.assertTrue(self.core.apply_changes(Changes([added], [self.songs[0]], [(self.songs[2], renamed)])))
+        self.assertEqual(self.core.songs, [self.songs[1], renamed, added])
+        self.assertEqual(self.core.current_song, renamed)
+        self.assertEqual(self.core.current_index, 1)
+        self.assertEqual(self.core.favorites, {renamed})
+        deadline = time.time() + 5
+        while len(self.core.search_index) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.core.search("z"), [1])
+        self.assertEqual([event for event, data in self.events], ["renamed", "songs", "songs"])
+        self.assertEqual(self.library.load(), [self.songs[1], renamed, added])
+        self.assertEqual(self.library.favorites(), {renamed})
+
+    def test_remove_songs_keeps_shuffle_and_index(self):
+        """Test that removing songs remaps the shuffle pass and the search index in place."""
+        for name in ["d.wav", "e.wav", "f.wav"]:
+            path = os.path.join(self.tmp.name, name)
+            write_silence(path, 0.3)
+            self.songs.append(path)
+        self.core.set_songs(self.songs)
+        self.assertTrue(self.run_until(lambda: len(self.core.search_index) == 6))
+        self.core.play_random()
+        shuffle, index = self.core.shuffle, self.core.search_index
+        gone = [path for path in self.songs if path != self.core.current_song][:2]
+        self.events.clear()
+        self.assertEqual(self.core.remove_songs(gone), 2)
+        removed = sorted(self.songs.index(path) for path in gone)
+        self.assertEqual(self.events, [("songs", {"count": 4, "removed": removed})])
+        self.assertIs(self.core.shuffle, shuffle)
+        self.assertIs(self.core.search_index, index)
+        self.assertEqual(self.core.songs[self.core.current_index], self.core.current_song)
+        if self.core.queued_index is not None:
+            self.assertEqual(self.core.songs[self.core.queued_index], self.core.queued_track.path)
+        left = [path for path in self.songs if path not in gone]
+        self.assertEqual(self.core.songs, left)
+        for position, path in enumerate(left):
+            self.assertEqual(self.core.search(os.path.splitext(os.path.basename(path))[0]), [position])
+        played = {self.core.current_song}
+        for _ in range(3):
+            self.assertTrue(self.core.play_next())
+            played.add(self.core.current_song)
+        self.assertEqual(played, set(left))
+
+    def test_remove_songs_during_index_build(self):
+        """Test that a search index build running across a removal renumbers its songs."""
+        with self.core.lock:
+            # The build cannot finish before the removal
+            self.core.set_songs(self.songs)
+            self.core.remove_songs([self.songs[0]])
+        self.assertTrue(self.run_until(lambda: len(self.core.search_index) == 2))
+        self.assertEqual(self.core.search("a"), [])
+        self.assertEqual(self.core.search("c"), [1])
+
+    def test_watch_folder(self):
+        """Test that a watched folder's new files reach the song list through poll()."""
+        self.core.set_songs(self.songs)
+        self.core.watch([self.tmp.name], backend="poll")
+        self.core.watcher.interval = 0.05
+        self.core.watcher.settle = 0.05
+        added = os.path.join(self.tmp.name, "new", "d.wav")
+        os.makedirs(os.path.dirname(added))
+        write_silence(added, 0.1)
+        self.assertTrue(self.run_until(lambda: added in self.core.songs))
+        os.remove(self.songs[0])
+        self.assertTrue(self.run_until(lambda: self.songs[0] not in self.core.songs))
+        self.core.unwatch()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+from library import Track
+from playlist import load_in_background, read_playlist, write_playlist
+
+
+class TestPlaylist(unittest.TestCase):
+    def setUp(self):
+        """Create a folder with a few songs and a subfolder."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = self.tmp.name
+        os.makedirs(os.path.join(self.folder, "album"))
+        self.songs = [os.path.join(self.folder, "album", name) for name in ("a.mp3", "b.mp3", "ç.mp3")]
+        for song in self.songs:
+            open(song, "wb").close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, data):
+        path = os.path.join(self.folder, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_read_m3u(self):
+        """Test that comments and URLs are skipped and relative entries resolved."""
+        path = self.write("list.m3u", "\ufeff#EXTM3U\n#EXTINF:10,A\nalbum/a.mp3\n\nhttp://radio/stream\n"
+                          f"file://{self.songs[1]}\nalbum/ç.mp3\n".encode("utf-8"))
+        self.assertEqual(list(read_playlist(path)), self.songs)
+
+    def test_read_ansi_m3u(self):
+        """Test that a non-UTF-8 line falls back to Latin-1."""
+        path = self.write("list.m3u", "album/ç.mp3\r\n".encode("latin-1"))
+        self.assertEqual(list(read_playlist(path)), [self.songs[2]])
+
+    def test_read_pls(self):
+        """Test that PLS File entries are read in order."""
+        path = self.write("list.pls", b"[playlist]\nFile1=album/b.mp3\nTitle1=B\nLength1=3\n"
+                                      b"File2=album/a.mp3\nNumberOfEntries=2\nVersion=2\n")
+        self.assertEqual(list(read_playlist(path)), [self.songs[1], self.songs[0]])
+
+    def test_write_round_trip(self):
+        """Test that written playlists read back in order with relative entries."""
+        outside = os.path.join(os.path.dirname(self.folder), "elsewhere.mp3")
+        songs = self.songs + [outside]
+        tracks = {self.songs[0]: Track(self.songs[0], 1, 1, 61.4, "Song", "Artist", None, False)}
+        for name in ("out.m3u8", "out.pls"):
+            path = os.path.join(self.folder, name)
+            write_playlist(path, iter(songs), tracks)
+            self.assertEqual(list(read_playlist(path)), songs)
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            self.assertIn(os.path.join("album", "a.mp3"), text)
+            self.assertIn(outside, text)
+            self.assertIn("Artist - Song", text)
+        with open(os.path.join(self.folder, "out.m3u8"), encoding="utf-8") as f:
+            self.assertEqual(f.readline(), "#EXTM3U\n")
+            self.assertEqual(f.readline(), "#EXTINF:61,Artist - Song\n")
+
+    def test_load_in_background(self):
+        """Test that missing entries are counted across batches."""
+        path = os.path.join(self.folder, "list.m3u8")
+        missing = [os.path.join(self.folder, f"gone{i}.mp3") for i in range(5)]
+        write_playlist(path, [self.songs[0]] + missing + self.songs[1:])
+        songs, missed = load_in_background(path, batch_size=2).result()
+        self.assertEqual(songs, self.songs)
+        self.assertEqual(missed, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import struct
+import tempfile
+import unittest
+
+from mutagen.easyid3 import EasyID3
+
+from library import read_tags
+from probe import HEADER_LIMIT, PROBES, probe_audio, probe_with_tags, register_probe
+from test_player_core import write_silence
+from test_seek_table import MP3_FRAME, ogg_page, write_mp3
+
+
+def syncsafe_bytes(size):
+    return bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def id3_frame(version, frame, body):
+    size = syncsafe_bytes(len(body)) if version == 4 else struct.pack(">I", len(body))
+    return frame + size + b"\0\0" + body
+
+
+class TestProbe(unittest.TestCase):
+    def setUp(self):
+        """Create a temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_wav_header(self):
+        """Test that WAV info comes from the RIFF header alone."""
+        song = self.path("a.wav")
+        write_silence(song, 5)
+        info = probe_audio(song)
+        self.assertEqual((info.duration, info.rate, info.channels, info.source), (5.0, 44100, 2, "header"))
+        self.assertLess(info.bytes_read, 100)
+
+    def test_mp3_cbr(self):
+        """Test that a constant bitrate MP3 is measured from its size."""
+        song = self.path("a.mp3")
+        with open(song, "wb") as f:
+            f.write(MP3_FRAME * 10000)
+        info = probe_audio(song)
+        self.assertAlmostEqual(info.duration, 10000 * 417 * 8 / 128000)
+        self.assertEqual((info.rate, info.channels, info.source), (44100, 2, "header"))
+        self.assertLess(info.bytes_read, 8 * 1024)
+
+    def test_mp3_xing_frame_count(self):
+        """Test that the Xing header frame count gives the length."""
+        song = self.path("a.mp3")
+        xing = b"Xing" + struct.pack(">II", 1, 5000)
+        with open(song, "wb") as f:
+            f.write(b"ID3\x04\x00\x00\x00\x00\x01\x00" + bytes(128))
+            f.write(MP3_FRAME[:36] + xing + bytes(len(MP3_FRAME) - 36 - len(xing)))
+            f.write(MP3_FRAME * 100)
+        info = probe_audio(song)
+        self.assertAlmostEqual(info.duration, 5000 * 1152 / 44100)
+        self.assertLess(info.bytes_read, 8 * 1024)
+
+    def test_ogg_last_granule(self):
+        """Test that Ogg length comes from the last page without reading the middle."""
+        song = self.path("a.ogg")
+        ident = b"\x01vorbis" + struct.pack("<IBI", 0, 1, 48000) + bytes(15)
+        with open(song, "wb") as f:
+            f.write(ogg_page(0, ident, 0))
+            for i in range(2000):
+                f.write(ogg_page(480 * (i + 1), bytes(400), i + 1))
+        info = probe_audio(song)
+        self.assertEqual((info.duration, info.rate, info.channels), (20.0, 48000, 1))
+        self.assertLess(info.bytes_read, 8 * 1024)
+
+    def test_fallback(self):
+        """Test that unreadable headers fall back without raising."""
+        song = self.path("a.mp3")
+        with open(song, "wb") as f:
+            f.write(b"\0" * (2 * HEADER_LIMIT))
+        info = probe_audio(song)
+        self.assertEqual((info.duration, info.source), (0, "fallback"))
+        write_mp3(song, 10)
+        self.assertEqual(probe_audio(song).source, "header")
+
+    def test_register_probe(self):
+        """Test that probes can be added for more formats."""
+        song = self.path("a.raw")
+        with open(song, "wb") as f:
+            f.write(bytes(1000))
+        register_probe(".RAW", lambda f: (len(f.read()) / 100, 50, 1))
+        self.addCleanup(PROBES.pop, ".raw")
+        self.assertEqual(probe_audio(song), (10.0, 50, 1, 1000, "header"))
+
+    def test_tag_reads_are_counted(self):
+        """Test that the bytes read for tags count towards the probe."""
+        song = self.path("a.mp3")
+        write_mp3(song, 100)
+        tags = EasyID3()
+        tags["title"] = "Song"
+        tags["artist"] = "x" * 20000
+        tags.save(song)
+        info, (title, artist, album) = probe_with_tags(song, read_tags)
+        self.assertEqual((title, album), ("Song", None))
+        self.assertEqual(info.duration, probe_audio(song).duration)
+        self.assertGreater(info.bytes_read, probe_audio(song).bytes_read + 20000)
+
+    def test_cover_art_is_not_read(self):
+        """Test that MP3 tag reads skip over cover art to the text frames."""
+        song = self.path("a.mp3")
+        for version in (3, 4):
+            # Cover art first, as some taggers write it
+            frames = b"".join(id3_frame(version, frame, body) for frame, body in (
+                (b"APIC", b"\0image/jpeg\0\x03cover\0" + b"\xff" * 2000000),
+                (b"TIT2", b"\x01" + "Sóng".encode("utf-16")),
+                (b"TPE1", b"\x00Artist"),
+                (b"TALB", b"\x03" + "Albüm".encode("utf-8")),
+            )) + bytes(1024)
+            with open(song, "wb") as f:
+                f.write(b"ID3" + bytes((version, 0, 0)) + syncsafe_bytes(len(frames)) + frames)
+                f.write(MP3_FRAME * 100)
+            info, found = probe_with_tags(song, read_tags)
+            self.assertEqual(found, ("Sóng", "Artist", "Albüm"))
+            self.assertEqual(info.duration, probe_audio(song).duration)
+            self.assertLess(info.bytes_read, probe_audio(song).bytes_read + 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from search_index import SearchIndex
+
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        """Index a few songs by file name and tags."""
+        self.index = SearchIndex()
+        self.index.add(0, "01 Bohemian Rhapsody", "Bohemian Rhapsody", "Queen", "A Night at the Opera")
+        self.index.add(1, "02 Under Pressure", None, "Queen", "Hot Space")
+        self.index.add(2, "track03", "Heroes", "David Bowie", "Heroes")
+
+    def test_substring_and_prefix(self):
+        """Test matching inside words and by short word prefixes."""
+        self.assertEqual(self.index.search("hemian"), [0])
+        self.assertEqual(self.index.search("que"), [0, 1])
+        self.assertEqual(self.index.search("he"), [2])
+        self.assertEqual(self.index.search("QUEEN pressure"), [1])
+        self.assertEqual(self.index.search("queen bowie"), [])
+        self.assertEqual(self.index.search("   "), [])
+
+    def test_update_and_remove(self):
+        """Test that the index follows changes to single songs."""
+        self.index.update(2, "track03", "Changes", "David Bowie", "Hunky Dory")
+        self.assertEqual(self.index.search("heroes"), [])
+        self.assertEqual(self.index.search("hunky"), [2])
+        self.index.remove(1)
+        self.assertEqual(self.index.search("queen"), [0])
+        self.assertNotIn("pressure", self.index.word_docs)
+
+    def test_remove_docs_moves_later_ids_down(self):
+        """Test that removing songs from the list renumbers the songs after them."""
+        self.index.add(3, "04 Radio Ga Ga", None, "Queen")
+        self.index.remove_docs([0, 2])
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.search("queen"), [0, 1])
+        self.assertEqual(self.index.search("radio"), [1])
+        self.assertEqual(self.index.search("heroes"), [])
+        self.index.update(1, "04 Radio Ga Ga", "Radio Ga Ga", "Queen", "The Works")
+        self.index.add(2, "05 Killer Queen")
+        self.assertEqual(self.index.search("works"), [1])
+        self.assertEqual(self.index.search("queen"), [0, 1, 2])
+        self.index.remove_docs([1])
+        self.assertEqual(self.index.search("queen", limit=1), [0])
+        self.assertEqual(self.index.search("killer"), [1])
+
+    def test_remove_docs_leaves_other_songs_alone(self):
+        """Test that removing an early song does not touch the songs after it."""
+        index = SearchIndex()
+        index.add_many((i, (f"song {i}",)) for i in range(20000))
+        words = index.doc_words[19999]
+        song_docs = index.word_docs["song"]
+        index.remove_docs([0, 5])
+        self.assertIs(index.doc_words[19999], words)
+        self.assertIs(index.word_docs["song"], song_docs)
+        self.assertEqual(len(song_docs), 19998)
+        self.assertEqual(index.search("19999"), [19997])
+        self.assertEqual(index.search("song", limit=5), [0, 1, 2, 3, 4])
+
+    def test_merge_replaces_entries(self):
+        """Test that merging an index built on the side adds and replaces songs."""
+        side = SearchIndex()
+        side.add(2, "track03", "Changes", "David Bowie")
+        side.add(3, "04 Radio Ga Ga", None, "Queen")
+        self.index.merge(side)
+        self.assertEqual(self.index.search("queen"), [0, 1, 3])
+        self.assertEqual(self.index.search("heroes"), [])
+        self.assertEqual(self.index.search("changes"), [2])
+
+    def test_limit_returns_lowest_ids(self):
+        """Test that limited results come back in song order."""
+        index = SearchIndex()
+        index.add_many(((i, (f"song {i}",)) for i in range(5000)), chunk_size=300)
+        self.assertEqual(len(index), 5000)
+        self.assertEqual(index.search("song", limit=10), list(range(10)))
+        self.assertEqual(index.search("4999", limit=10), [4999])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+import os
+import struct
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from seek_table import SeekTableCache, build_table
+from test_player_core import write_silence
+
+# MPEG-1 Layer III, 128 kbit/s, 44.1 kHz: 417 bytes (418 padded), 1152 samples
+MP3_FRAME = bytes([0xFF, 0xFB, 0x90, 0x64]) + bytes(413)
+MP3_PADDED_FRAME = bytes([0xFF, 0xFB, 0x92, 0x64]) + bytes(414)
+
+
+def write_mp3(path, frames, id3=b"", xing=False):
+    # Silent MP3 file built from bare frames
+    with open(path, "wb") as f:
+        if id3:
+            size = len(id3)
+            f.write(b"ID3\x04\x00\x00" + bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0)) + id3)
+        if xing:
+            f.write(MP3_FRAME[:36] + b"Xing" + bytes(len(MP3_FRAME) - 40))
+        for i in range(frames):
+            f.write(MP3_PADDED_FRAME if i % 3 == 2 else MP3_FRAME)
+        f.write(b"TAG" + bytes(125))
+
+
+def ogg_page(granule, payload, sequence):
+    # Ogg page without a valid CRC, enough for the table builder
+    segments = [255] * (len(payload) // 255) + [len(payload) % 255]
+    return (b"OggS\x00\x00" + struct.pack("<qII", granule, 1, sequence) + b"\0\0\0\0"
+            + bytes([len(segments)]) + bytes(segments) + payload)
+
+
+class TestSeekTable(unittest.TestCase):
+    def setUp(self):
+        """Create a temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def test_wav_seek_is_sample_exact(self):
+        """Test that a WAV view starts at the sample frame and has a valid header."""
+        song = self.path("a.wav")
+        write_silence(song, 2)
+        table = build_table(song)
+        self.assertEqual(table.total, 88200)
+        start, stream = table.open(song, 1.5)
+        with stream:
+            data = stream.read()
+        self.assertEqual(start, 1.5)
+        self.assertEqual(data[:4], b"RIFF")
+        self.assertEqual(struct.unpack("<I", data[4:8])[0], len(data) - 8)
+        self.assertEqual(struct.unpack("<I", data[40:44])[0], 22050 * 4)
+        self.assertEqual(len(data), 44 + 22050 * 4)
+
+    def test_mp3_frames(self):
+        """Test that MP3 frames are indexed past tags, padding and the Xing frame."""
+        song = self.path("a.mp3")
+        write_mp3(song, 300, id3=b"x" * 100, xing=True)
+        table = build_table(song)
+        self.assertEqual(len(table.offsets), 300)
+        self.assertEqual(table.offsets[0], 110 + 417)
+        self.assertEqual(table.offsets[3] - table.offsets[2], 418)
+        start, offset = table.locate(5.0)
+        self.assertLessEqual(start, 5.0)
+        self.assertGreater(start, 5.0 - 1152 / 44100)
+        with open(song, "rb") as f:
+            f.seek(offset)
+            self.assertEqual(f.read(2), b"\xff\xfb")
+
+    def test_ogg_pages(self):
+        """Test that Ogg pages map to the audio that follows the previous granule."""
+        song = self.path("a.ogg")
+        ident = b"\x01vorbis" + struct.pack("<IBI", 0, 2, 48000) + bytes(15)
+        pages = [ogg_page(0, ident, 0), ogg_page(0, b"\x03vorbis" + bytes(40), 1)]
+        pages += [ogg_page(4800 * (i + 1), bytes(300), i + 2) for i in range(10)]
+        with open(song, "wb") as f:
+            f.write(b"".join(pages))
+        table = build_table(song)
+        self.assertEqual(table.rate, 48000)
+        self.assertEqual(table.duration, 1.0)
+        self.assertEqual(table.prefix, pages[0] + pages[1])
+        start, offset = table.locate(0.25)
+        self.assertEqual(start, 0.2)
+        self.assertEqual(offset, sum(len(page) for page in pages[:4]))
+
+    def test_unsupported_file(self):
+        """Test that files without a table raise ValueError."""
+        song = self.path("a.flac")
+        with open(song, "wb") as f:
+            f.write(b"fLaC")
+        with self.assertRaises(ValueError):
+            build_table(song)
+
+    def test_cache_reuses_stored_table(self):
+        """Test that a table is built once and read back from disk."""
+        song = self.path("a.mp3")
+        write_mp3(song, 50)
+        cache_dir = self.path("tables")
+        cache = SeekTableCache(cache_dir)
+        self.assertIsNone(cache.get(song))
+        table = cache.request(song).result()
+        with patch("seek_table.build_table") as build:
+            cached = SeekTableCache(cache_dir).load(song)
+            build.assert_not_called()
+        self.assertEqual(list(cached.offsets), list(table.offsets))
+        self.assertEqual(cached.locate(0.5), table.locate(0.5))
+        cache.shutdown()
+
+    def test_cache_evicts_least_recently_used(self):
+        """Test that a table read since is kept over an older, unused one."""
+        songs = []
+        for name in ("a.mp3", "b.mp3", "c.mp3"):
+            write_mp3(self.path(name), 50)
+            songs.append(self.path(name))
+        cache = SeekTableCache(self.path("tables"), memory_items=1)
+        cache.load(songs[0])
+        cache.max_bytes = 2 * cache.total
+        cache.load(songs[1])
+        cache.get(songs[0])
+        cache.load(songs[2])
+        self.assertTrue(os.path.exists(cache.cache_path(songs[0])))
+        self.assertFalse(os.path.exists(cache.cache_path(songs[1])))
+        cache.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
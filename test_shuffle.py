@@ -0,0 +1,97 @@
+import random
+import unittest
+
+from shuffle import ShuffleEngine
+
+
+class TestShuffleEngine(unittest.TestCase):
+    def test_each_song_once_per_pass(self):
+        """Test that a pass is a permutation of all songs."""
+        engine = ShuffleEngine(1000, rng=random.Random(1))
+        first = [engine.next() for _ in range(1000)]
+        second = [engine.next() for _ in range(1000)]
+        self.assertEqual(sorted(first), list(range(1000)))
+        self.assertEqual(sorted(second), list(range(1000)))
+        self.assertNotEqual(first, second)
+
+    def test_huge_library_starts_lazily(self):
+        """Test that starting shuffle does not allocate per song."""
+        engine = ShuffleEngine(10 ** 9, rng=random.Random(2))
+        picks = [engine.next() for _ in range(100)]
+        self.assertEqual(len(set(picks)), 100)
+        self.assertLessEqual(len(engine._swaps), 100)
+
+    def test_back_and_forward_history(self):
+        """Test that previous and next walk the same history."""
+        engine = ShuffleEngine(50, rng=random.Random(3))
+        played = [engine.next() for _ in range(5)]
+        self.assertEqual(engine.previous(), played[3])
+        self.assertEqual(engine.previous(), played[2])
+        self.assertEqual(engine.next(), played[3])
+        self.assertEqual(engine.next(), played[4])
+
+    def test_peek_matches_next(self):
+        """Test that peek returns what next will play."""
+        engine = ShuffleEngine(20, rng=random.Random(4))
+        engine.next()
+        upcoming = engine.peek()
+        self.assertEqual(engine.next(), upcoming)
+
+    def test_resize_keeps_pass(self):
+        """Test that appended songs join the running pass."""
+        engine = ShuffleEngine(10, rng=random.Random(5))
+        picks = [engine.next() for _ in range(5)]
+        engine.resize(20)
+        picks += [engine.next() for _ in range(15)]
+        self.assertEqual(sorted(picks), list(range(20)))
+
+    def test_remove_keeps_pass(self):
+        """Test that removed songs leave the running pass and later indices move down."""
+        engine = ShuffleEngine(20, rng=random.Random(8))
+        songs = list(range(20))
+        picks = [songs[engine.next()] for _ in range(6)]
+        upcoming = songs[engine.peek()]
+        for removed in ([3, 4, 17], [0, 9]):
+            removed = [index for index in removed if songs[index] != upcoming]
+            gone = {songs[index] for index in removed}
+            engine.remove(removed)
+            songs = [song for song in songs if song not in gone]
+            picks = [song for song in picks if song not in gone]
+            self.assertEqual(songs[engine.current], picks[-1])
+            self.assertEqual(songs[engine.peek()], upcoming)
+        picks += [songs[engine.next()] for _ in range(len(songs) - len(picks))]
+        self.assertEqual(sorted(picks), songs)
+        self.assertEqual(sorted(engine.next() for _ in range(len(songs))), list(range(len(songs))))
+        self.assertEqual(engine._holes, [])
+
+    def test_favorites_mode(self):
+        """Test that favorites come up more often than other songs."""
+        engine = ShuffleEngine(100, mode="favorites", favorites=[7], favorite_weight=20,
+                               rng=random.Random(6))
+        picks = [engine.next() for _ in range(1000)]
+        self.assertGreater(picks.count(7), 100)
+
+    def test_fresh_mode_avoids_recent(self):
+        """Test that recently played songs are put off across passes."""
+        engine = ShuffleEngine(20, mode="fresh", recent_window=10, rng=random.Random(7))
+        picks = [engine.next() for _ in range(200)]
+        for i in range(len(picks) - 10):
+            self.assertNotIn(picks[i], picks[i + 1:i + 10])
+
+    def test_fresh_mode_memory_is_bounded(self):
+        """Test that put off songs stay bounded when the library is smaller than the window."""
+        for size in (1, 20, 40, 60):
+            engine = ShuffleEngine(size, mode="fresh", rng=random.Random(size))
+            for _ in range(20000):
+                self.assertIsNotNone(engine.next())
+                self.assertLessEqual(len(engine.deferred), size)
+            self.assertLess(len(engine.recent), max(size, 2))
+
+    def test_unknown_mode(self):
+        """Test that an unknown mode is rejected."""
+        with self.assertRaises(ValueError):
+            ShuffleEngine(10, mode="loudest")
+
+
+if __name__ == "__main__":
+    unittest.main()
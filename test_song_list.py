@@ -0,0 +1,81 @@
+import tkinter as tk
+import unittest
+
+from song_list import VirtualSongList
+
+
+class TestVirtualSongList(unittest.TestCase):
+    def setUp(self):
+        """Create a list view over a large model."""
+        try:
+            self.root = tk.Tk()
+        except tk.TclError:
+            self.skipTest("no display")
+        self.rendered = []
+        self.names = [f"song{i}.mp3" for i in range(100000)]
+        self.view = VirtualSongList(self.root, self.format_row, rows=8)
+        self.view.set_count(len(self.names))
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def format_row(self, index):
+        self.rendered.append(index)
+        return self.names[index]
+
+    def test_only_visible_rows_rendered(self):
+        """Test that only the visible window is rendered."""
+        self.assertEqual(self.view.size(), 100000)
+        self.assertEqual(self.view.listbox.size(), 8)
+        self.assertEqual(self.rendered, list(range(8)))
+
+    def test_refresh_single_row(self):
+        """Test that refreshing a row re-renders just that row."""
+        self.rendered.clear()
+        self.names[3] = "★ song3.mp3"
+        self.view.refresh_rows([3, 50000])
+        self.assertEqual(self.rendered, [3])
+        self.assertEqual(self.view.listbox.get(3), "★ song3.mp3")
+
+    def test_selection_uses_model_indices(self):
+        """Test that selection survives scrolling and reports model indices."""
+        self.view.selection_set(2)
+        self.view.scroll_to(50000)
+        self.assertEqual(self.view.listbox.get(0), "song50000.mp3")
+        self.view.selection_set(50001)
+        self.assertEqual(self.view.curselection(), (2, 50001))
+
+    def test_filter_maps_rows_to_model(self):
+        """Test that a filtered view shows and reports model indices."""
+        self.view.set_filter([10, 20, 30])
+        self.assertEqual(self.view.size(), 3)
+        self.assertEqual(self.view.listbox.get(1), "song20.mp3")
+        self.view.listbox.selection_set(2)
+        self.view._sync_selection()
+        self.assertEqual(self.view.curselection(), (30,))
+        self.view.set_filter(None)
+        self.assertEqual(self.view.size(), 100000)
+
+    def test_shrinking_model_trims_filter_and_selection(self):
+        """Test that rows past a new, smaller end leave the filter and selection."""
+        self.view.set_filter([10, 20, 30])
+        self.view.selection_set(30)
+        self.view.set_count(25)
+        self.assertEqual(self.view.size(), 2)
+        self.assertEqual(self.view.model_index(1), 20)
+        self.assertIsNone(self.view.row_of(30))
+        self.assertEqual(self.view.curselection(), ())
+
+    def test_removed_rows_move_filter_and_selection(self):
+        """Test that rows after removed ones keep their filter and selection."""
+        self.view.set_filter([10, 20, 30])
+        self.view.selection_set(30)
+        self.view.set_count(99997, removed=[5, 20, 25])
+        self.assertEqual(self.view.size(), 2)
+        self.assertEqual([self.view.model_index(row) for row in range(2)], [9, 27])
+        self.assertEqual(self.view.row_of(27), 1)
+        self.assertEqual(self.view.curselection(), (27,))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import os
+import queue
+import sys
+import tempfile
+import unittest
+
+from watcher import ChangeSet, InotifyWatcher, PollingWatcher, watch_folders
+
+
+class TestChangeSet(unittest.TestCase):
+    def test_last_event_wins(self):
+        """Test that a burst is reduced to its net effect."""
+        changes = ChangeSet()
+        changes.add("a.mp3")
+        changes.remove("a.mp3")
+        changes.add("b.mp3")
+        changes.add("b.mp3")
+        self.assertEqual(changes.changes()[:3], (["b.mp3"], ["a.mp3"], []))
+
+    def test_renames_chain(self):
+        """Test that renames collapse and a new file renamed is just added."""
+        changes = ChangeSet()
+        changes.rename("a.mp3", "b.mp3")
+        changes.rename("b.mp3", "c.mp3")
+        changes.add("new.mp3")
+        changes.rename("new.mp3", "newer.mp3")
+        changes.rename("x.mp3", "y.mp3")
+        changes.rename("y.mp3", "x.mp3")
+        self.assertEqual(changes.changes()[:3], (["newer.mp3"], [], [("a.mp3", "c.mp3")]))
+
+    def test_renamed_then_removed(self):
+        """Test that removing a renamed file removes the original."""
+        changes = ChangeSet()
+        changes.rename("a.mp3", "b.mp3")
+        changes.remove("b.mp3")
+        self.assertEqual(sorted(changes.changes().removed), ["a.mp3", "b.mp3"])
+        self.assertEqual(changes.changes().renamed, [])
+
+
+class WatcherTests:
+    # Shared checks for both backends; make_watcher() starts one on self.tmp
+
+    def setUp(self):
+        """Create a music folder with one song and an album folder."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = os.path.realpath(self.tmp.name)
+        os.makedirs(os.path.join(self.folder, "album"))
+        self.song = self.touch("song.mp3")
+        self.found = queue.Queue()
+        self.watcher = self.make_watcher()
+
+    def tearDown(self):
+        self.watcher.stop()
+        self.tmp.cleanup()
+
+    def touch(self, *names):
+        path = os.path.join(self.folder, *names)
+        with open(path, "wb") as f:
+            f.write(b"\0" * 16)
+        return path
+
+    def next_changes(self):
+        return self.found.get(timeout=5)
+
+    def test_add_rename_remove(self):
+        """Test that new, renamed and deleted files are reported."""
+        added = self.touch("album", "new.mp3")
+        self.touch("album", "cover.jpg")
+        self.assertEqual(self.next_changes()[:3], ([added], [], []))
+        renamed = os.path.join(self.folder, "album", "renamed.mp3")
+        os.rename(self.song, renamed)
+        self.assertEqual(self.next_changes()[:3], ([], [], [(self.song, renamed)]))
+        os.remove(renamed)
+        self.assertEqual(self.next_changes()[:3], ([], [renamed], []))
+
+    def test_folder_moved(self):
+        """Test that moving a folder renames the songs inside it."""
+        inside = self.touch("album", "track.mp3")
+        self.next_changes()
+        moved = os.path.join(self.folder, "moved")
+        os.rename(os.path.join(self.folder, "album"), moved)
+        self.assertEqual(self.next_changes().renamed, [(inside, os.path.join(moved, "track.mp3"))])
+        later = self.touch("moved", "later.mp3")
+        self.assertEqual(self.next_changes().added, [later])
+
+
+class TestPollingWatcher(WatcherTests, unittest.TestCase):
+    def make_watcher(self):
+        return watch_folders([self.folder], self.found.put, backend="poll", settle=0.05, interval=0.05)
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+class TestInotifyWatcher(WatcherTests, unittest.TestCase):
+    def make_watcher(self):
+        watcher = watch_folders([self.folder], self.found.put, backend="inotify", settle=0.05)
+        self.assertIsInstance(watcher, InotifyWatcher)
+        return watcher
+
+    def test_moved_out_is_removed(self):
+        """Test that a song moved out of the watched tree counts as removed."""
+        os.rename(self.song, os.path.join(os.path.dirname(self.folder), os.path.basename(self.folder) + ".mp3"))
+        self.assertEqual(self.next_changes().removed, [self.song])
+        os.remove(os.path.join(os.path.dirname(self.folder), os.path.basename(self.folder) + ".mp3"))
+
+
+class TestPollingOnlyChangedFolders(unittest.TestCase):
+    def test_unchanged_folders_are_not_listed(self):
+        """Test that a poll lists only folders whose mtime changed."""
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ("a", "b"):
+                os.makedirs(os.path.join(folder, name))
+            watcher = PollingWatcher([folder], lambda changes: None)
+            watcher._setup()
+            for path in watcher.dirs:
+                os.utime(path, ns=(10**18, 10**18))
+            watcher.dirs = {path: (10**18,) + entry[1:] for path, entry in watcher.dirs.items()}
+            listed = []
+            real_list = watcher._list
+            watcher._list = lambda path: listed.append(path) or real_list(path)
+            os.utime(os.path.join(folder, "b"), ns=(2 * 10**18, 2 * 10**18))
+            watcher.poll()
+            self.assertEqual(listed, [os.path.join(folder, "b")])
+
+
+if __name__ == "__main__":
+    unittest.main()
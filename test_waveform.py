@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+from test_loudness import write_tone
+from waveform import WaveformCache, compute_peaks
+
+
+class TestWaveform(unittest.TestCase):
+    def setUp(self):
+        """Create a temporary cache folder and a test song."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = os.path.join(self.tmp.name, "waveforms")
+        self.song = os.path.join(self.tmp.name, "song.wav")
+        write_tone(self.song, 3, 0.5)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_compute_peaks(self):
+        """Test that peaks are bounded in count and follow the amplitude."""
+        peaks = compute_peaks(self.song, bins=200)
+        self.assertEqual(peaks.shape, (200, 2))
+        self.assertEqual(peaks.dtype, np.int8)
+        self.assertTrue(np.all(np.abs(peaks[:, 1] - 64) <= 1))
+        self.assertTrue(np.all(np.abs(peaks[:, 0] + 64) <= 1))
+
+    def test_cache_hit_does_not_decode(self):
+        """Test that cached peaks are memory-mapped instead of recomputed."""
+        cache = WaveformCache(self.cache_dir)
+        self.assertIsNone(cache.get(self.song))
+        peaks = cache.request(self.song).result()
+        with patch("waveform.compute_peaks") as compute:
+            cached = WaveformCache(self.cache_dir).load(self.song)
+            compute.assert_not_called()
+        self.assertIsInstance(cached, np.memmap)
+        np.testing.assert_array_equal(cached, peaks)
+        cache.shutdown()
+
+    def test_changed_song_is_recomputed(self):
+        """Test that a modified file misses the cache."""
+        cache = WaveformCache(self.cache_dir)
+        cache.load(self.song)
+        write_tone(self.song, 2, 0.25)
+        os.utime(self.song, (1, 1))
+        self.assertIsNone(cache.get(self.song))
+
+    def test_lru_eviction(self):
+        """Test that the least recently used overviews are dropped over budget."""
+        songs = []
+        for i in range(3):
+            path = os.path.join(self.tmp.name, f"s{i}.wav")
+            write_tone(path, 1, 0.5)
+            songs.append(path)
+        cache = WaveformCache(self.cache_dir, bins=100)
+        cache.load(songs[0])
+        size = cache.total
+        cache.max_bytes = 2 * size
+        cache.load(songs[1])
+        cache.get(songs[0])
+        cache.load(songs[2])
+        self.assertIsNotNone(cache.get(songs[0]))
+        self.assertIsNone(cache.get(songs[1]))
+        self.assertIsNotNone(cache.get(songs[2]))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+import tkinter as tk
+import unittest
+
+import numpy as np
+
+from waveform_bar import WaveformBar
+
+
+class TestWaveformBar(unittest.TestCase):
+    def setUp(self):
+        """Create a waveform bar over a ramp of peaks."""
+        try:
+            self.root = tk.Tk()
+        except tk.TclError:
+            self.skipTest("no display")
+        self.seeks = []
+        self.bar = WaveformBar(self.root, on_seek=self.seeks.append, width=100, height=40)
+        ramp = np.linspace(1, 127, 1000).astype(np.int8)
+        self.bar.set_peaks(np.stack((-ramp, ramp), axis=1))
+
+    def tearDown(self):
+        self.root.destroy()
+
+    def test_one_column_per_pixel(self):
+        """Test that peaks are reduced to the bar width."""
+        self.assertEqual(len(self.bar.columns), 100)
+
+    def test_progress_recolors_columns(self):
+        """Test that moving the position colors the played columns."""
+        self.bar.set_fraction(0.25)
+        self.assertEqual(self.bar.itemcget(self.bar.columns[24], "fill"), self.bar.played)
+        self.assertEqual(self.bar.itemcget(self.bar.columns[25], "fill"), self.bar.unplayed)
+        self.bar.set_fraction(0.1)
+        self.assertEqual(self.bar.itemcget(self.bar.columns[24], "fill"), self.bar.unplayed)
+
+
+if __name__ == "__main__":
+    unittest.main()
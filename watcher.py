@@ -0,0 +1,443 @@
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import namedtuple
+
+from importer import AUDIO_EXTENSIONS, iter_audio_files
+from instrumentation import STATS
+
+# Net effect of a burst of file events. added and removed are paths; a removed
+# path may be a folder, meaning everything below it. renamed holds (old, new)
+# pairs. present is None, or every audio file below the watched folders after
+# the watcher lost track of events and had to rescan.
+Changes = namedtuple("Changes", "added removed renamed present", defaults=(None,))
+
+
+def is_audio(path):
+    return path.lower().endswith(AUDIO_EXTENSIONS)
+
+
+class ChangeSet:
+    # Collects file events and keeps only their net effect: the last event for
+    # a path wins, renames are chained (a->b->c is a->c) and a file added and
+    # renamed within the burst is just added.
+
+    def __init__(self):
+        self.state = {}
+        self.origin = {}
+        self.present = None
+        self.first = None
+        self.last = None
+
+    def __bool__(self):
+        return bool(self.state or self.origin or self.present is not None)
+
+    def _touch(self):
+        self.last = time.monotonic()
+        if self.first is None:
+            self.first = self.last
+
+    def add(self, path):
+        self._touch()
+        self.state[path] = "added"
+
+    def remove(self, path):
+        self._touch()
+        original = self.origin.pop(path, None)
+        if original is not None:
+            self.state[original] = "removed"
+        self.state[path] = "removed"
+
+    def rename(self, old, new):
+        self._touch()
+        if self.state.get(old) == "added":
+            del self.state[old]
+            self.state[new] = "added"
+            return
+        original = self.origin.pop(old, old)
+        self.state.pop(old, None)
+        self.state.pop(new, None)
+        replaced = self.origin.pop(new, None)
+        if replaced is not None and replaced != original:
+            self.state[replaced] = "removed"
+        if original != new:
+            self.origin[new] = original
+
+    def rescan(self, paths):
+        # Everything that exists now; replaces whatever was collected
+        self._touch()
+        self.state = {}
+        self.origin = {}
+        self.present = list(paths)
+
+    def due(self, settle, max_delay):
+        # Quiet for settle seconds, or collecting for max_delay already
+        if not self:
+            return False
+        now = time.monotonic()
+        return now - self.last >= settle or now - self.first >= max_delay
+
+    def changes(self):
+        return Changes([path for path, state in self.state.items() if state == "added"],
+                       [path for path, state in self.state.items() if state == "removed"],
+                       [(old, new) for new, old in self.origin.items()],
+                       self.present)
+
+
+class FolderWatcher:
+    # Watches folder trees for audio files being added, removed and renamed.
+    # Events are collected on a background thread and handed to
+    # on_changes(Changes) on that thread once a burst has settled, so a copy
+    # of a hundred files arrives as one change set.
+
+    backend = None
+
+    def __init__(self, folders, on_changes, recursive=True, settle=0.5, max_delay=5.0):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.on_changes = on_changes
+        self.recursive = recursive
+        self.settle = settle
+        self.max_delay = max_delay
+        self.pending = ChangeSet()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self._setup()
+        self.thread = threading.Thread(target=self._run, name=f"watch-{self.backend}", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        try:
+            while not self.stop_event.is_set():
+                self._wait(self.settle / 2 if self.pending else 0.25)
+                if self.pending.due(self.settle, self.max_delay):
+                    changes, self.pending = self.pending.changes(), ChangeSet()
+                    STATS.count("watch.change_sets")
+                    self.on_changes(changes)
+        finally:
+            self._close()
+
+    def _audio_files(self):
+        files = []
+        for folder in self.folders:
+            if self.recursive:
+                files.extend(iter_audio_files(folder))
+            else:
+                try:
+                    with os.scandir(folder) as it:
+                        files.extend(entry.path for entry in it if is_audio(entry.name) and entry.is_file())
+                except OSError:
+                    pass
+        return files
+
+    def _setup(self):
+        pass
+
+    def _close(self):
+        pass
+
+    def _wait(self, timeout):
+        raise NotImplementedError
+
+
+class PollingWatcher(FolderWatcher):
+    # Portable fallback: every interval seconds each known folder is stat'ed and
+    # only folders whose mtime changed are listed again, so an idle library of
+    # thousands of folders costs one stat per folder. Files that disappear and
+    # reappear with the same inode and size count as renamed.
+
+    backend = "poll"
+
+    def __init__(self, folders, on_changes, recursive=True, settle=0.5, max_delay=5.0, interval=2.0):
+        super().__init__(folders, on_changes, recursive, settle, max_delay)
+        self.interval = interval
+        self.dirs = {}
+        self.next_scan = 0.0
+
+    def _setup(self):
+        self.poll()
+        self.next_scan = time.monotonic() + self.interval
+
+    def _wait(self, timeout):
+        delay = self.next_scan - time.monotonic()
+        if delay > 0 and self.stop_event.wait(min(timeout, delay)):
+            return
+        if time.monotonic() >= self.next_scan:
+            self.poll()
+            self.next_scan = time.monotonic() + self.interval
+
+    def _list(self, folder):
+        # (mtime_ns, {file: (inode, size)}, [subfolders]); the mtime is left
+        # out (None) while it is too recent to tell later changes in the same
+        # clock tick apart, so the folder is listed again next time
+        st = os.stat(folder)
+        files = {}
+        subdirs = []
+        with os.scandir(folder) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive:
+                            subdirs.append(entry.path)
+                    elif is_audio(entry.name):
+                        files[entry.path] = (entry.inode(), entry.stat().st_size)
+                except OSError:
+                    continue
+        recent = time.time_ns() - st.st_mtime_ns < 2_000_000_000
+        return None if recent else st.st_mtime_ns, files, subdirs
+
+    def poll(self):
+        # Compare the folders against the last poll and record the differences
+        with STATS.timer("watch.poll"):
+            before, after = {}, {}
+            seen = set()
+            stack = list(self.folders)
+            while stack:
+                folder = stack.pop()
+                seen.add(folder)
+                known = self.dirs.get(folder)
+                try:
+                    mtime = os.stat(folder).st_mtime_ns
+                    if known is None or known[0] != mtime:
+                        listed = self._list(folder)
+                        if known is not None:
+                            before.update(known[1])
+                        after.update(listed[1])
+                        self.dirs[folder] = known = listed
+                except OSError:
+                    continue
+                stack.extend(known[2])
+            for folder in [folder for folder in self.dirs if folder not in seen]:
+                before.update(self.dirs.pop(folder)[1])
+            if not self.next_scan:
+                return  # first poll: just remember what is there
+            self._record(before, after)
+
+    def _record(self, before, after):
+        gone = {path: info for path, info in before.items() if path not in after}
+        by_inode = {info: path for path, info in gone.items() if info[0]}
+        for path, info in after.items():
+            if before.get(path) == info:
+                continue
+            old = by_inode.pop(info, None) if path not in before else None
+            if old is not None:
+                del gone[old]
+                self.pending.rename(old, path)
+            else:
+                self.pending.add(path)
+        for path in gone:
+            self.pending.remove(path)
+
+
+# inotify(7) constants
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+              | IN_MOVE_SELF | IN_ONLYDIR)
+
+_libc = None
+
+
+def _inotify():
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        _libc = libc
+    return _libc
+
+
+class InotifyWatcher(FolderWatcher):
+    # Linux: one inotify watch per folder, events read as they happen. New
+    # files count once they are closed after writing or moved in, so files
+    # still being copied are not picked up half-written. A move out of the
+    # watched tree is a removal once no matching move in follows shortly.
+
+    backend = "inotify"
+
+    # Seconds a move out waits for its matching move in
+    MOVE_WAIT = 0.2
+
+    def __init__(self, folders, on_changes, recursive=True, settle=0.5, max_delay=5.0):
+        super().__init__(folders, on_changes, recursive, settle, max_delay)
+        self.fd = None
+        self.wds = {}
+        self.moves = {}
+
+    def _setup(self):
+        libc = _inotify()
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        try:
+            for folder in self.folders:
+                self._watch_tree(folder, report=False)
+        except OSError:
+            self._close()
+            raise
+
+    def _close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _watch(self, folder):
+        wd = _inotify().inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), folder)
+        self.wds[wd] = folder
+
+    def _watch_tree(self, folder, report):
+        # Watch a folder and its subfolders. With report, audio files already
+        # in them are added: they may have arrived before the watch was set.
+        stack = [folder]
+        while stack:
+            current = stack.pop()
+            try:
+                self._watch(current)
+                with os.scandir(current) as it:
+                    entries = list(it)
+            except OSError as error:
+                if error.errno == errno.ENOSPC:
+                    raise  # out of inotify watches
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.recursive:
+                            stack.append(entry.path)
+                    elif report and is_audio(entry.name):
+                        self.pending.add(entry.path)
+                except OSError:
+                    continue
+
+    def _forget_tree(self, folder):
+        prefix = os.path.join(folder, "")
+        for wd, path in list(self.wds.items()):
+            if path == folder or path.startswith(prefix):
+                _inotify().inotify_rm_watch(self.fd, wd)
+                del self.wds[wd]
+
+    def _wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout if not self.moves else self.MOVE_WAIT)
+        if ready:
+            while True:
+                try:
+                    data = os.read(self.fd, 64 * 1024)
+                except BlockingIOError:
+                    break
+                self._parse(data)
+        now = time.monotonic()
+        for cookie, (path, is_dir, when) in list(self.moves.items()):
+            if now - when >= self.MOVE_WAIT:
+                del self.moves[cookie]
+                if is_dir:
+                    self._forget_tree(path)
+                if is_dir or is_audio(path):
+                    self.pending.remove(path)
+
+    def _parse(self, data):
+        pos = 0
+        while pos + 16 <= len(data):
+            wd, mask, cookie, length = struct.unpack_from("iIII", data, pos)
+            name = data[pos + 16:pos + 16 + length].rstrip(b"\0")
+            pos += 16 + length
+            if mask & IN_Q_OVERFLOW:
+                STATS.count("watch.overflows")
+                self.pending.rescan(self._audio_files())
+                continue
+            folder = self.wds.get(wd)
+            if folder is None:
+                continue
+            if mask & IN_IGNORED:
+                del self.wds[wd]
+                continue
+            path = os.path.join(folder, os.fsdecode(name)) if name else folder
+            is_dir = bool(mask & IN_ISDIR)
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # Subfolders are handled through their parent's events
+                if folder in self.folders:
+                    self.pending.remove(folder)
+            elif mask & IN_MOVED_FROM:
+                self.moves[cookie] = (path, is_dir, time.monotonic())
+            elif mask & IN_MOVED_TO:
+                move = self.moves.pop(cookie, None)
+                if move is not None:
+                    self._moved(move[0], path, is_dir)
+                elif is_dir:
+                    if self.recursive:
+                        self._watch_tree(path, report=True)
+                elif is_audio(path):
+                    self.pending.add(path)
+            elif mask & IN_CREATE:
+                if is_dir and self.recursive:
+                    self._watch_tree(path, report=True)
+            elif mask & IN_CLOSE_WRITE:
+                if is_audio(path):
+                    self.pending.add(path)
+            elif mask & IN_DELETE:
+                if is_dir or is_audio(path):
+                    self.pending.remove(path)
+
+    def _moved(self, old, new, is_dir):
+        if not is_dir:
+            if is_audio(old) and is_audio(new):
+                self.pending.rename(old, new)
+            elif is_audio(new):
+                self.pending.add(new)
+            elif is_audio(old):
+                self.pending.remove(old)
+            return
+        if not self.recursive:
+            return
+        # The watches moved along with the folder; only their paths change
+        prefix = os.path.join(old, "")
+        for wd, path in self.wds.items():
+            if path == old or path.startswith(prefix):
+                self.wds[wd] = new + path[len(old):]
+        for path in iter_audio_files(new):
+            self.pending.rename(old + path[len(new):], path)
+
+
+def watch_folders(folders, on_changes, recursive=True, backend="auto", settle=0.5, max_delay=5.0, interval=2.0):
+    # Start watching with inotify where possible and polling every interval
+    # seconds otherwise. backend is "auto", "inotify" or "poll".
+    if backend in ("auto", "inotify") and sys.platform.startswith("linux"):
+        watcher = InotifyWatcher(folders, on_changes, recursive, settle, max_delay)
+        try:
+            watcher.start()
+            return watcher
+        except (OSError, AttributeError):
+            if backend == "inotify":
+                raise
+    watcher = PollingWatcher(folders, on_changes, recursive, settle, max_delay, interval)
+    watcher.start()
+    return watcher
@@ -0,0 +1,121 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from library import user_data_dir
+from loudness import decode
+
+# Peak pairs stored per song, whatever its length
+PEAK_BINS = 1000
+# Peaks are first taken over 10 ms blocks while decoding
+BLOCKS_PER_SECOND = 100
+
+
+def compute_peaks(path, bins=PEAK_BINS):
+    # (n, 2) int8 array of per-bin (min, max) samples scaled to -127..127, with
+    # n <= bins. The song is decoded once in chunks; only 10 ms block peaks are
+    # kept in memory.
+    rate, chunks = decode(path)
+    block = max(1, rate // BLOCKS_PER_SECOND)
+    lows, highs = [], []
+    for chunk in chunks:
+        if chunk.ndim == 2:
+            low, high = chunk.min(axis=1), chunk.max(axis=1)
+        else:
+            low = high = chunk
+        starts = np.arange(0, len(chunk), block)
+        if len(starts):
+            lows.append(np.minimum.reduceat(low, starts))
+            highs.append(np.maximum.reduceat(high, starts))
+    if not lows:
+        return np.zeros((0, 2), dtype=np.int8)
+    low, high = np.concatenate(lows), np.concatenate(highs)
+    if len(low) > bins:
+        edges = np.linspace(0, len(low), bins + 1).astype(np.intp)[:-1]
+        low, high = np.minimum.reduceat(low, edges), np.maximum.reduceat(high, edges)
+    peaks = np.stack((low, high), axis=1)
+    return np.clip(np.round(peaks * 127), -127, 127).astype(np.int8)
+
+
+class WaveformCache:
+    # Waveform overviews stored as small .npy files keyed by song path, size and
+    # mtime. get() memory-maps a cached file, so starting a song never decodes
+    # it; request() computes missing overviews on a worker thread. The folder is
+    # kept under max_bytes by deleting the least recently used files; file mtimes
+    # record use, so the order survives restarts.
+
+    def __init__(self, cache_dir=None, max_bytes=16 * 1024 * 1024, bins=PEAK_BINS, max_workers=1):
+        self.cache_dir = cache_dir or os.path.join(user_data_dir(), "waveforms")
+        self.max_bytes = max_bytes
+        self.bins = bins
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="waveform")
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.total = 0
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".npy") and entry.is_file():
+                st = entry.stat()
+                files.append((st.st_mtime, entry.name, st.st_size))
+        for _, name, size in sorted(files):
+            self.entries[name] = size
+            self.total += size
+
+    def cache_path(self, path):
+        st = os.stat(path)
+        key = f"{os.path.abspath(path)}|{st.st_mtime_ns}|{st.st_size}|{self.bins}"
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".npy")
+
+    def get(self, path):
+        # Cached peaks of a song, or None if they have not been computed yet
+        try:
+            cached = self.cache_path(path)
+            peaks = np.load(cached, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        name = os.path.basename(cached)
+        with self.lock:
+            if name in self.entries:
+                self.entries.move_to_end(name)
+        try:
+            os.utime(cached)
+        except OSError:
+            pass
+        return peaks
+
+    def load(self, path):
+        # Cached peaks, computing and storing them first if needed
+        peaks = self.get(path)
+        if peaks is not None:
+            return peaks
+        cached = self.cache_path(path)
+        peaks = compute_peaks(path, self.bins)
+        tmp = f"{cached}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, peaks)
+        os.replace(tmp, cached)
+        self._added(os.path.basename(cached), os.path.getsize(cached))
+        return peaks
+
+    def request(self, path):
+        return self.pool.submit(self.load, path)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _added(self, name, size):
+        with self.lock:
+            self.total += size - self.entries.pop(name, 0)
+            self.entries[name] = size
+            while self.total > self.max_bytes and len(self.entries) > 1:
+                old, old_size = self.entries.popitem(last=False)
+                self.total -= old_size
+                try:
+                    os.remove(os.path.join(self.cache_dir, old))
+                except OSError:
+                    pass  # still mapped (Windows); it goes on a later pass
@@ -0,0 +1,63 @@
+import tkinter as tk
+
+import numpy as np
+
+
+class WaveformBar(tk.Canvas):
+    # Seek bar showing the min/max peak overview of the current song. Every pixel
+    # column is one line item, created when peaks are set or the bar is resized;
+    # moving the play position only recolors the columns between the old and the
+    # new position. Clicking calls on_seek(fraction) with 0.0 .. 1.0.
+
+    def __init__(self, parent, on_seek=None, width=350, height=48, played="#4169E1",
+                 unplayed="#C0C0C0", **options):
+        super().__init__(parent, width=width, height=height, highlightthickness=0, **options)
+        self.on_seek = on_seek
+        self.played = played
+        self.unplayed = unplayed
+        self.peaks = None
+        self.columns = []
+        self.fraction = 0.0
+        self.position = 0
+        self.bind("<Button-1>", self._on_click)
+        self.bind("<Configure>", lambda e: self.redraw())
+
+    def set_peaks(self, peaks):
+        # (n, 2) int8 min/max pairs, or None for a flat bar
+        self.peaks = peaks
+        self.redraw()
+
+    def set_fraction(self, fraction):
+        # Show the play position; only columns that changed color are touched
+        self.fraction = max(0.0, min(1.0, fraction))
+        position = int(self.fraction * len(self.columns))
+        low, high = sorted((self.position, position))
+        color = self.played if position > self.position else self.unplayed
+        for item in self.columns[low:high]:
+            self.itemconfigure(item, fill=color)
+        self.position = position
+
+    def redraw(self):
+        self.delete("all")
+        width = max(1, self.winfo_width() if self.winfo_width() > 1 else int(self["width"]))
+        height = max(2, self.winfo_height() if self.winfo_height() > 1 else int(self["height"]))
+        middle = height / 2
+        if self.peaks is not None and len(self.peaks):
+            peaks = np.asarray(self.peaks, dtype=np.int16)
+            edges = np.linspace(0, len(peaks), min(width, len(peaks)) + 1).astype(np.intp)[:-1]
+            tops = np.maximum.reduceat(peaks[:, 1], edges) * (middle / 127)
+            bottoms = np.minimum.reduceat(peaks[:, 0], edges) * (middle / 127)
+        else:
+            tops = bottoms = np.zeros(width)
+        step = width / len(tops)
+        self.position = int(self.fraction * len(tops))
+        self.columns = []
+        for i, (top, bottom) in enumerate(zip(tops, bottoms)):
+            x = int(i * step)
+            color = self.played if i < self.position else self.unplayed
+            self.columns.append(self.create_line(x, middle - max(top, 1), x, middle - min(bottom, -1) + 1,
+                                                 fill=color, width=max(1, int(step))))
+
+    def _on_click(self, event):
+        if self.on_seek is not None:
+            self.on_seek(max(0.0, min(1.0, event.x / max(1, self.winfo_width()))))